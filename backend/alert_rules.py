@@ -0,0 +1,209 @@
+# alert_rules.py
+import os
+import threading
+import time
+
+from db import db_connection
+
+# Seconds without a reading before a pole is considered OFFLINE (see heartbeat.py).
+# Must exceed the longest gap a healthy pole leaves between readings, plus a
+# missed report: the 3h default suits poles reporting hourly; poles reporting
+# only at dawn/dusk (~12h apart) need about 14h (50400).
+HEARTBEAT_TIMEOUT = float(os.getenv('HEARTBEAT_TIMEOUT_SECONDS', '10800'))
+
+
+class Rule:
+    """Base class for alert rules.
+
+    ``evaluate(reading, previous_status)`` runs for every reading and returns a
+    message when the rule fires. ``check_silence(pole, now)`` runs from the
+    heartbeat sweep for poles that have stopped reporting. Both only look at
+    in-memory state.
+    """
+
+    alert_type = None
+    severity = 'warning'
+
+    def evaluate(self, reading, previous_status):
+        return None
+
+    def check_silence(self, pole, now):
+        return None
+
+
+class ThresholdRule(Rule):
+    """Fires when a numeric reading field drops below ``below`` (or rises above ``above``)."""
+
+    def __init__(self, field, alert_type, severity, message, below=None, above=None):
+        self.field = field
+        self.alert_type = alert_type
+        self.severity = severity
+        self.message = message
+        self.below = below
+        self.above = above
+
+    def evaluate(self, reading, previous_status):
+        value = reading.get(self.field)
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return None
+        if (self.below is not None and value < self.below) or \
+                (self.above is not None and value > self.above):
+            return self.message.format(value=value)
+        return None
+
+
+class TransitionRule(Rule):
+    """Fires when a pole's status changes from ``from_status`` to ``to_status``."""
+
+    def __init__(self, from_status, to_status, alert_type, severity, message):
+        self.from_status = from_status
+        self.to_status = to_status
+        self.alert_type = alert_type
+        self.severity = severity
+        self.message = message
+
+    def evaluate(self, reading, previous_status):
+        if previous_status == self.from_status and reading['status'] == self.to_status:
+            return self.message
+        return None
+
+
+class MissingHeartbeatRule(Rule):
+    """Fires for a pole that has not reported for ``timeout`` seconds.
+
+    Uses its own alert type so an open weak-signal alert (the usual lead-up
+    to a pole going silent) does not suppress it.
+    """
+
+    def __init__(self, timeout, alert_type='Missing Heartbeat', severity='critical'):
+        self.timeout = timeout
+        self.alert_type = alert_type
+        self.severity = severity
+
+    def check_silence(self, pole, now):
+        if pole.update_time is None:
+            return None
+        silent = (now - pole.update_time).total_seconds()
+        if silent >= self.timeout:
+            return f"No data received for {int(silent // 60)} minutes"
+        return None
+
+
+class AlertEngine:
+    """Evaluates rules against readings, deduplicating and rate limiting.
+
+    - an alert is not raised while one of the same ``(pole_id, alert_type)``
+      is still ACTIVE;
+    - after firing, the same ``(pole_id, alert_type)`` is quiet for
+      ``cooldown`` seconds even if the first alert was resolved.
+
+    The set of open alerts is reloaded from the DB every ``refresh_interval``
+    seconds so alerts resolved outside the API are noticed.
+
+    ``evaluate``/``check_silence`` only claim an alert (so concurrent writers
+    do not raise it twice). Callers ``confirm`` the returned rows once their
+    transaction commits, or ``release`` them when it fails, so a retried
+    write raises the alert again.
+    """
+
+    def __init__(self, rules, cooldown=900.0, refresh_interval=60.0):
+        self.rules = list(rules)
+        self.cooldown = cooldown
+        self.refresh_interval = refresh_interval
+        self._open = set()
+        self._pending = set()
+        self._last_fired = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def register(self, rule):
+        self.rules.append(rule)
+
+    def refresh(self, cursor=None):
+        """Reload the open alert set, on ``cursor`` if given or on a pooled connection."""
+        if cursor is None:
+            with db_connection() as conn:
+                return self.refresh(conn.cursor(dictionary=True))
+        cursor.execute("SELECT DISTINCT pole_id, alert_type FROM alerts WHERE alert_status = 'ACTIVE'")
+        rows = cursor.fetchall()
+        open_alerts = {(row['pole_id'], row['alert_type']) if isinstance(row, dict) else tuple(row)
+                       for row in rows}
+        with self._lock:
+            self._open = open_alerts
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self, cursor=None):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_interval:
+            self.refresh(cursor)
+
+    def _admit(self, pole_id, alert_type):
+        """Claim the right to raise an alert now; called with the lock held."""
+        key = (pole_id, alert_type)
+        now = time.monotonic()
+        last = self._last_fired.get(key)
+        if key in self._open or key in self._pending or (last is not None and now - last < self.cooldown):
+            self.suppressed += 1
+            return False
+        self._pending.add(key)
+        return True
+
+    def evaluate(self, reading, previous_status):
+        """Return ``[(message, severity, alert_type), ...]`` for one reading."""
+        fired = []
+        for rule in self.rules:
+            message = rule.evaluate(reading, previous_status)
+            if message:
+                fired.append((message, rule.severity, rule.alert_type))
+        return self._filter(reading['pole_id'], fired)
+
+    def check_silence(self, pole, now):
+        fired = []
+        for rule in self.rules:
+            message = rule.check_silence(pole, now)
+            if message:
+                fired.append((message, rule.severity, rule.alert_type))
+        return self._filter(pole.pole_id, fired)
+
+    def _filter(self, pole_id, fired):
+        if not fired:
+            return fired
+        with self._lock:
+            return [alert for alert in fired if self._admit(pole_id, alert[2])]
+
+    def confirm(self, alert_rows):
+        """Record committed ``(pole_id, message, severity, alert_type, timestamp)`` rows as open."""
+        now = time.monotonic()
+        with self._lock:
+            for row in alert_rows:
+                key = (row[0], row[3])
+                self._pending.discard(key)
+                self._open.add(key)
+                self._last_fired[key] = now
+
+    def release(self, alert_rows):
+        """Drop the claims of rows whose transaction failed."""
+        with self._lock:
+            for row in alert_rows:
+                self._pending.discard((row[0], row[3]))
+
+    def resolved(self, pole_id, alert_type):
+        """Forget an open alert, e.g. after it is closed through the API."""
+        with self._lock:
+            self._open.discard((pole_id, alert_type))
+
+
+DEFAULT_RULES = [
+    ThresholdRule('signal_strength', 'No Communication', 'warning',
+                  "Weak signal strength ({value} dBm)",
+                  below=float(os.getenv('ALERT_WEAK_SIGNAL_DBM', '-85'))),
+    TransitionRule('ON', 'OFF', 'Manual Switch', 'critical', "Sudden light OFF detected"),
+    MissingHeartbeatRule(HEARTBEAT_TIMEOUT),
+]
+
+engine = AlertEngine(
+    DEFAULT_RULES,
+    cooldown=float(os.getenv('ALERT_COOLDOWN_SECONDS', '900')),
+    refresh_interval=float(os.getenv('ALERT_OPEN_REFRESH', '60')),
+)
@@ -1,12 +1,22 @@
-from flask import Flask, jsonify, request, Response, send_from_directory
+from flask import Flask, jsonify, request, Response, send_from_directory, stream_with_context
 import os
 from flask_cors import CORS
 from auth import auth_bp
+import db
+import request_metrics
+import schema
 from db import get_db_connection
-from iot_routes import iot_bp
+from iot_routes import iot_bp, init_ingest
+from stream_routes import stream_bp
+from heartbeat import init_heartbeat
+from pole_registry import registry, pole_payload, PoleState, POLE_COLUMNS, MAINTENANCE_WINDOW
+from response_cache import cache
+from geo_index import geo_index, CLUSTER_MAX_ZOOM
+import fleet_stats
+import rollups
+from telemetry_windows import WINDOW_NAMES, window_query
+from exporter import EXPORT_TABLES, EXPORT_FORMATS, columnar_available, iter_batches, prefetched, gzip_chunks
 import datetime
-import io
-import csv
 
 # Serve frontend build (vite -> dist) when available. The built files are expected
 # to live at ../dist relative to this backend folder.
@@ -25,9 +35,19 @@ CORS(app, resources={r"/api/*": {"origins": [
     "http://light.technnovxp.com/"
 ]}}, supports_credentials=True)
 
+# ✅ Pooled DB connections are returned at the end of every request
+db.init_app(app)
+# ✅ Idempotent schema additions before anything writes (SCHEMA_AUTO_MIGRATE)
+schema.ensure_schema()
+# ✅ Per-request DB/serialization/payload metrics, exposed at /api/metrics
+request_metrics.init_app(app)
+
 # ✅ Register authentication routes
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(iot_bp)
+init_ingest(app)
+app.register_blueprint(stream_bp)
+init_heartbeat(app)
 
 
 # =====================================================================
@@ -44,12 +64,18 @@ def index():
         "message": "Solar visualization backend is running",
         "available_endpoints": [
             "/api/poles",
+            "/api/poles/map?bbox=&zoom=",
             "/api/poles/<pole_id>",
             "/api/telemetry",
+            "/api/telemetry/rollup",
             "/api/alerts",
             "/api/stats",
+            "/api/stats/breakdown?level=state|district|city|cluster",
             "/api/export/<table_name>",
+            "/api/metrics (Prometheus)",
+            "/api/stream (SSE)",
             "/api/iot/data (POST)",
+            "/api/iot/data/batch (POST)",
             "/api/auth/signup (POST)",
             "/api/auth/signin (POST)",
         ]
@@ -66,218 +92,353 @@ def serve_spa(path: str):
     return jsonify({'error': 'Not found'}), 404
 
 
+# Overlap between consecutive ?since= windows; clients merge by pole_id
+CURSOR_SLACK = datetime.timedelta(seconds=5)
+
+
 @app.route('/api/poles', methods=['GET'])
+# ?since= cursors are unique per client; caching them only evicts useful entries
+@cache.cached(ttl=10, tags=('poles',), bypass_args=('since',))
 def get_poles():
-    """Fetch all poles from DB"""
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT 
-            pole_id, cluster_id, latitude, longitude,
-            status, communication_status, state, district,
-            city_or_village, mode, firmware_version, update_time
-        FROM poles
-    """)
-    data = cursor.fetchall()
-    conn.close()
+    """Fetch all poles from the in-memory pole registry.
 
+    With ``?since=<cursor>`` only poles changed after the cursor are returned,
+    as ``{"poles": [...], "cursor": "..."}``. Pass the returned cursor on the
+    next call; ``since=0`` starts a sync with every pole.
+    """
     now = datetime.datetime.utcnow()
-    for row in data:
-        if row['update_time']:
-            row['update_time'] = row['update_time'].isoformat()
+    since = request.args.get('since')
+    if since is None:
+        data = [pole_payload(pole, now) for pole in registry.all()]
+        return jsonify(data)
 
-        display_status = row.get('communication_status', 'OFFLINE')
-
-        if row['communication_status'] == 'OFFLINE' and row['update_time']:
-            update_time = datetime.datetime.fromisoformat(row['update_time'])
-            diff_days = (now - update_time).days
-            display_status = 'MAINTENANCE' if diff_days < 3 else 'OFFLINE'
-        elif row['communication_status'] == 'ONLINE':
-            display_status = 'ONLINE'
-
-        row['display_status'] = display_status
+    if since in ('', '0'):
+        poles = registry.all()
+    else:
+        try:
+            since_time = _parse_utc(since)
+        except ValueError:
+            return jsonify({'error': 'Invalid since cursor'}), 400
+        poles = _poles_changed_since(since_time, now)
 
-    return jsonify(data)
+    return jsonify({
+        "poles": [pole_payload(pole, now) for pole in poles],
+        # Step back a little so readings stamped before a slow commit are not missed
+        "cursor": (now - CURSOR_SLACK).isoformat(),
+    })
 
 
-@app.route('/api/poles/<pole_id>', methods=['GET'])
-def get_pole_details(pole_id):
-    """Fetch a single pole’s details"""
+def _poles_changed_since(since_time, now):
+    """Poles updated after ``since_time``, poles flipped by the heartbeat
+    monitor since then, plus OFFLINE poles whose MAINTENANCE window ran out in
+    between (covers deployments without the monitor). All are ranges on
+    indexed columns."""
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT 
-            pole_id, cluster_id, latitude, longitude,
-            status AS device_status, communication_status,
-            state, district, city_or_village, mode,
-            firmware_version, update_time
+    cursor.execute(f"""
+        SELECT {', '.join(POLE_COLUMNS)}
         FROM poles
-        WHERE pole_id = %s
-    """, (pole_id,))
-
-    data = cursor.fetchone()
+        WHERE update_time > %s
+           OR status_changed_at > %s
+           OR (communication_status = 'OFFLINE'
+               AND update_time > %s AND update_time <= %s)
+    """, (since_time, since_time, since_time - MAINTENANCE_WINDOW, now - MAINTENANCE_WINDOW))
+    poles = [PoleState(row) for row in cursor.fetchall()]
     conn.close()
+    return poles
+
+
+@app.route('/api/poles/map', methods=['GET'])
+@cache.cached(ttl=10, tags=('poles',))
+def get_poles_map():
+    """Poles in a map viewport, from the in-memory grid index.
+
+    ``bbox=west,south,east,north`` (Leaflet's ``toBBoxString()``) and the map
+    ``zoom``. Up to MAP_CLUSTER_MAX_ZOOM the viewport comes back as clusters
+    with per-status counts; above it as individual poles.
+    """
+    try:
+        west, south, east, north = (float(v) for v in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify({'error': 'bbox must be west,south,east,north'}), 400
+    zoom = request.args.get('zoom', default=5, type=int)
+    bbox = (max(south, -90.0), max(west, -180.0), min(north, 90.0), min(east, 180.0))
+
+    if zoom > CLUSTER_MAX_ZOOM:
+        now = datetime.datetime.utcnow()
+        return jsonify({
+            "zoom": zoom,
+            "clusters": [],
+            "poles": [pole_payload(pole, now) for pole in geo_index.poles(bbox)],
+        })
+    return jsonify({"zoom": zoom, "clusters": geo_index.clusters(bbox, zoom), "poles": []})
 
-    if not data:
-        return jsonify({"error": "Pole not found"}), 404
-
-    if data['update_time']:
-        data['update_time'] = data['update_time'].isoformat()
-
-    now = datetime.datetime.utcnow()
-    display_status = data['communication_status']
 
-    if data['communication_status'] == 'OFFLINE' and data['update_time']:
-        update_time = datetime.datetime.fromisoformat(data['update_time'])
-        diff_days = (now - update_time).days
-        display_status = 'MAINTENANCE' if diff_days < 3 else 'OFFLINE'
-    elif data['communication_status'] == 'ONLINE':
-        display_status = 'ONLINE'
+@app.route('/api/poles/<pole_id>', methods=['GET'])
+@cache.cached(ttl=10, tags=('poles',))
+def get_pole_details(pole_id):
+    """Fetch a single pole’s details"""
+    pole = registry.get(pole_id)
+    if pole is None:
+        # Created since the last registry refresh?
+        conn = get_db_connection()
+        pole = registry.lookup(conn.cursor(dictionary=True), [pole_id]).get(pole_id)
+        conn.close()
+
+    if not pole:
+        return jsonify({"error": "Pole not found"}), 404
 
-    data['display_status'] = display_status
+    data = pole_payload(pole, datetime.datetime.utcnow())
+    data['device_status'] = data.pop('status')
     return jsonify(data)
 
 
 @app.route('/api/telemetry', methods=['GET'])
+@cache.cached(ttl=30, tags=('telemetry',))
 def get_telemetry():
-    """Fetch telemetry data"""
+    """Fetch telemetry data.
+
+    ``mode=filtered`` (default) returns readings inside the dawn/dusk windows
+    tagged at ingest. With ``limit`` the result is paged newest-first as
+    ``{"data": [...], "next": cursor}``; pass ``before=<cursor>`` for the
+    next page.
+    """
     pole_id = request.args.get('pole_id')
     mode = request.args.get('mode', 'filtered')
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    if pole_id:
-        if mode == 'filtered':
-            cursor.execute("""
-                SELECT pole_id, status, timestamp
-                FROM telemetry_data
-                WHERE pole_id = %s
-                  AND (TIME(timestamp) BETWEEN '06:30:00' AND '07:00:00'
-                       OR TIME(timestamp) BETWEEN '18:00:00' AND '18:30:00')
-                ORDER BY timestamp DESC
-            """, (pole_id,))
-        else:
-            cursor.execute("""
-                SELECT pole_id, status, timestamp
-                FROM telemetry_data
-                WHERE pole_id = %s
-                ORDER BY timestamp DESC
-                LIMIT 24
-            """, (pole_id,))
-    else:
+    if pole_id and mode != 'filtered':
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT pole_id, status, timestamp
             FROM telemetry_data
-            WHERE (TIME(timestamp) BETWEEN '06:30:00' AND '07:00:00')
-               OR (TIME(timestamp) BETWEEN '18:00:00' AND '18:30:00')
+            WHERE pole_id = %s
             ORDER BY timestamp DESC
-        """)
+            LIMIT 24
+        """, (pole_id,))
+        data = cursor.fetchall()
+        conn.close()
+        for row in data:
+            if row['timestamp']:
+                row['timestamp'] = row['timestamp'].isoformat()
+        return jsonify(data)
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, 5000))
+    before = request.args.get('before')
+    try:
+        before = _parse_keyset_cursor(before) if before else None
+    except ValueError:
+        return jsonify({'error': 'Invalid before cursor'}), 400
+
+    if not WINDOW_NAMES:
+        return jsonify([] if limit is None else {"data": [], "next": None})
+
+    query, params = window_query(pole_id, limit, before)
 
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(query, params)
     data = cursor.fetchall()
     conn.close()
 
+    next_cursor = None
+    if limit is not None and len(data) == limit:
+        next_cursor = f"{data[-1]['timestamp'].isoformat()}|{data[-1]['id']}"
     for row in data:
+        row.pop('id')
         if row['timestamp']:
             row['timestamp'] = row['timestamp'].isoformat()
 
-    return jsonify(data)
+    if limit is None:
+        return jsonify(data)
+    return jsonify({"data": data, "next": next_cursor})
+
+
+def _parse_utc(value):
+    """Parse an ISO timestamp as the naive UTC the DB columns store.
+
+    Offsets (``Z``, ``+05:30``) are converted to UTC; naive values are taken
+    as UTC already.
+    """
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_keyset_cursor(value):
+    timestamp, _, row_id = value.rpartition('|')
+    return _parse_utc(timestamp), int(row_id)
+
+
+@app.route('/api/telemetry/rollup', methods=['GET'])
+@cache.cached(ttl=60, tags=('telemetry',))
+def get_telemetry_rollup():
+    """Hourly/daily telemetry aggregates.
+
+    Query args: ``pole_id`` (omit for the whole fleet), ``from``/``to`` ISO
+    dates, UTC unless they carry an offset (default: the last 7 days),
+    ``bucket=hour|day|auto``.
+    """
+    now = datetime.datetime.utcnow()
+    try:
+        end = _parse_utc(request.args['to']) if request.args.get('to') else now
+        start = _parse_utc(request.args['from']) if request.args.get('from') else end - datetime.timedelta(days=7)
+    except ValueError:
+        return jsonify({'error': 'Invalid from/to date'}), 400
+    if start >= end:
+        return jsonify({'error': '"from" must be before "to"'}), 400
+
+    requested = request.args.get('bucket', 'auto')
+    if requested not in ('auto', *rollups.BUCKETS):
+        return jsonify({'error': 'bucket must be hour, day or auto'}), 400
+    bucket = rollups.pick_bucket(start, end, requested)
+
+    conn = get_db_connection()
+    data = rollups.query_rollups(conn.cursor(dictionary=True), bucket, start, end,
+                                 request.args.get('pole_id'))
+    conn.close()
+
+    return jsonify({"bucket": bucket, "data": data})
+
+
+ALERT_FILTERS = ('pole_id', 'severity', 'alert_status', 'alert_type')
 
 
 @app.route('/api/alerts', methods=['GET'])
+@cache.cached(ttl=10, tags=('alerts',))
 def get_alerts():
-    """Fetch recent alerts"""
+    """Fetch alerts, newest first.
+
+    Without query args this returns the 10 most recent alerts. Any of
+    ``limit``, ``before`` or the filters (``pole_id``, ``severity``,
+    ``alert_status``, ``alert_type``) switch to a paged response:
+    ``{"data": [...], "next": cursor, "total": matching}``; pass
+    ``before=<cursor>`` for the next page. ``total`` (a COUNT over every
+    matching alert) is only computed for the first page, or on any page with
+    ``with_total=1``; it is null otherwise.
+    """
+    filters = {name: request.args[name] for name in ALERT_FILTERS if request.args.get(name)}
+    paged = bool(filters) or 'limit' in request.args or 'before' in request.args
+    limit = max(1, min(request.args.get('limit', 10, type=int), 500))
+    try:
+        before = _parse_keyset_cursor(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid before cursor'}), 400
+
+    clauses = [f"{name} = %s" for name in filters]
+    params = list(filters.values())
+    page_clauses = list(clauses)
+    page_params = list(params)
+    if before:
+        page_clauses.append("(timestamp < %s OR (timestamp = %s AND id < %s))")
+        page_params += [before[0], before[0], before[1]]
+    where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("""
-        SELECT pole_id, message, severity, alert_status,
+    cursor.execute(f"""
+        SELECT id, pole_id, message, severity, alert_status,
                alert_type, technician_id, action_taken,
                remarks, timestamp
         FROM alerts
-        ORDER BY timestamp DESC
-        LIMIT 10
-    """)
-
+        {where}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT {limit}
+    """, page_params)
     data = cursor.fetchall()
+
+    total = None
+    if paged and (before is None or request.args.get('with_total') in ('1', 'true', 'yes')):
+        cursor.execute(f"SELECT COUNT(*) AS total FROM alerts "
+                       f"{'WHERE ' + ' AND '.join(clauses) if clauses else ''}", params)
+        total = int(cursor.fetchone()['total'])
     conn.close()
 
+    next_cursor = None
+    if len(data) == limit:
+        next_cursor = f"{data[-1]['timestamp'].isoformat()}|{data[-1]['id']}"
     for row in data:
         if row['timestamp']:
             row['timestamp'] = row['timestamp'].isoformat()
 
-    return jsonify(data)
+    if not paged:
+        return jsonify(data)
+    return jsonify({"data": data, "next": next_cursor, "total": total})
 
 
 @app.route('/api/stats', methods=['GET'])
+@cache.cached(ttl=10, tags=('stats',))
 def get_stats():
     """Dashboard summary"""
+    if fleet_stats.counters is not None:
+        return jsonify(fleet_stats.counters.snapshot())
+
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    stats = fleet_stats.query_stats(conn.cursor(dictionary=True))
+    conn.close()
+    return jsonify(stats)
 
-    cursor.execute("SELECT COUNT(*) AS total FROM poles")
-    total = cursor.fetchone().get('total', 0)
 
-    cursor.execute("SELECT COUNT(*) AS active FROM poles WHERE status='ON'")
-    active = cursor.fetchone().get('active', 0)
+@app.route('/api/stats/breakdown', methods=['GET'])
+@cache.cached(ttl=10, tags=('stats',))
+def get_stats_breakdown():
+    """Fleet counters grouped by ``level=state|district|city|cluster``.
 
-    cursor.execute("SELECT COUNT(*) AS inactive FROM poles WHERE status='OFF'")
-    inactive = cursor.fetchone().get('inactive', 0)
+    Drill down by passing the parent keys, e.g.
+    ``?level=city&state=Maharashtra&district=Pune``.
+    """
+    level = request.args.get('level', 'state')
+    if level not in fleet_stats.BREAKDOWN_LEVELS:
+        return jsonify({'error': f"level must be one of {', '.join(fleet_stats.BREAKDOWN_LEVELS)}"}), 400
+    filters = {column: request.args[arg]
+               for arg, column in (('state', 'state'), ('district', 'district'), ('city', 'city_or_village'))
+               if arg in request.args}
+    return jsonify({"level": level, "groups": fleet_stats.breakdown.groups(level, filters)})
 
-    cursor.execute("SELECT COUNT(*) AS alerts FROM alerts WHERE alert_status='ACTIVE'")
-    alerts = cursor.fetchone().get('alerts', 0)
 
-    conn.close()
-    return jsonify({
-        "total": total,
-        "active": active,
-        "inactive": inactive,
-        "alerts": alerts
-    })
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/api/export/<table_name>', methods=['GET'])
 def export_csv(table_name):
-    """Export table to CSV"""
-    valid_tables = {
-        'telemetry': 'telemetry_data',
-        'alerts': 'alerts',
-        'poles': 'poles'
-    }
-
-    if table_name not in valid_tables:
+    """Stream a table as CSV, NDJSON, Arrow IPC or Parquet.
+
+    Optional query args: ``format=csv|ndjson|arrow|parquet`` (default csv),
+    ``start``/``end`` date range, ``gzip=1`` to compress text formats on the
+    fly, ``paginate=keyset`` for very large ranges.
+    """
+    if table_name not in EXPORT_TABLES:
         return jsonify({'error': 'Invalid dataset'}), 400
 
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {export_format}'}), 400
+    render, mimetype, extension, columnar = EXPORT_FORMATS[export_format]
+    if columnar and not columnar_available():
+        return jsonify({'error': f'{export_format} export requires pyarrow on the server'}), 501
+
     start_date = request.args.get('start')
     end_date = request.args.get('end')
-
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    query = f"SELECT * FROM {valid_tables[table_name]}"
-    params = []
-
-    if start_date and end_date:
-        query += " WHERE timestamp BETWEEN %s AND %s"
-        params = [start_date, end_date]
-
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
-
-    output = io.StringIO()
-
-    if rows:
-        writer = csv.DictWriter(output, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
-    else:
-        output.write("No data available")
-
-    response = Response(output.getvalue(), mimetype='text/csv')
-    response.headers['Content-Disposition'] = f'attachment; filename={table_name}_export.csv'
+    keyset = request.args.get('paginate') == 'keyset'
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes') and not columnar
+
+    # Exports use their own small pool; a full one answers 503 before streaming
+    chunks = render(prefetched(iter_batches(table_name, start_date, end_date, keyset=keyset)))
+    filename = f'{table_name}_export.{extension}'
+    if compress:
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    # Keep the request context while streaming so DB time lands in /api/metrics
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 
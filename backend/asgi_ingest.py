@@ -0,0 +1,343 @@
+# asgi_ingest.py
+"""Async serving mode for device ingest (``POST /api/iot/data``).
+
+Devices hold no worker thread while their reading is written: every POST
+waits on a future, and ASYNC_INGEST_WRITERS writer tasks, each owning one
+``mysql.connector.aio`` connection, write whatever is queued in one
+transaction. Each pole is served by one writer, so its readings are written
+in arrival order. Validation and the statements written are shared with the sync
+endpoint (``parse_reading`` / ``prepare_writes``), and the response is only
+sent after commit, so status codes match it (200, 400, 404 unknown pole, 503
+when the queue is full).
+
+Run with any ASGI server next to the Flask read API (``pip install -r
+requirements-async.txt``), and route ``/api/iot/data`` to it from the
+reverse proxy::
+
+    uvicorn asgi_ingest:app --host 0.0.0.0 --port 5001
+
+Committed readings are published to *this* process's pole registry,
+response cache, event bus and stats counters. The Flask processes only
+see them through their registry refresh and cache TTLs: they push no SSE
+pole/alert events for device ingest, and ``STATS_MODE=incremental``
+counters drift until the next reconcile (keep ``STATS_MODE=query`` with
+this split). Live SSE updates need ingest in the same process as the
+stream, i.e. the sync or buffered Flask ingest modes.
+
+ASYNC_INGEST_FLASK=1 (needs ``asgiref``) makes every other path fall
+through to the Flask app in this process, for development only: asgiref
+runs all WSGI calls on one thread, so Flask requests are serialized, and
+``/api/stream`` is refused because one subscriber would block the rest.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+
+from mysql.connector.aio import connect
+
+from db import connection_settings, is_data_error
+from iot_routes import parse_reading, prepare_writes, publish_readings
+from pole_registry import registry, POLE_COLUMNS
+from alert_rules import engine as alert_engine
+import schema
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # ingest-only mode
+    WsgiToAsgi = None
+
+FLASK_FALLTHROUGH = os.getenv('ASYNC_INGEST_FLASK', '0').lower() in ('1', 'true', 'yes')
+
+log = logging.getLogger(__name__)
+
+# Bodies above this are rejected; a device reading is a few hundred bytes
+MAX_BODY_BYTES = 64 * 1024
+
+
+class AsyncIngestWriter:
+    """Coalesces concurrent readings into shared transactions.
+
+    Readings are routed to a writer by ``hash(pole_id)``, so one pole's
+    readings are always written by the same task, in order; ``prepare_writes``
+    compares each reading with the pole's previous status and relies on
+    that. Each writer task takes up to ``batch_rows`` readings from its queue
+    (lingering ``linger_ms`` for more to arrive), writes them on its own
+    connection and resolves every reading's future with whether its pole was
+    known. A batch the DB rejects for its data is bisected, so only the
+    offending reading fails.
+    """
+
+    def __init__(self, writers=4, batch_rows=500, max_pending=10000, linger_ms=2):
+        self.writers = writers
+        self.batch_rows = batch_rows
+        self.linger = linger_ms / 1000.0
+        self._queues = [asyncio.Queue(maxsize=max(1, max_pending // writers)) for _ in range(writers)]
+        self._tasks = []
+
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failed = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(queue), name=f'ingest-writer-{i}')
+                           for i, queue in enumerate(self._queues)]
+
+    async def stop(self):
+        """Write everything still queued, then end the writer tasks."""
+        for queue in self._queues:
+            await queue.put(None)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, reading):
+        """Queue a validated reading. Returns a future, or None when the queue is full."""
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[hash(reading["pole_id"]) % self.writers]
+        try:
+            queue.put_nowait((reading, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return None
+        self.accepted += 1
+        return future
+
+    def stats(self):
+        return {
+            "queued": sum(queue.qsize() for queue in self._queues),
+            "capacity": sum(queue.maxsize for queue in self._queues),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+    # -------------------------------
+    # 🔹 WRITER TASKS
+    # -------------------------------
+    async def _collect(self, queue):
+        item = await queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        if self.linger:
+            await asyncio.sleep(self.linger)
+        while len(batch) < self.batch_rows:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is None:
+                # Leave the stop marker for after this batch
+                queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self, queue):
+        cnx = None
+        while True:
+            batch = await self._collect(queue)
+            if batch is None:
+                break
+            cnx = await self._flush(cnx, batch)
+        if cnx is not None:
+            await cnx.close()
+
+    async def _flush(self, cnx, batch):
+        """Write ``batch`` and resolve its futures. Returns the connection to reuse, if any."""
+        try:
+            if cnx is None:
+                cnx = await connect(**connection_settings())
+            unknown = await self._write(cnx, [reading for reading, _ in batch])
+        except Exception as e:
+            if is_data_error(e):
+                if len(batch) > 1:
+                    # Halves in order, so each pole's readings stay in sequence
+                    middle = len(batch) // 2
+                    cnx = await self._flush(cnx, batch[:middle])
+                    return await self._flush(cnx, batch[middle:])
+                log.error("async ingest rejected reading %r: %s", batch[0][0], e)
+            else:
+                log.exception("async ingest batch of %d failed", len(batch))
+                if cnx is not None:
+                    try:
+                        await cnx.close()
+                    except Exception:
+                        pass
+                    cnx = None
+            self.failed += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return cnx
+        self.batches += 1
+        for reading, future in batch:
+            if not future.done():
+                future.set_result(reading["pole_id"] not in unknown)
+        return cnx
+
+    async def _write(self, cnx, readings):
+        # Registry / open-alert reloads are rare and go through the sync pool
+        await asyncio.to_thread(registry.ensure_fresh)
+        await asyncio.to_thread(alert_engine.ensure_fresh)
+
+        pole_ids = list(dict.fromkeys(r["pole_id"] for r in readings))
+        poles = {}
+        for pole_id in pole_ids:
+            pole = registry.peek(pole_id)
+            if pole is not None:
+                poles[pole_id] = pole
+
+        cursor = await cnx.cursor(dictionary=True)
+        try:
+            missing = [pole_id for pole_id in pole_ids if pole_id not in poles]
+            if missing:
+                # Created since the last registry refresh?
+                await cursor.execute(
+                    f"SELECT {', '.join(POLE_COLUMNS)} FROM poles "
+                    f"WHERE pole_id IN ({', '.join(['%s'] * len(missing))})", missing)
+                poles.update(registry.store(await cursor.fetchall()))
+
+            unknown, latest, alert_rows, statements = prepare_writes(poles, readings)
+            try:
+                for statement, rows in statements:
+                    await cursor.executemany(statement, rows)
+                await cnx.commit()
+            except Exception:
+                alert_engine.release(alert_rows)
+                try:
+                    await cnx.rollback()
+                except Exception:
+                    pass
+                raise
+        finally:
+            await cursor.close()
+
+        publish_readings(latest, alert_rows)
+        return unknown
+
+
+writer = None
+_flask = None
+
+
+def _get_writer():
+    global writer
+    if writer is None:
+        writer = AsyncIngestWriter(
+            writers=int(os.getenv('ASYNC_INGEST_WRITERS', '4')),
+            batch_rows=int(os.getenv('ASYNC_INGEST_BATCH', '500')),
+            max_pending=int(os.getenv('ASYNC_INGEST_QUEUE', '10000')),
+            linger_ms=float(os.getenv('ASYNC_INGEST_LINGER_MS', '2')),
+        )
+        writer.start()
+    return writer
+
+
+# -------------------------------
+# 🔹 ASGI
+# -------------------------------
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return False
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def receive_iot_data(receive, send):
+    """Async twin of ``iot_routes.receive_iot_data``."""
+    body = await _read_body(receive)
+    if body is None:
+        return
+    if body is False:
+        await _send_json(send, 413, {"error": "Request body too large"})
+        return
+
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        data = None
+    reading, error = parse_reading(data)
+    if error:
+        await _send_json(send, 400, {"error": error})
+        return
+
+    future = _get_writer().submit(reading)
+    if future is None:
+        await _send_json(send, 503, {"error": "Ingest queue full, retry later"},
+                         headers=[(b"retry-after", b"1")])
+        return
+    try:
+        known = await future
+    except Exception:
+        await _send_json(send, 500, {"error": "Failed to store telemetry"})
+        return
+
+    if not known:
+        await _send_json(send, 404, {"error": f"Pole {reading['pole_id']} not found"})
+        return
+    await _send_json(send, 200, {"message": "Telemetry data received successfully"})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.to_thread(schema.ensure_schema)
+            _get_writer()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if writer is not None:
+                await writer.stop()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    global _flask
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["path"] == "/api/iot/data":
+        if scope["method"] != "POST":
+            await _send_json(send, 405, {"error": "Method not allowed"}, headers=[(b"allow", b"POST")])
+            return
+        await receive_iot_data(receive, send)
+        return
+
+    if FLASK_FALLTHROUGH and WsgiToAsgi is not None:
+        if scope["type"] == "http" and scope["path"] == "/api/stream":
+            await _send_json(send, 404, {"error": "SSE is not served by the async ingest server"})
+            return
+        if _flask is None:
+            _flask = WsgiToAsgi(importlib.import_module('app').app)
+        await _flask(scope, receive, send)
+        return
+
+    if scope["type"] == "http":
+        await _send_json(send, 404, {"error": "Not found"})
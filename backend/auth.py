@@ -1,22 +1,183 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
 from db import get_db_connection
 
 SECRET_KEY = "supersecretkey"  # change this for production
 
+TOKEN_LIFETIME = datetime.timedelta(hours=6)
+
 auth_bp = Blueprint('auth', __name__)
 
+
+class TTLCache:
+    """Size-bounded LRU whose entries also expire after a per-entry deadline."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if predicate(v)]:
+                del self._entries[key]
+
+
+# Decoded tokens (token -> claims) and user profiles (user_id -> {id, name, role})
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '300'))
+token_cache = TTLCache(int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '4096')))
+profile_cache = TTLCache(int(os.getenv('AUTH_PROFILE_CACHE_SIZE', '1024')))
+
+# user_id -> epoch seconds; tokens issued before it are rejected
+_revoked_before = {}
+
+# Failed sign-ins per (email, client address) within a sliding window
+SIGNIN_MAX_FAILURES = int(os.getenv('AUTH_SIGNIN_MAX_FAILURES', '5'))
+SIGNIN_WINDOW = float(os.getenv('AUTH_SIGNIN_WINDOW_SECONDS', '300'))
+_failures = TTLCache(10000)
+
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _issued_at(claims):
+    return claims.get('iat', 0)
+
+
+def decode_token(token):
+    """Verified claims for ``token``; served from ``token_cache`` after the first decode.
+
+    Raises ``AuthError`` for missing, expired, invalid or revoked tokens.
+    """
+    if not token:
+        raise AuthError('Token missing')
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            raise AuthError('Token expired')
+        except Exception:
+            raise AuthError('Invalid token')
+        # Never cache a token past its own expiry
+        ttl = min(AUTH_CACHE_TTL, claims['exp'] - time.time()) if 'exp' in claims else AUTH_CACHE_TTL
+        token_cache.put(token, claims, ttl)
+    elif claims.get('exp') is not None and claims['exp'] <= time.time():
+        token_cache.pop(token)
+        raise AuthError('Token expired')
+
+    revoked = _revoked_before.get(claims.get('user_id'))
+    if revoked is not None and _issued_at(claims) < revoked:
+        raise AuthError('Token revoked')
+    return claims
+
+
+def get_profile(user_id):
+    """``{id, name, role}`` for ``user_id`` from ``profile_cache`` or the DB; None if missing."""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, name, role FROM users WHERE id = %s", (user_id,))
+        profile = cursor.fetchone()
+        conn.close()
+        if profile is None:
+            return None
+        profile_cache.put(user_id, profile, AUTH_CACHE_TTL)
+    return profile
+
+
+def invalidate_user(user_id, revoke_tokens=False):
+    """Call after a user's name, role or password changes (or the user is deleted).
+
+    Drops the cached profile and decoded tokens; with ``revoke_tokens`` every
+    token issued so far for the user is rejected from now on, since their
+    embedded name/role may be stale.
+
+    Revocation is per-process: it lives in this worker's memory only, is not
+    shared with other API workers and is lost on restart. Other workers keep
+    accepting the user's older tokens until they expire (TOKEN_LIFETIME), so
+    keep that short where role changes or deletions must take effect at once.
+    """
+    profile_cache.pop(user_id)
+    token_cache.discard_where(lambda claims: claims.get('user_id') == user_id)
+    if revoke_tokens:
+        _revoked_before[user_id] = int(time.time()) + 1
+
+
+def _bearer_token():
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
+
+
+def require_auth(*roles):
+    """Reject requests without a valid bearer token (and, if given, one of ``roles``).
+
+    Verified claims are exposed as ``g.user``. No DB access: the token is
+    checked against ``token_cache``. Use as ``@require_auth`` or
+    ``@require_auth('admin')``; put it above ``@cache.cached`` so cached
+    responses are protected too.
+    """
+    if len(roles) == 1 and callable(roles[0]):
+        return require_auth()(roles[0])
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                claims = decode_token(_bearer_token())
+            except AuthError as e:
+                return jsonify({'error': e.message}), e.status
+            if roles and claims.get('role') not in roles:
+                return jsonify({'error': 'Forbidden'}), 403
+            g.user = claims
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # -------------------------------
 # 🔹 SIGN UP
 # -------------------------------
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
-    data = request.get_json()
-    print("Received signup data:", data)  # DEBUG
+    data = request.get_json(silent=True)
 
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({'error': 'Invalid JSON'}), 400
 
     name = data.get('name')
@@ -27,6 +188,8 @@ def signup():
 
     if not all([name, email, phone, password]):
         return jsonify({'error': 'All fields are required'}), 400
+    if not all(isinstance(value, str) for value in (name, email, phone, password, role)):
+        return jsonify({'error': 'Fields must be strings'}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
@@ -53,11 +216,9 @@ def signup():
 # -------------------------------
 @auth_bp.route('/signin', methods=['POST'])
 def signin():
-    data = request.get_json()
-    print("Received signin payload:", data)  # <-- log it
-    print("Received signin data:", data)  # DEBUG
+    data = request.get_json(silent=True)
 
-    if not data:
+    if not data or not isinstance(data, dict):
         return jsonify({'error': 'Invalid JSON'}), 400
 
     email = data.get('email')
@@ -65,22 +226,39 @@ def signin():
 
     if not email or not password:
         return jsonify({'error': 'Email and password required'}), 400
+    if not isinstance(email, str) or not isinstance(password, str):
+        return jsonify({'error': 'Email and password must be strings'}), 400
+
+    # Throttle repeated failures before paying for a lookup and a hash check
+    attempt_key = (email.lower(), request.remote_addr)
+    failures = _failures.get(attempt_key) or 0
+    if failures >= SIGNIN_MAX_FAILURES:
+        response = jsonify({'error': 'Too many failed attempts, try again later'})
+        response.headers['Retry-After'] = str(int(SIGNIN_WINDOW))
+        return response, 429
 
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+    cursor.execute("SELECT id, name, role, password_hash FROM users WHERE email = %s", (email,))
     user = cursor.fetchone()
     conn.close()
 
     if not user or not check_password_hash(user['password_hash'], password):
+        _failures.put(attempt_key, failures + 1, SIGNIN_WINDOW)
         return jsonify({'error': 'Invalid credentials'}), 401
+    _failures.pop(attempt_key)
 
-    # Generate JWT token
+    # Generate JWT token; name and role are embedded so /user-info needs no DB
+    now = datetime.datetime.utcnow()
     token = jwt.encode({
         'user_id': user['id'],
+        'name': user['name'],
         'role': user['role'],
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=6)
+        'iat': now,
+        'exp': now + TOKEN_LIFETIME
     }, SECRET_KEY, algorithm='HS256')
+    profile_cache.put(user['id'], {'id': user['id'], 'name': user['name'], 'role': user['role']},
+                      AUTH_CACHE_TTL)
 
     return jsonify({
         'message': 'Login successful',
@@ -88,32 +266,89 @@ def signin():
         'role': user['role']
     })
 # -------------------------------
-# 🔹 GET USER INFO (from token)
+# 🔹 USER CHANGES
 # -------------------------------
-# -------------------------------
-# 🔹 GET USER INFO (from token)
-# -------------------------------
-@auth_bp.route('/user-info', methods=['GET'])
-def get_user_info():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not token:
-        return jsonify({'error': 'Token missing'}), 401
+@auth_bp.route('/change-password', methods=['POST'])
+@require_auth
+def change_password():
+    data = request.get_json(silent=True)
+
+    if not data or not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON'}), 400
 
-    try:
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        user_id = decoded['user_id']
-    except jwt.ExpiredSignatureError:
-        return jsonify({'error': 'Token expired'}), 401
-    except Exception:
-        return jsonify({'error': 'Invalid token'}), 401
+    current = data.get('current_password')
+    new = data.get('new_password')
+    if not isinstance(current, str) or not isinstance(new, str) or not new:
+        return jsonify({'error': 'current_password and new_password required'}), 400
 
+    user_id = g.user['user_id']
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT name, role FROM users WHERE id = %s", (user_id,))
+    cursor.execute("SELECT password_hash FROM users WHERE id = %s", (user_id,))
     user = cursor.fetchone()
+    if not user or not check_password_hash(user['password_hash'], current):
+        conn.close()
+        return jsonify({'error': 'Invalid credentials'}), 401
+    cursor.execute("UPDATE users SET password_hash = %s WHERE id = %s",
+                   (generate_password_hash(new), user_id))
+    conn.commit()
     conn.close()
 
+    invalidate_user(user_id, revoke_tokens=True)
+    return jsonify({'message': 'Password changed, sign in again'})
+
+
+@auth_bp.route('/users/<int:user_id>/role', methods=['PUT'])
+@require_auth('admin')
+def change_role(user_id):
+    data = request.get_json(silent=True)
+    role = data.get('role') if isinstance(data, dict) else None
+    if role not in ('admin', 'technician'):
+        return jsonify({'error': 'role must be admin or technician'}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+    if not cursor.fetchone():
+        conn.close()
+        return jsonify({'error': 'User not found'}), 404
+    cursor.execute("UPDATE users SET role = %s WHERE id = %s", (role, user_id))
+    conn.commit()
+    conn.close()
+
+    invalidate_user(user_id, revoke_tokens=True)
+    return jsonify({'message': 'Role updated'})
+
+
+@auth_bp.route('/users/<int:user_id>', methods=['DELETE'])
+@require_auth('admin')
+def delete_user(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+    found = cursor.rowcount
+    conn.commit()
+    conn.close()
+    if not found:
+        return jsonify({'error': 'User not found'}), 404
+
+    invalidate_user(user_id, revoke_tokens=True)
+    return jsonify({'message': 'User deleted'})
+
+
+# -------------------------------
+# 🔹 GET USER INFO (from token)
+# -------------------------------
+@auth_bp.route('/user-info', methods=['GET'])
+@require_auth
+def get_user_info():
+    claims = g.user
+    if 'name' in claims and 'role' in claims:
+        return jsonify({'name': claims['name'], 'role': claims['role']})
+
+    # Tokens issued before name/role were embedded
+    user = get_profile(claims['user_id'])
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify(user)
\ No newline at end of file
+    return jsonify({'name': user['name'], 'role': user['role']})
\ No newline at end of file
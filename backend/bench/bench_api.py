@@ -0,0 +1,320 @@
+# bench/bench_api.py
+"""API benchmark: dawn/dusk ingest bursts, dashboard polling and exports.
+
+Seeds a synthetic fleet (``--poles`` poles across states, districts, cities
+and clusters, ``--days`` of readings every ``--interval`` minutes, a few
+alerts), then drives the Flask app in-process through ``app.test_client()``
+from ``--concurrency`` threads and reports requests/s and latency
+percentiles per endpoint, plus the per-route DB time, query count,
+serialization time and payload size recorded by ``request_metrics``.
+
+By default the database is a SQLite stand-in (``bench/standin.py``), which
+is fine for comparing code paths before and after a change::
+
+    cd backend && python -m bench.bench_api --poles 2000 --days 7
+
+For capacity numbers point DB_HOST/DB_USER/DB_PASSWORD/DB_NAME at a scratch
+MySQL/MariaDB with the schema applied (``python schema.py``), never at
+production. Existing rows are only replaced with ``--reset``::
+
+    cd backend && python -m bench.bench_api --mysql --reset --poles 10000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from telemetry_windows import window_for
+
+STATES = {
+    "Maharashtra": {"Pune": (18.52, 73.86), "Nashik": (19.99, 73.79), "Nagpur": (21.15, 79.09)},
+    "Karnataka": {"Mysuru": (12.30, 76.64), "Belagavi": (15.85, 74.50)},
+    "Rajasthan": {"Jaipur": (26.91, 75.79), "Jodhpur": (26.24, 73.02), "Bikaner": (28.02, 73.31)},
+}
+CITIES_PER_DISTRICT = 8
+POLES_PER_CLUSTER = 25
+FIRMWARE = ("v1.0.3", "v1.1.0", "v1.2.0")
+BENCH_TABLES = ("telemetry_rollup", "alerts", "telemetry_data", "poles")
+
+
+def pole_id(i):
+    return f"P{i:05d}"
+
+
+# -------------------------------
+# 🔹 SEEDING
+# -------------------------------
+def _fleet(poles):
+    districts = [(state, district, centre)
+                 for state, entries in STATES.items() for district, centre in entries.items()]
+    rows = []
+    for i in range(poles):
+        state, district, (lat, lon) = districts[i % len(districts)]
+        city = f"{district}-{(i // len(districts)) % CITIES_PER_DISTRICT:02d}"
+        rows.append((pole_id(i), f"C{i // POLES_PER_CLUSTER:04d}",
+                     round(lat + random.uniform(-0.4, 0.4), 6), round(lon + random.uniform(-0.4, 0.4), 6),
+                     state, district, city, random.choice(FIRMWARE)))
+    return rows
+
+
+def seed(poles, days, interval, alerts, chunk=5000):
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO poles (pole_id, cluster_id, latitude, longitude, status, communication_status,
+                               state, district, city_or_village, mode, firmware_version, update_time,
+                               display_status, status_changed_at)
+            VALUES (%s, %s, %s, %s, 'ON', 'ONLINE', %s, %s, %s, 'AUTO', %s, %s, 'ONLINE', %s)
+        """, [row + (seen, seen) for row in _fleet(poles)
+              for seen in [now - datetime.timedelta(seconds=random.randrange(interval * 60))]])
+        conn.commit()
+
+        # Lamps switch on at dusk and off at dawn; readings carry that state
+        step = datetime.timedelta(minutes=interval)
+        batch = []
+        readings = 0
+        ts = now - datetime.timedelta(days=days)
+        while ts < now:
+            status = "ON" if ts.hour >= 18 or ts.hour < 7 else "OFF"
+            for i in range(poles):
+                stamp = ts + datetime.timedelta(seconds=random.randrange(60))
+                batch.append((pole_id(i), status, random.randint(-95, -55), stamp, window_for(stamp)))
+            if len(batch) >= chunk:
+                cursor.executemany("""
+                    INSERT INTO telemetry_data (pole_id, status, signal_strength, timestamp, time_window)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, batch)
+                conn.commit()
+                readings += len(batch)
+                batch = []
+            ts += step
+        if batch:
+            cursor.executemany("""
+                INSERT INTO telemetry_data (pole_id, status, signal_strength, timestamp, time_window)
+                VALUES (%s, %s, %s, %s, %s)
+            """, batch)
+            readings += len(batch)
+
+        cursor.executemany("""
+            INSERT INTO alerts (pole_id, message, severity, alert_status, alert_type, timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [(pole_id(random.randrange(poles)), "Weak signal", "warning",
+               random.choice(("ACTIVE", "RESOLVED", "RESOLVED")), "Weak Signal",
+               now - datetime.timedelta(seconds=random.randrange(days * 86400)))
+              for _ in range(alerts)])
+        conn.commit()
+    return readings
+
+
+def _existing_poles():
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM poles")
+        return cursor.fetchone()[0]
+
+
+def _clear():
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        for table in BENCH_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        conn.commit()
+
+
+# -------------------------------
+# 🔹 LOAD
+# -------------------------------
+def run(app, calls, concurrency):
+    """Issue ``calls`` = ``[(label, method, path, kwargs), ...]``; return (elapsed, {label: [ms]}, errors)."""
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = {}
+    errors = {}
+
+    def issue(call):
+        label, method, path, kwargs = call
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()  # drain streamed bodies
+        response.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.setdefault(label, []).append(elapsed)
+            if response.status_code >= 400:
+                errors[label] = errors.get(label, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in pool.map(issue, calls):
+            pass
+    return time.perf_counter() - started, latencies, errors
+
+
+def burst_calls(poles, batch_size, gateway_share):
+    """Every pole reports its dawn/dusk switch at once; part of them via gateways."""
+    status = random.choice(("ON", "OFF"))
+    ids = [pole_id(i) for i in range(poles)]
+    random.shuffle(ids)
+    via_gateway = int(len(ids) * gateway_share)
+
+    def reading(pid):
+        return {"pole_id": pid, "status": status, "signal_strength": random.randint(-95, -55)}
+
+    calls = [("POST /api/iot/data", "POST", "/api/iot/data", {"json": reading(pid)})
+             for pid in ids[via_gateway:]]
+    for start in range(0, via_gateway, batch_size):
+        calls.append(("POST /api/iot/data/batch", "POST", "/api/iot/data/batch",
+                      {"json": [reading(pid) for pid in ids[start:start + batch_size]]}))
+    random.shuffle(calls)
+    return calls
+
+
+def polling_calls(poles, requests):
+    """What a room full of open dashboards asks for, plus background ingest."""
+    states = list(STATES)
+
+    def poles_since():
+        since = datetime.datetime.utcnow() - datetime.timedelta(seconds=random.choice((30, 60, 300)))
+        return "/api/poles", {"query_string": {"since": since.isoformat()}}
+
+    def poles_map():
+        lat, lon = random.choice([c for d in STATES.values() for c in d.values()])
+        zoom = random.choice((5, 8, 11, 15))
+        span = 360.0 / 2 ** zoom
+        bbox = f"{lon - span},{lat - span / 2},{lon + span},{lat + span / 2}"
+        return "/api/poles/map", {"query_string": {"bbox": bbox, "zoom": zoom}}
+
+    def breakdown():
+        state = random.choice(states)
+        if random.random() < 0.5:
+            return "/api/stats/breakdown", {"query_string": {"level": "state"}}
+        return "/api/stats/breakdown", {"query_string": {"level": "district", "state": state}}
+
+    mix = (
+        (20, "GET /api/stats", lambda: ("/api/stats", {})),
+        (15, "GET /api/alerts", lambda: ("/api/alerts", {})),
+        (15, "GET /api/poles?since", poles_since),
+        (15, "GET /api/poles/map", poles_map),
+        (10, "GET /api/telemetry", lambda: ("/api/telemetry", {"query_string": {
+            "pole_id": pole_id(random.randrange(poles)), "limit": 100}})),
+        (10, "GET /api/stats/breakdown", breakdown),
+        (1, "GET /api/export/alerts", lambda: ("/api/export/alerts", {})),
+        (14, "POST /api/iot/data", lambda: ("/api/iot/data", {"json": {
+            "pole_id": pole_id(random.randrange(poles)), "status": random.choice(("ON", "OFF"))}})),
+    )
+    weights = [weight for weight, _, _ in mix]
+    calls = []
+    for _, label, build in random.choices(mix, weights=weights, k=requests):
+        path, kwargs = build()
+        calls.append((label, "POST" if label.startswith("POST") else "GET", path, kwargs))
+    return calls
+
+
+def export_calls(repeat):
+    calls = []
+    for _ in range(repeat):
+        calls.append(("GET /api/export/telemetry csv", "GET", "/api/export/telemetry", {}))
+        calls.append(("GET /api/export/telemetry ndjson+gzip", "GET", "/api/export/telemetry",
+                      {"query_string": {"format": "ndjson", "gzip": "1"}}))
+    return calls
+
+
+# -------------------------------
+# 🔹 REPORT
+# -------------------------------
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, elapsed, latencies, errors, route_stats, cache_delta):
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n== {name}: {total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s)")
+    print(f"{'endpoint':40} {'n':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5}")
+    for label in sorted(latencies):
+        ordered = sorted(latencies[label])
+        print(f"{label:40} {len(ordered):6d} {len(ordered) / elapsed:7.0f} "
+              f"{statistics.median(ordered):8.2f} {_percentile(ordered, 0.95):8.2f} "
+              f"{_percentile(ordered, 0.99):8.2f} {errors.get(label, 0):5d}")
+
+    print(f"{'route (per request)':40} {'db ms':>8} {'queries':>8} {'json ms':>8} {'bytes':>10}")
+    for (route, method), stats in sorted(route_stats.items()):
+        n = stats["requests"]
+        print(f"{method + ' ' + route:40} {stats['db_seconds'] * 1000 / n:8.2f} "
+              f"{stats['queries'] / n:8.1f} {stats['serialize_seconds'] * 1000 / n:8.2f} "
+              f"{stats['response_bytes'] // n:10d}")
+    hits, misses = cache_delta
+    if hits + misses:
+        print(f"response cache hit ratio: {hits / (hits + misses):.0%} ({hits}/{hits + misses})")
+
+
+def scenario(app, name, calls, concurrency):
+    from request_metrics import metrics
+    from response_cache import cache
+
+    metrics.reset()
+    hits, misses = cache.hits, cache.misses
+    elapsed, latencies, errors = run(app, calls, concurrency)
+    report(name, elapsed, latencies, errors, metrics.snapshot(),
+           (cache.hits - hits, cache.misses - misses))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--poles', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', type=int, default=60, help="minutes between seeded readings")
+    parser.add_argument('--alerts', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=5000, help="dashboard polling requests")
+    parser.add_argument('--batch', type=int, default=100, help="readings per gateway batch")
+    parser.add_argument('--gateway-share', type=float, default=0.5,
+                        help="fraction of the burst sent through /api/iot/data/batch")
+    parser.add_argument('--exports', type=int, default=3)
+    parser.add_argument('--scenarios', default='burst,polling,export')
+    parser.add_argument('--sqlite', default='/tmp/solar_bench.db', help="stand-in database file")
+    parser.add_argument('--mysql', action='store_true', help="use the DB_* database instead of the stand-in")
+    parser.add_argument('--reset', action='store_true', help="delete existing rows before seeding (--mysql)")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the previously seeded fleet")
+    args = parser.parse_args()
+
+    if not args.mysql:
+        from bench import standin
+        os.environ.setdefault('SCHEMA_AUTO_MIGRATE', '0')  # the stand-in has the full schema
+        if not args.skip_seed and os.path.exists(args.sqlite):
+            os.remove(args.sqlite)
+        standin.install(args.sqlite, pool_size=args.concurrency)
+
+    if not args.skip_seed:
+        if _existing_poles():
+            if not args.reset:
+                raise SystemExit("poles table is not empty; pass --reset to replace it (scratch databases only)")
+            _clear()
+        started = time.perf_counter()
+        readings = seed(args.poles, args.days, args.interval, args.alerts)
+        print(f"seeded {args.poles} poles, {readings} readings, {args.alerts} alerts "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    # Imported after the pool is in place; loads registry and indexes on first use
+    from app import app
+
+    with app.test_client() as warmup:
+        for path in ("/api/stats", "/api/poles", "/api/stats/breakdown", "/api/poles/map?bbox=60,5,100,40&zoom=5"):
+            warmup.get(path).close()
+
+    chosen = args.scenarios.split(',')
+    if 'burst' in chosen:
+        scenario(app, "dawn/dusk burst", burst_calls(args.poles, args.batch, args.gateway_share),
+                 args.concurrency)
+    if 'polling' in chosen:
+        scenario(app, "dashboard polling", polling_calls(args.poles, args.requests), args.concurrency)
+    if 'export' in chosen:
+        scenario(app, "export", export_calls(args.exports), min(args.concurrency, 2))
@@ -0,0 +1,176 @@
+# bench/bench_ingest.py
+"""Load test for ``POST /api/iot/data``: sync Flask vs. async ASGI ingest.
+
+Simulates N devices posting at once, each sending ``--requests`` readings on
+a fresh connection (like an ESP32 HTTPClient) unless ``--keepalive``, and
+reports requests/s and latency percentiles per target and device count.
+Start both servers against the same local database first, e.g.::
+
+    gunicorn -w 4 --threads 16 -b :5000 app:app
+    uvicorn asgi_ingest:app --port 5001
+
+    cd backend && python -m bench.bench_ingest \\
+        --target sync=http://127.0.0.1:5000 --target async=http://127.0.0.1:5001 \\
+        --devices 1000,5000,10000 --poles 2000
+
+10k devices need ~10k sockets on both sides; the harness raises its own
+open-file limit as far as the hard limit allows. Pole ids are
+``--pole-format`` applied to ``0..--poles-1`` (``P00000`` ...); seed that
+fleet first with ``python -m bench.bench_api --mysql --poles 2000
+--scenarios none``. Unknown poles answer 404 and are reported apart.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PATH = "/api/iot/data"
+
+
+def _raise_fd_limit():
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        target = hard if hard != resource.RLIM_INFINITY else 65536
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+
+def _request(host, pole_id, keepalive):
+    body = json.dumps({
+        "pole_id": pole_id,
+        "status": random.choice(("ON", "OFF")),
+        "signal_strength": random.randint(-95, -50),
+        "firmware_version": "bench",
+    }).encode()
+    head = (f"POST {PATH} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keepalive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = None
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    if length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+    return status
+
+
+async def _device(url, pole_id, requests, keepalive, interval, start, results):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    await start.wait()
+    reader = writer = None
+    for _ in range(requests):
+        began = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(_request(parts.netloc, pole_id, keepalive))
+            await writer.drain()
+            status = await _read_response(reader)
+            results.append((status, time.perf_counter() - began))
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            results.append((None, time.perf_counter() - began))
+            status = None
+        if writer is not None and (not keepalive or status is None):
+            writer.close()
+            reader = writer = None
+        if interval:
+            await asyncio.sleep(interval)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, devices, requests, poles, pole_format, keepalive=False, interval=0.0):
+    results = []
+    start = asyncio.Event()
+    tasks = [asyncio.create_task(_device(url, pole_format.format(i % poles), requests,
+                                         keepalive, interval, start, results))
+             for i in range(devices)]
+    await asyncio.sleep(0)
+    began = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - began
+
+
+def summarize(results, elapsed):
+    latencies = sorted(latency for _, latency in results)
+    ok = sum(1 for status, _ in results if status is not None and status < 300)
+    unknown = sum(1 for status, _ in results if status == 404)
+    failed = len(results) - ok - unknown
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(results),
+        "ok": ok,
+        "unknown": unknown,
+        "failed": failed,
+        "rps": (ok + unknown) / elapsed if elapsed else 0.0,
+        "p50_ms": quantiles[49] * 1000 if quantiles else 0.0,
+        "p99_ms": quantiles[98] * 1000 if quantiles else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent device load against /api/iot/data")
+    parser.add_argument('--target', action='append', required=True,
+                        help="name=http://host:port (repeatable)")
+    parser.add_argument('--devices', default="1000,5000,10000",
+                        help="comma-separated concurrent device counts")
+    parser.add_argument('--requests', type=int, default=5, help="readings per device")
+    parser.add_argument('--poles', type=int, default=2000)
+    parser.add_argument('--pole-format', default="P{:05d}")
+    parser.add_argument('--keepalive', action='store_true', help="reuse one connection per device")
+    parser.add_argument('--interval', type=float, default=0.0, help="seconds between a device's readings")
+    args = parser.parse_args()
+
+    limit = _raise_fd_limit()
+    counts = [int(n) for n in args.devices.split(',') if n]
+    if limit is not None and max(counts) + 64 > limit:
+        print(f"warning: open-file limit {limit} is below {max(counts)} devices; expect connect errors")
+
+    targets = [t.partition('=')[::2] if '=' in t else (t, t) for t in args.target]
+    print(f"{'target':<10} {'devices':>8} {'requests':>9} {'ok':>8} {'404':>6} {'failed':>7} "
+          f"{'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for devices in counts:
+        for name, url in targets:
+            results, elapsed = asyncio.run(run_load(url, devices, args.requests, args.poles,
+                                                    args.pole_format, args.keepalive, args.interval))
+            s = summarize(results, elapsed)
+            print(f"{name:<10} {devices:>8} {s['requests']:>9} {s['ok']:>8} {s['unknown']:>6} "
+                  f"{s['failed']:>7} {s['rps']:>9.0f} {s['p50_ms']:>8.1f} {s['p99_ms']:>8.1f} "
+                  f"{s['max_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
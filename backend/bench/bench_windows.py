@@ -0,0 +1,134 @@
+# bench/bench_windows.py
+"""Dawn/dusk telemetry query: TIME(timestamp) scan vs. indexed time_window.
+
+Seeds a scratch copy of telemetry_data (``bench_telemetry``, with the
+telemetry_data indexes from ``schema.py``) in the database configured by
+DB_HOST/DB_USER/DB_PASSWORD/DB_NAME, then times the legacy TIME() filter
+against the query ``/api/telemetry`` actually runs (``window_query``), for
+one pole and for the whole fleet. Point it at a local MySQL/MariaDB, never
+at production::
+
+    cd backend && python -m bench.bench_windows --rows 2000000 --poles 2000
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+from db import db_connection
+from schema import MIGRATIONS
+from telemetry_windows import WINDOWS, window_for, window_query
+
+TABLE = "bench_telemetry"
+# Page size used by the dashboard's paged /api/telemetry calls
+PAGE_ROWS = 200
+
+
+def legacy_query(pole_id=None):
+    """The pre-time_window shape: TIME() on every row, then sort."""
+    clauses = [" OR ".join("TIME(timestamp) BETWEEN %s AND %s" for _ in WINDOWS)]
+    params = [bound for _, start, end in WINDOWS for bound in (start, end)]
+    if pole_id:
+        clauses.insert(0, "pole_id = %s")
+        params.insert(0, pole_id)
+    query = f"""
+        SELECT id, pole_id, status, timestamp
+        FROM {TABLE}
+        WHERE {' AND '.join(f'({clause})' for clause in clauses)}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT {PAGE_ROWS}
+    """
+    return query, params
+
+
+def telemetry_indexes():
+    """schema.py's telemetry_data indexes, pointed at the bench table."""
+    return [statement.replace(" ON telemetry_data ", f" ON {TABLE} ")
+            for _, statement in MIGRATIONS
+            if statement.startswith("CREATE INDEX") and " ON telemetry_data " in statement]
+
+
+def seed(rows, poles, days, chunk=10000):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {TABLE} (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                pole_id VARCHAR(64) NOT NULL,
+                status VARCHAR(8) NOT NULL,
+                signal_strength INT NULL,
+                timestamp DATETIME NOT NULL,
+                time_window VARCHAR(16) NULL
+            )
+        """)
+        for statement in telemetry_indexes():
+            cursor.execute(statement)
+        start = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+        span = days * 86400
+        batch = []
+        for i in range(rows):
+            ts = start + datetime.timedelta(seconds=random.randrange(span))
+            batch.append((f"P{i % poles:05d}", random.choice(("ON", "OFF")),
+                          random.randint(-100, -50), ts, window_for(ts)))
+            if len(batch) >= chunk:
+                cursor.executemany(f"""
+                    INSERT INTO {TABLE} (pole_id, status, signal_strength, timestamp, time_window)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, batch)
+                conn.commit()
+                batch = []
+        if batch:
+            cursor.executemany(f"""
+                INSERT INTO {TABLE} (pole_id, status, signal_strength, timestamp, time_window)
+                VALUES (%s, %s, %s, %s, %s)
+            """, batch)
+        cursor.execute(f"ANALYZE TABLE {TABLE}")
+        cursor.fetchall()
+        conn.commit()
+
+
+def time_query(queries):
+    """Run each ``(query, params)`` once; latency percentiles in ms."""
+    latencies = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for query, params in queries:
+            started = time.perf_counter()
+            cursor.execute(query, params)
+            cursor.fetchall()
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--poles', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--skip-seed', action='store_true', help="reuse an existing bench table")
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(args.rows, args.poles, args.days)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    def poles():
+        return [f"P{random.randrange(args.poles):05d}" for _ in range(args.samples)]
+
+    cases = [
+        ("one pole, TIME(timestamp) ", [legacy_query(pole_id) for pole_id in poles()]),
+        ("one pole, time_window     ", [window_query(pole_id, PAGE_ROWS, table=TABLE) for pole_id in poles()]),
+        ("fleet,    TIME(timestamp) ", [legacy_query()] * args.samples),
+        ("fleet,    time_window     ", [window_query(None, PAGE_ROWS, table=TABLE)] * args.samples),
+    ]
+    for label, queries in cases:
+        print(f"{label}: {time_query(queries)}")
@@ -0,0 +1,150 @@
+# bench/standin.py
+"""SQLite stand-in for the MySQL connection behind ``get_db_connection``.
+
+Good enough for the statements the API issues: ``%s`` placeholders,
+dictionary cursors, ``executemany``/``fetchmany`` and DATETIME columns as
+``datetime`` objects. Absolute timings are not MySQL timings; use it to
+compare code paths and to spot regressions, and a scratch MySQL/MariaDB
+(``bench_api --mysql``) for capacity numbers.
+
+    from bench import standin
+    standin.install("/tmp/bench.db")   # before the app's first request
+"""
+import datetime
+import sqlite3
+
+import db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poles (
+    pole_id TEXT PRIMARY KEY, cluster_id TEXT, latitude REAL, longitude REAL,
+    status TEXT, communication_status TEXT, state TEXT, district TEXT,
+    city_or_village TEXT, mode TEXT, firmware_version TEXT, update_time DATETIME,
+    display_status TEXT, status_changed_at DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_poles_update_time ON poles (update_time);
+CREATE INDEX IF NOT EXISTS idx_poles_status_changed_at ON poles (status_changed_at);
+
+CREATE TABLE IF NOT EXISTS telemetry_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, pole_id TEXT, status TEXT,
+    signal_strength INTEGER, timestamp DATETIME, time_window TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_telemetry_pole_ts ON telemetry_data (pole_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_telemetry_ts ON telemetry_data (timestamp);
+CREATE INDEX IF NOT EXISTS idx_telemetry_pole_window_ts ON telemetry_data (pole_id, time_window, timestamp);
+CREATE INDEX IF NOT EXISTS idx_telemetry_window_ts ON telemetry_data (time_window, timestamp);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, pole_id TEXT, message TEXT, severity TEXT,
+    alert_status TEXT, alert_type TEXT, technician_id INTEGER, action_taken TEXT,
+    remarks TEXT, timestamp DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts_id ON alerts (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_pole_ts_id ON alerts (pole_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_status_ts_id ON alerts (alert_status, timestamp, id);
+
+CREATE TABLE IF NOT EXISTS telemetry_rollup (
+    pole_id TEXT NOT NULL, bucket TEXT NOT NULL, bucket_start DATETIME NOT NULL,
+    reading_count INTEGER NOT NULL DEFAULT 0, on_seconds INTEGER NOT NULL DEFAULT 0,
+    off_seconds INTEGER NOT NULL DEFAULT 0, signal_min INTEGER, signal_sum INTEGER NOT NULL DEFAULT 0,
+    signal_count INTEGER NOT NULL DEFAULT 0, first_on DATETIME, first_off DATETIME,
+    PRIMARY KEY (pole_id, bucket, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, email TEXT, phone TEXT,
+    password_hash TEXT, role TEXT
+);
+"""
+
+# Same text form for stored values and bound parameters, so comparisons hold
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_converter("DATETIME", lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+
+
+def _translate(query):
+    return query.replace('%s', '?').replace('<=>', 'IS')
+
+
+class StandinCursor:
+    def __init__(self, raw, dictionary):
+        self._raw = raw
+        self._dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([d[0] for d in self._raw.description], row))
+
+    def execute(self, query, params=()):
+        self._raw.execute(_translate(query), tuple(params or ()))
+        self.rowcount = self._raw.rowcount
+        self.lastrowid = self._raw.lastrowid
+
+    def executemany(self, query, rows):
+        self._raw.executemany(_translate(query), [tuple(row) for row in rows])
+        self.rowcount = self._raw.rowcount
+
+    def fetchone(self):
+        return self._row(self._raw.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._raw.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._raw.fetchall()]
+
+    def __iter__(self):
+        for row in self._raw:
+            yield self._row(row)
+
+    def close(self):
+        self._raw.close()
+
+
+class StandinConnection:
+    """The subset of ``mysql.connector`` connections the backend uses."""
+
+    def __init__(self, path):
+        self._raw = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                    check_same_thread=False, timeout=30)
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None, **kwargs):
+        return StandinCursor(self._raw.cursor(), dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        pass
+
+    def close(self):
+        self._raw.close()
+
+
+def create_schema(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+
+
+def install(path, pool_size=8):
+    """Point the backend's connection pool at the SQLite file ``path``."""
+    create_schema(path)
+    db.use_pool(db.ConnectionPool(size=pool_size, connect=lambda: StandinConnection(path)))
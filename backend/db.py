@@ -1,26 +1,381 @@
 # db.py
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import mysql.connector
+from flask import g, has_app_context, jsonify
 
 
-def get_db_connection():
-    """Return a MySQL connection using environment variables with sensible defaults.
+class PoolExhaustedError(RuntimeError):
+    """Raised when no pooled connection became free within the checkout timeout."""
+
+
+def connection_settings():
+    """MySQL connection arguments from environment variables with sensible defaults.
 
     Set the following environment variables to override defaults:
     - DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
     """
-    host = os.getenv('DB_HOST', 'localhost')
-    user = os.getenv('DB_USER', 'TechnovXP')
-    password = os.getenv('DB_PASSWORD', 'TechnnovXp2025')
-    database = os.getenv('DB_NAME', 'solar_dashboard')
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'TechnovXP'),
+        'password': os.getenv('DB_PASSWORD', 'TechnnovXp2025'),
+        'database': os.getenv('DB_NAME', 'solar_dashboard'),
+    }
+
+
+# DB-API exception classes raised for the statement's data rather than the
+# connection (mysql.connector and sqlite3 both use these names)
+DATA_ERRORS = ('DataError', 'IntegrityError', 'ProgrammingError', 'NotSupportedError')
 
+
+def is_data_error(exc):
+    """True when retrying ``exc``'s statement with the same rows would fail again."""
+    return any(cls.__name__ in DATA_ERRORS for cls in type(exc).__mro__)
+
+
+def _connect():
+    """Open a raw MySQL connection (see ``connection_settings``)."""
     try:
-        return mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database,
-        )
+        return mysql.connector.connect(**connection_settings())
     except mysql.connector.Error as e:
         # Raise a clearer runtime error so the Flask logs show a readable message
         raise RuntimeError(f"Database connection failed ({e.errno}): {e.msg}") from e
+
+
+class QueryStats:
+    """Time spent in, and number of, DB calls made while serving one request."""
+
+    __slots__ = ('seconds', 'queries')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+
+class TimedCursor:
+    """Cursor proxy adding each call's wall time to a ``QueryStats``."""
+
+    __slots__ = ('_raw', '_stats')
+
+    def __init__(self, raw, stats):
+        self._raw = raw
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._raw.close()
+
+    def _timed(self, method, args, kwargs, query):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._stats.seconds += time.perf_counter() - start
+            self._stats.queries += query
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._raw.execute, args, kwargs, 1)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._raw.executemany, args, kwargs, 1)
+
+    def fetchone(self):
+        return self._timed(self._raw.fetchone, (), {}, 0)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._raw.fetchmany, args, kwargs, 0)
+
+    def fetchall(self):
+        return self._timed(self._raw.fetchall, (), {}, 0)
+
+
+class PooledConnection:
+    """Thin proxy around a raw connection.
+
+    Behaves like the underlying mysql connection, except that ``close()`` hands
+    the connection back to its pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        # Inside an instrumented request, time every DB call
+        stats = g.get('_query_stats') if has_app_context() else None
+        return TimedCursor(cursor, stats) if stats is not None else cursor
+
+    def close(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._pool._release(self._raw, self._created_at)
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections.
+
+    - ``size``: maximum number of open connections
+    - ``timeout``: seconds a caller waits in the queue when every connection is busy
+    - ``max_age``: seconds after which a connection is recycled instead of reused
+    """
+
+    def __init__(self, size=10, timeout=5.0, max_age=1800.0, connect=_connect):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self._connect = connect
+        self._idle = deque()  # (raw, created_at)
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._health_failures = 0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+
+    # -------------------------------
+    # 🔹 CHECKOUT / RELEASE
+    # -------------------------------
+    def get_connection(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            candidate = None
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolExhaustedError(
+                            f"No database connection available within {self.timeout}s "
+                            f"(pool size {self.size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                # Health checks and new connects happen outside the lock; a new
+                # slot is reserved in _open first so the pool never overshoots.
+                if self._idle:
+                    candidate = self._idle.pop()
+                else:
+                    self._open += 1
+
+            if candidate is None:
+                try:
+                    raw = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                return self._checked_out(raw, time.monotonic(), started)
+
+            raw, created_at = candidate
+            if self._usable(raw, created_at):
+                return self._checked_out(raw, created_at, started)
+            with self._cond:
+                self._discard(raw)
+                self._cond.notify()
+
+    def _checked_out(self, raw, created_at, started):
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._in_use += 1
+            self._checkouts += 1
+            self._checkout_total += elapsed
+            self._checkout_max = max(self._checkout_max, elapsed)
+        return PooledConnection(self, raw, created_at)
+
+    def _usable(self, raw, created_at):
+        """Health check run on checkout: recycle old connections, ping the rest."""
+        if time.monotonic() - created_at > self.max_age:
+            with self._cond:
+                self._recycled += 1
+            return False
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._health_failures += 1
+            return False
+
+    def _discard(self, raw):
+        self._open -= 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _release(self, raw, created_at):
+        healthy = True
+        try:
+            # Never hand a half-finished transaction to the next caller
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and time.monotonic() - created_at <= self.max_age:
+                self._idle.append((raw, created_at))
+            else:
+                if healthy:
+                    self._recycled += 1
+                self._discard(raw)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                raw, _ = self._idle.pop()
+                self._discard(raw)
+
+    # -------------------------------
+    # 🔹 METRICS
+    # -------------------------------
+    def metrics(self):
+        with self._cond:
+            avg = self._checkout_total / self._checkouts if self._checkouts else 0.0
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "health_check_failures": self._health_failures,
+                "checkout_latency_avg_ms": round(avg * 1000, 3),
+                "checkout_latency_max_ms": round(self._checkout_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use.
+
+    Sized by DB_POOL_SIZE, DB_POOL_TIMEOUT (seconds) and DB_POOL_MAX_AGE (seconds).
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=int(os.getenv('DB_POOL_SIZE', '10')),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+                    max_age=float(os.getenv('DB_POOL_MAX_AGE', '1800')),
+                )
+    return _pool
+
+
+_export_pool = None
+
+
+def get_export_pool():
+    """Separate, smaller pool for long-running streamed exports.
+
+    A slow client holds its connection for the whole download; keeping those
+    out of the request pool means exports queue behind each other instead of
+    starving ingest. Sized by EXPORT_POOL_SIZE and EXPORT_POOL_TIMEOUT; opens
+    connections the same way as the request pool.
+    """
+    global _export_pool
+    if _export_pool is None:
+        request_pool = get_pool()
+        with _pool_lock:
+            if _export_pool is None:
+                _export_pool = ConnectionPool(
+                    size=int(os.getenv('EXPORT_POOL_SIZE', '3')),
+                    timeout=float(os.getenv('EXPORT_POOL_TIMEOUT', '10')),
+                    max_age=request_pool.max_age,
+                    connect=request_pool._connect,
+                )
+    return _export_pool
+
+
+def get_db_connection():
+    """Check a connection out of the pool.
+
+    Calling ``close()`` on the result returns it to the pool. Inside a Flask
+    request the connection is also tracked on ``g`` so it is returned at
+    teardown even if the view raised before closing it.
+    """
+    conn = get_pool().get_connection()
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
+    return conn
+
+
+@contextmanager
+def db_connection():
+    """``with db_connection() as conn:`` for code running outside a request."""
+    conn = get_pool().get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def use_pool(pool):
+    """Replace the process-wide pool, e.g. with one over a benchmark stand-in."""
+    global _pool, _export_pool
+    with _pool_lock:
+        _pool = pool
+        _export_pool = None
+
+
+def get_pool_metrics():
+    return get_pool().metrics()
+
+
+def _release_request_connections(exc=None):
+    for conn in g.pop('_db_connections', []):
+        conn.close()
+
+
+def init_app(app):
+    """Return pooled connections at the end of every app context."""
+    app.teardown_appcontext(_release_request_connections)
+
+    @app.errorhandler(PoolExhaustedError)
+    def _pool_exhausted(e):
+        return jsonify({"error": "Database busy, try again"}), 503
@@ -0,0 +1,75 @@
+# events.py
+import itertools
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+
+class EventBus:
+    """In-process pub/sub fan-out with a bounded replay buffer.
+
+    Every published event gets a monotonically increasing id. Subscribers get
+    their own bounded queue; one that falls too far behind is dropped and has
+    to reconnect (replaying from its ``Last-Event-ID``). The bus lives in one
+    process, so each worker process streams the events it ingested itself.
+    """
+
+    def __init__(self, replay_size=1000, subscriber_queue_size=500):
+        self._ids = itertools.count(1)
+        self._replay = deque(maxlen=replay_size)  # (id, event, data)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.subscriber_queue_size = subscriber_queue_size
+
+    def publish(self, event, payload):
+        data = json.dumps(payload, default=str)
+        with self._lock:
+            item = (next(self._ids), event, data)
+            self._replay.append(item)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(item)
+            except queue.Full:
+                # Too slow to keep up; close it so the client reconnects and replays
+                self.unsubscribe(subscriber)
+                try:
+                    subscriber.put_nowait(None)
+                except queue.Full:
+                    pass
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber.
+
+        Returns ``(queue, backlog, complete)``: events after ``last_event_id``
+        still in the replay buffer, and whether that backlog covers everything
+        the client missed. ``complete`` is False when the buffer has already
+        rotated past ``last_event_id`` and the client should refetch in full.
+        """
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if last_event_id is None:
+                return subscriber, [], True
+            backlog = [item for item in self._replay if item[0] > last_event_id]
+            oldest = self._replay[0][0] if self._replay else 1
+            newest = self._replay[-1][0] if self._replay else 0
+        # An id newer than anything we issued means the server restarted
+        complete = oldest <= last_event_id + 1 and last_event_id <= newest
+        return subscriber, backlog, complete
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+bus = EventBus(
+    replay_size=int(os.getenv('EVENT_REPLAY_SIZE', '1000')),
+    subscriber_queue_size=int(os.getenv('EVENT_SUBSCRIBER_QUEUE', '500')),
+)
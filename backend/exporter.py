@@ -0,0 +1,323 @@
+# exporter.py
+import csv
+import datetime
+import decimal
+import io
+import json
+import os
+import zlib
+from collections import namedtuple
+
+from mysql.connector import FieldType
+
+from db import get_export_pool
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # columnar formats are optional
+    pa = None
+    pq = None
+
+# dataset -> (table, unique key for keyset paging, column used for date ranges)
+EXPORT_TABLES = {
+    'telemetry': ('telemetry_data', 'id', 'timestamp'),
+    'alerts': ('alerts', 'id', 'timestamp'),
+    'poles': ('poles', 'pole_id', 'update_time'),
+}
+
+BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', '1000'))
+# Parquet row groups / Arrow record batches are built from this many rows
+ROW_GROUP_ROWS = int(os.getenv('EXPORT_ROW_GROUP_ROWS', '65536'))
+
+# One fetch from the cursor: column names, DB type codes and row tuples
+Batch = namedtuple('Batch', ['columns', 'types', 'rows'])
+
+
+def iter_batches(dataset, start=None, end=None, keyset=False, batch_rows=BATCH_ROWS, conditions=()):
+    """Yield ``Batch`` tuples of at most ``batch_rows`` rows.
+
+    The default path reads one unbuffered query with ``fetchmany`` so rows
+    stream off the socket as they are consumed. ``keyset=True`` instead issues
+    one short ``WHERE key > last ORDER BY key LIMIT n`` query per batch, each
+    on a connection checked out for that page only, so a slow client holds no
+    connection between pages; it suits very large ranges.
+
+    Connections come from the export pool (``db.get_export_pool``), not the
+    request pool, and are not tracked on ``g`` because the generator outlives
+    the request; they are returned when the generator finishes or is closed
+    by a disconnecting client.
+
+    ``conditions`` adds extra ``(sql, params)`` filters, ANDed together.
+    An empty result still yields one ``Batch`` with no rows, so renderers
+    know the columns (a columnar file needs its schema even with no rows).
+    """
+    table, key, date_column = EXPORT_TABLES[dataset]
+    where = []
+    params = []
+    if start and end:
+        where.append(f"{date_column} BETWEEN %s AND %s")
+        params = [start, end]
+    for sql, extra in conditions:
+        where.append(sql)
+        params.extend(extra)
+
+    pool = get_export_pool()
+    if not keyset:
+        conn = pool.get_connection()
+        try:
+            cursor = conn.cursor(buffered=False)
+            query = f"SELECT * FROM {table}"
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            cursor.execute(query, params)
+            columns = [d[0] for d in cursor.description]
+            types = [d[1] for d in cursor.description]
+            empty = True
+            while True:
+                rows = cursor.fetchmany(batch_rows)
+                if not rows:
+                    break
+                empty = False
+                yield Batch(columns, types, rows)
+            if empty:
+                yield Batch(columns, types, [])
+            cursor.close()
+        finally:
+            conn.close()
+        return
+
+    last_key = None
+    key_index = None
+    while True:
+        clauses = list(where)
+        page_params = list(params)
+        if last_key is not None:
+            clauses.append(f"{key} > %s")
+            page_params.append(last_key)
+        query = f"SELECT * FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY {key} LIMIT {int(batch_rows)}"
+
+        with pool.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, page_params)
+            columns = [d[0] for d in cursor.description]
+            types = [d[1] for d in cursor.description]
+            rows = cursor.fetchall()
+            cursor.close()
+        if not rows:
+            if last_key is None:
+                yield Batch(columns, types, [])
+            break
+        if key_index is None:
+            key_index = columns.index(key)
+        yield Batch(columns, types, rows)
+        if len(rows) < batch_rows:
+            break
+        last_key = rows[-1][key_index]
+
+
+def prefetched(batches):
+    """Start ``batches`` now, so a busy export pool or a failing query raises
+    while the view can still answer with an error instead of a cut stream."""
+    first = next(batches, None)
+
+    def rest():
+        if first is None:
+            return
+        yield first
+        yield from batches
+
+    return rest()
+
+
+def iter_csv(batches):
+    """Render batches as CSV text chunks, one chunk per batch."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    wrote_header = False
+    for batch in batches:
+        if not batch.rows:
+            continue
+        if not wrote_header:
+            writer.writerow(batch.columns)
+            wrote_header = True
+        writer.writerows(batch.rows)
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+    if not wrote_header:
+        yield "No data available"
+
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip stream on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+def iter_ndjson(batches):
+    """Render batches as newline-delimited JSON objects, one chunk per batch."""
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(batch.columns, row)), default=_json_value) + "\n"
+            for row in batch.rows
+        )
+
+
+# -------------------------------
+# 🔹 COLUMNAR (pyarrow)
+# -------------------------------
+def _arrow_type(type_code):
+    """Map a MySQL field type to an Arrow type.
+
+    The schema is fixed before the first row group is written, so nothing is
+    inferred from the data (an all-NULL first group would type a column as
+    ``null``); unknown types are exported as strings.
+    """
+    if type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        return pa.timestamp('us')
+    if type_code in (FieldType.DATE, FieldType.NEWDATE):
+        return pa.date32()
+    if type_code == FieldType.TIME:
+        return pa.time64('us')
+    if type_code in (FieldType.TINY, FieldType.SHORT, FieldType.INT24,
+                     FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR, FieldType.BIT):
+        return pa.int64()
+    if type_code in (FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL):
+        return pa.float64()
+    # VARCHAR/CHAR/ENUM/SET, TEXT and BLOB columns, JSON, and anything else
+    return pa.string()
+
+
+def _time_of_day(value):
+    """MySQL TIME arrives as a timedelta; only values within one day fit time64."""
+    if isinstance(value, datetime.timedelta):
+        if datetime.timedelta(0) <= value < datetime.timedelta(days=1):
+            return (datetime.datetime.min + value).time()
+        return None
+    return value
+
+
+def _arrow_array(values, arrow_type):
+    if arrow_type == pa.float64():
+        values = [float(v) if isinstance(v, decimal.Decimal) else v for v in values]
+    elif arrow_type == pa.string():
+        values = [v if v is None or isinstance(v, str) else _json_value(v) for v in values]
+    elif arrow_type == pa.time64('us'):
+        values = [_time_of_day(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def _record_batches(batches):
+    """Return the Arrow schema of ``batches`` and an iterator regrouping them
+    into typed record batches of ~ROW_GROUP_ROWS rows.
+
+    The schema comes from the first batch's column types, so writers can be
+    opened (and an empty export is still a valid zero-row file).
+    """
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        return pa.schema([]), iter(())
+    schema = pa.schema([(name, _arrow_type(type_code))
+                        for name, type_code in zip(first.columns, first.types)])
+
+    def build(pending):
+        columns = list(zip(*pending))
+        arrays = [_arrow_array(list(col), field.type) for col, field in zip(columns, schema)]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def regrouped():
+        pending = list(first.rows)
+        for batch in batches:
+            if len(pending) >= ROW_GROUP_ROWS:
+                yield build(pending)
+                pending = []
+            pending.extend(batch.rows)
+        if pending:
+            yield build(pending)
+
+    return schema, regrouped()
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_arrow(batches):
+    """Render batches as an Arrow IPC stream, one record batch per row group."""
+    schema, record_batches = _record_batches(batches)
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for record_batch in record_batches:
+        writer.write_batch(record_batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def iter_parquet(batches):
+    """Render batches as a zstd-compressed Parquet file, one row group at a time."""
+    schema, record_batches = _record_batches(batches)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for record_batch in record_batches:
+        writer.write_batch(record_batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+# format -> (renderer, mimetype, file extension, needs pyarrow)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv', 'csv', False),
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson', False),
+    'arrow': (iter_arrow, 'application/vnd.apache.arrow.stream', 'arrows', True),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet', 'parquet', True),
+}
+
+
+def columnar_available():
+    return pa is not None
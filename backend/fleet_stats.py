@@ -0,0 +1,263 @@
+# fleet_stats.py
+import os
+import threading
+import datetime
+import time
+
+from db import db_connection
+from pole_registry import registry, display_status
+
+STATS_QUERY = """
+    SELECT COUNT(*) AS total,
+           COALESCE(SUM(status = 'ON'), 0) AS active,
+           COALESCE(SUM(status = 'OFF'), 0) AS inactive,
+           (SELECT COUNT(*) FROM alerts WHERE alert_status = 'ACTIVE') AS alerts
+    FROM poles
+"""
+
+
+def query_stats(cursor):
+    """Dashboard summary in a single round trip."""
+    cursor.execute(STATS_QUERY)
+    row = cursor.fetchone() or {}
+    # SUM() comes back as DECIMAL; keep the JSON payload integer-typed
+    return {key: int(row.get(key) or 0) for key in ('total', 'active', 'inactive', 'alerts')}
+
+
+def status_delta(previous, current):
+    """How a pole's ON/OFF transition moves the active/inactive counts."""
+    delta = {'active': 0, 'inactive': 0}
+    if previous != current:
+        for status, step in ((previous, -1), (current, 1)):
+            if status == 'ON':
+                delta['active'] += step
+            elif status == 'OFF':
+                delta['inactive'] += step
+    return delta
+
+
+class FleetCounters:
+    """In-memory total/active/inactive/active-alert counters.
+
+    Seeded from ``query_stats`` and kept current by the ingest path. A full
+    recount every ``reconcile_interval`` seconds corrects drift from changes
+    made outside the API (alerts closed by hand, poles added in the DB).
+    """
+
+    def __init__(self, reconcile_interval=300.0):
+        self.reconcile_interval = reconcile_interval
+        self._counts = None
+        self._reconciled_at = None
+        self._lock = threading.Lock()
+        self.drift = 0
+
+    def reconcile(self):
+        """Recount from the DB. Returns how far the counters had drifted."""
+        with db_connection() as conn:
+            fresh = query_stats(conn.cursor(dictionary=True))
+        with self._lock:
+            drift = 0
+            if self._counts is not None:
+                drift = sum(abs(fresh[k] - self._counts[k]) for k in fresh)
+                self.drift += drift
+            self._counts = fresh
+            self._reconciled_at = time.monotonic()
+        return drift
+
+    def snapshot(self):
+        reconciled_at = self._reconciled_at
+        if reconciled_at is None or time.monotonic() - reconciled_at > self.reconcile_interval:
+            self.reconcile()
+        with self._lock:
+            return dict(self._counts)
+
+    def current(self):
+        """Counters as they stand, without reconciling; None until first seeded."""
+        with self._lock:
+            return dict(self._counts) if self._counts is not None else None
+
+    def pole_status_changed(self, previous, current):
+        if previous == current:
+            return
+        delta = status_delta(previous, current)
+        with self._lock:
+            if self._counts is None:
+                return
+            for key, step in delta.items():
+                self._counts[key] += step
+
+    def alerts_opened(self, count):
+        with self._lock:
+            if self._counts is not None:
+                self._counts['alerts'] += count
+
+
+# -------------------------------
+# 🔹 REGIONAL BREAKDOWN
+# -------------------------------
+# level -> pole columns forming the group key
+BREAKDOWN_LEVELS = {
+    'state': ('state',),
+    'district': ('state', 'district'),
+    'city': ('state', 'district', 'city_or_village'),
+    'cluster': ('cluster_id',),
+}
+
+_DISPLAY_FIELDS = {'ONLINE': 'online', 'OFFLINE': 'offline', 'MAINTENANCE': 'maintenance'}
+_STATUS_FIELDS = {'ON': 'on', 'OFF': 'off'}
+
+
+class GroupCounts:
+    __slots__ = ('total', 'online', 'offline', 'maintenance', 'on', 'off', 'alerts', 'firmware')
+
+    def __init__(self):
+        self.total = self.online = self.offline = self.maintenance = 0
+        self.on = self.off = self.alerts = 0
+        self.firmware = {}
+
+    def add(self, display, status, firmware, alerts, step):
+        self.total += step
+        field = _DISPLAY_FIELDS.get(display)
+        if field:
+            setattr(self, field, getattr(self, field) + step)
+        field = _STATUS_FIELDS.get(status)
+        if field:
+            setattr(self, field, getattr(self, field) + step)
+        self.alerts += step * alerts
+        count = self.firmware.get(firmware, 0) + step
+        if count:
+            self.firmware[firmware] = count
+        else:
+            self.firmware.pop(firmware, None)
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "online": self.online,
+            "offline": self.offline,
+            "maintenance": self.maintenance,
+            "on": self.on,
+            "off": self.off,
+            "alerts": self.alerts,
+            "firmware": {str(version) if version is not None else "unknown": n
+                         for version, n in self.firmware.items()},
+        }
+
+
+class FleetBreakdown:
+    """Per state/district/city/cluster counters for ``/api/stats/breakdown``.
+
+    Built from the pole registry plus one grouped count of ACTIVE alerts,
+    then kept current from registry change notifications and
+    ``alerts_opened``. A rebuild every ``reconcile_interval`` seconds picks up
+    alerts closed outside the API. Reads cost O(groups at the level).
+    """
+
+    def __init__(self, reconcile_interval=300.0):
+        self.reconcile_interval = reconcile_interval
+        self._groups = {level: {} for level in BREAKDOWN_LEVELS}
+        self._entries = {}  # pole_id -> (group keys per level, display, status, firmware)
+        self._alerts = {}  # pole_id -> ACTIVE alert count
+        self._reconciled_at = None
+        self._lock = threading.Lock()
+
+    def _entry(self, pole, now):
+        keys = tuple(tuple(getattr(pole, column) for column in columns)
+                     for columns in BREAKDOWN_LEVELS.values())
+        display = pole.display_status or display_status(pole.communication_status, pole.update_time, now)
+        return keys, display, pole.status, pole.firmware_version
+
+    def _add(self, entry, alerts, step):
+        keys, display, status, firmware = entry
+        for level, key in zip(BREAKDOWN_LEVELS, keys):
+            groups = self._groups[level]
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = GroupCounts()
+            group.add(display, status, firmware, alerts, step)
+            if group.total <= 0:
+                del groups[key]
+
+    def _apply(self, pole_id, entry):
+        """Swap a pole's contribution; called with the lock held."""
+        old = self._entries.get(pole_id)
+        if old == entry:
+            return
+        alerts = self._alerts.get(pole_id, 0)
+        if old is not None:
+            self._add(old, alerts, -1)
+            del self._entries[pole_id]
+        if entry is not None:
+            self._add(entry, alerts, 1)
+            self._entries[pole_id] = entry
+
+    def poles_changed(self, poles, full=False):
+        """Registry listener. ``full`` means ``poles`` is the whole fleet."""
+        if self._reconciled_at is None:
+            return
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            for pole in poles:
+                self._apply(pole.pole_id, self._entry(pole, now))
+            if full:
+                present = {pole.pole_id for pole in poles}
+                for pole_id in [pid for pid in self._entries if pid not in present]:
+                    self._apply(pole_id, None)
+
+    def alerts_opened(self, pole_ids):
+        with self._lock:
+            if self._reconciled_at is None:
+                return
+            for pole_id in pole_ids:
+                self._alerts[pole_id] = self._alerts.get(pole_id, 0) + 1
+                entry = self._entries.get(pole_id)
+                if entry is not None:
+                    for level, key in zip(BREAKDOWN_LEVELS, entry[0]):
+                        self._groups[level][key].alerts += 1
+
+    def reconcile(self):
+        """Rebuild every group from the registry and the DB's ACTIVE alerts."""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pole_id, COUNT(*) FROM alerts WHERE alert_status = 'ACTIVE' GROUP BY pole_id")
+            alerts = {pole_id: int(count) for pole_id, count in cursor.fetchall()}
+        poles = registry.all()
+        now = datetime.datetime.utcnow()
+        with self._lock:
+            self._groups = {level: {} for level in BREAKDOWN_LEVELS}
+            self._entries = {}
+            self._alerts = alerts
+            for pole in poles:
+                self._apply(pole.pole_id, self._entry(pole, now))
+            self._reconciled_at = time.monotonic()
+
+    def groups(self, level, filters=None):
+        """``[{<key columns>, total, online, ..., firmware}, ...]`` sorted by key.
+
+        ``filters`` maps key columns (e.g. ``state``) to required values.
+        """
+        reconciled_at = self._reconciled_at
+        if reconciled_at is None or time.monotonic() - reconciled_at > self.reconcile_interval:
+            self.reconcile()
+        columns = BREAKDOWN_LEVELS[level]
+        wanted = [(columns.index(column), value) for column, value in (filters or {}).items()
+                  if column in columns]
+        with self._lock:
+            rows = []
+            for key, group in self._groups[level].items():
+                if all(str(key[i]) == value for i, value in wanted):
+                    row = dict(zip(columns, key))
+                    row.update(group.to_dict())
+                    rows.append(row)
+        rows.sort(key=lambda row: tuple(str(row[column] or '') for column in columns))
+        return rows
+
+
+breakdown = FleetBreakdown(reconcile_interval=float(os.getenv('STATS_RECONCILE', '300')))
+registry.add_listener(breakdown.poles_changed)
+
+
+# STATS_MODE=incremental answers /api/stats from counters instead of the DB
+counters = None
+if os.getenv('STATS_MODE', 'query').lower() == 'incremental':
+    counters = FleetCounters(reconcile_interval=float(os.getenv('STATS_RECONCILE', '300')))
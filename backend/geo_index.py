@@ -0,0 +1,207 @@
+# geo_index.py
+"""Grid index over pole coordinates behind ``/api/poles/map``.
+
+Each zoom level up to CLUSTER_MAX_ZOOM has a grid of CELLS_PER_TILE x
+CELLS_PER_TILE cells per map tile, holding a pre-aggregated cluster: pole
+count, coordinate sums (for the centroid) and per-status counts. A viewport
+query touches only the cells it covers, so its cost and payload depend on
+the viewport, not on the fleet. Above CLUSTER_MAX_ZOOM the finest grid holds
+the pole ids themselves and poles are returned individually.
+
+Cells are plain lon/lat degrees rather than Web Mercator tiles, which is
+close enough for clustering at the latitudes the fleet is deployed at.
+
+The index follows the pole registry: it is built on first use and then
+kept current from the registry's change notifications.
+"""
+import datetime
+import math
+import os
+import threading
+
+from pole_registry import registry, display_status
+
+CLUSTER_MAX_ZOOM = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', '14'))
+CELLS_PER_TILE = int(os.getenv('MAP_CELLS_PER_TILE', '4'))
+# Above this many cells a query scans the level's non-empty cells instead
+MAX_SCAN_CELLS = 20000
+
+STATUS_KEYS = ('ONLINE', 'MAINTENANCE', 'OFFLINE', 'ON', 'OFF')
+
+
+def cell_size(zoom):
+    return 360.0 / ((2 ** zoom) * CELLS_PER_TILE)
+
+
+def cell_of(lat, lon, zoom):
+    size = cell_size(zoom)
+    return int(math.floor((lon + 180.0) / size)), int(math.floor((lat + 90.0) / size))
+
+
+def _position(pole):
+    try:
+        lat, lon = float(pole.latitude), float(pole.longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+class Cluster:
+    __slots__ = ('count', 'lat_sum', 'lon_sum', 'statuses')
+
+    def __init__(self):
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.statuses = dict.fromkeys(STATUS_KEYS, 0)
+
+    def add(self, lat, lon, statuses, step):
+        self.count += step
+        self.lat_sum += step * lat
+        self.lon_sum += step * lon
+        counts = self.statuses
+        for status in statuses:
+            if status in counts:
+                counts[status] += step
+
+    def to_dict(self):
+        return {
+            "lat": round(self.lat_sum / self.count, 6),
+            "lon": round(self.lon_sum / self.count, 6),
+            "count": self.count,
+            "status_counts": dict(self.statuses),
+        }
+
+
+class GeoIndex:
+    """Per-zoom cluster grids plus a pole-id grid at the finest level."""
+
+    def __init__(self, max_zoom=CLUSTER_MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self._levels = [{} for _ in range(max_zoom + 1)]  # zoom -> {(ix, iy): Cluster}
+        self._points = {}  # (ix, iy) at max_zoom -> {pole_id: PoleState}
+        self._entries = {}  # pole_id -> (lat, lon, statuses) currently indexed
+        self._lock = threading.Lock()
+        self._built = False
+
+    # -------------------------------
+    # 🔹 MAINTENANCE
+    # -------------------------------
+    def _entry(self, pole):
+        position = _position(pole)
+        if position is None:
+            return None
+        shown = pole.display_status or display_status(pole.communication_status, pole.update_time,
+                                                      datetime.datetime.utcnow())
+        return position[0], position[1], (shown, pole.status)
+
+    def _apply(self, pole_id, pole, entry):
+        """Move ``pole_id`` from its indexed entry to ``entry``; called with the lock held."""
+        old = self._entries.get(pole_id)
+        if old is not None and old != entry:
+            self._remove(pole_id, old)
+        if entry is None:
+            return
+        lat, lon, statuses = entry
+        x, y = cell_of(lat, lon, self.max_zoom)
+        if old != entry:
+            for zoom, cells in enumerate(self._levels):
+                # Coarser cells are the finest cell index shifted down
+                shift = self.max_zoom - zoom
+                key = (x >> shift, y >> shift)
+                cluster = cells.get(key)
+                if cluster is None:
+                    cluster = cells[key] = Cluster()
+                cluster.add(lat, lon, statuses, 1)
+            self._entries[pole_id] = entry
+        # Always store the current object; a registry reload replaces them
+        self._points.setdefault((x, y), {})[pole_id] = pole
+
+    def _remove(self, pole_id, entry):
+        lat, lon, statuses = entry
+        x, y = cell_of(lat, lon, self.max_zoom)
+        for zoom, cells in enumerate(self._levels):
+            shift = self.max_zoom - zoom
+            key = (x >> shift, y >> shift)
+            cluster = cells[key]
+            cluster.add(lat, lon, statuses, -1)
+            if cluster.count <= 0:
+                del cells[key]
+        key = (x, y)
+        points = self._points.get(key)
+        if points is not None:
+            points.pop(pole_id, None)
+            if not points:
+                del self._points[key]
+        del self._entries[pole_id]
+
+    def poles_changed(self, poles, full=False):
+        """Registry listener. ``full`` means ``poles`` is the whole fleet."""
+        if not self._built:
+            return
+        with self._lock:
+            for pole in poles:
+                self._apply(pole.pole_id, pole, self._entry(pole))
+            if full:
+                present = {pole.pole_id for pole in poles}
+                for pole_id in [pid for pid in self._entries if pid not in present]:
+                    self._apply(pole_id, None, None)
+
+    def ensure_built(self):
+        if self._built:
+            return
+        poles = registry.all()
+        with self._lock:
+            if not self._built:
+                for pole in poles:
+                    self._apply(pole.pole_id, pole, self._entry(pole))
+                self._built = True
+
+    # -------------------------------
+    # 🔹 QUERIES
+    # -------------------------------
+    def _cells_in(self, cells, zoom, south, west, north, east):
+        x0, y0 = cell_of(south, west, zoom)
+        x1, y1 = cell_of(north, east, zoom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_SCAN_CELLS:
+            return [value for (x, y), value in cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+        found = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                value = cells.get((x, y))
+                if value is not None:
+                    found.append(value)
+        return found
+
+    def clusters(self, bbox, zoom):
+        """Clusters overlapping ``bbox = (south, west, north, east)`` at ``zoom``."""
+        self.ensure_built()
+        zoom = max(0, min(zoom, self.max_zoom))
+        with self._lock:
+            return [cluster.to_dict() for cluster in self._cells_in(self._levels[zoom], zoom, *bbox)]
+
+    def poles(self, bbox):
+        """Individual poles inside ``bbox``."""
+        self.ensure_built()
+        south, west, north, east = bbox
+        with self._lock:
+            buckets = self._cells_in(self._points, self.max_zoom, *bbox)
+            found = []
+            for bucket in buckets:
+                for pole_id, pole in bucket.items():
+                    lat, lon, _ = self._entries[pole_id]
+                    if south <= lat <= north and west <= lon <= east:
+                        found.append(pole)
+        return found
+
+    def stats(self):
+        return {
+            "poles": len(self._entries),
+            "cells": sum(len(cells) for cells in self._levels),
+        }
+
+
+geo_index = GeoIndex()
+registry.add_listener(geo_index.poles_changed)
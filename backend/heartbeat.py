@@ -0,0 +1,303 @@
+# heartbeat.py
+"""Background detector for poles that stop reporting.
+
+Every pole that can still change state on its own has one deadline in a
+min-heap:
+
+- ONLINE poles are due ``HEARTBEAT_TIMEOUT_SECONDS`` after their last reading,
+  when they become OFFLINE (shown as MAINTENANCE) and raise a
+  "Missing Heartbeat" alert (size the timeout above the fleet's reporting
+  interval, see alert_rules.py);
+- OFFLINE poles shown as MAINTENANCE are due when the 3-day maintenance
+  window runs out, when they are shown as OFFLINE.
+
+Each sweep pops the due poles and writes each flip with a guarded UPDATE,
+so ``poles.communication_status`` / ``poles.display_status`` are always
+stored and read endpoints serve them as-is. Alerts are raised only for
+rows this sweeper's UPDATE changed, so concurrent sweepers cannot both
+alert for the same pole.
+
+Run inside the API process with HEARTBEAT_MODE=thread, or (preferred with
+several API workers) as a single separate process::
+
+    python heartbeat.py
+
+A separate process publishes its flips and alerts to its own event bus, so
+API processes do not push them over SSE. They still reach clients: flips
+through ``/api/poles?since=`` (``status_changed_at``) and the registry
+refresh, alerts through ``/api/alerts``, which the dashboard re-polls
+periodically, once the response cache TTL has passed.
+"""
+import atexit
+import datetime
+import heapq
+import logging
+import os
+import threading
+import time
+
+from db import db_connection
+from pole_registry import registry, display_status, pole_payload, MAINTENANCE_WINDOW
+from alert_rules import engine as alert_engine, HEARTBEAT_TIMEOUT
+from events import bus
+from response_cache import cache
+import fleet_stats
+import schema
+
+log = logging.getLogger(__name__)
+
+
+class HeartbeatMonitor:
+    """Min-heap of ``(deadline, pole_id)`` swept every ``tick`` seconds.
+
+    A pole keeps at most one live heap entry (``_deadlines``). Readings only
+    push when they move a pole's deadline earlier; otherwise the old deadline
+    pops, the pole is found to be fresh and is rescheduled from its new
+    ``update_time``.
+    """
+
+    def __init__(self, timeout=HEARTBEAT_TIMEOUT, tick=5.0, rescan_interval=300.0):
+        self.timeout = datetime.timedelta(seconds=timeout)
+        self.tick = tick
+        self.rescan_interval = rescan_interval
+        self._heap = []
+        self._deadlines = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._scanned_at = None
+
+        self.sweeps = 0
+        self.flipped = 0
+        self.alerts = 0
+
+    # -------------------------------
+    # 🔹 SCHEDULING
+    # -------------------------------
+    def next_deadline(self, pole):
+        """When ``pole`` next changes state without a reading, or None."""
+        if pole.update_time is None:
+            return None
+        if pole.communication_status == 'ONLINE':
+            return pole.update_time + self.timeout
+        if pole.display_status == 'MAINTENANCE':
+            return pole.update_time + MAINTENANCE_WINDOW
+        return None
+
+    def schedule(self, pole_id, deadline):
+        with self._lock:
+            current = self._deadlines.get(pole_id)
+            if current is not None and current <= deadline:
+                return
+            self._deadlines[pole_id] = deadline
+            heapq.heappush(self._heap, (deadline, pole_id))
+
+    def seen(self, pole):
+        """Called after a committed reading. Poles already due sooner are left alone."""
+        deadline = self.next_deadline(pole)
+        if deadline is not None:
+            self.schedule(pole.pole_id, deadline)
+
+    def scan(self, now):
+        """(Re)schedule every pole from the registry.
+
+        Poles whose stored state is missing or out of date are due at once.
+        Also picks up poles brought back ONLINE by another process.
+        """
+        registry.ensure_fresh()
+        for pole in registry.all():
+            if pole.display_status != self._expected(pole, now)[1]:
+                self.schedule(pole.pole_id, now)
+                continue
+            deadline = self.next_deadline(pole)
+            if deadline is not None:
+                self.schedule(pole.pole_id, deadline)
+        self._scanned_at = time.monotonic()
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, pole_id = heapq.heappop(self._heap)
+                # Superseded by an earlier schedule() for the same pole
+                if self._deadlines.get(pole_id) == deadline:
+                    del self._deadlines[pole_id]
+                    due.append(pole_id)
+        return due
+
+    def _expected(self, pole, now):
+        communication = pole.communication_status
+        if communication == 'ONLINE' and pole.update_time is not None \
+                and now - pole.update_time >= self.timeout:
+            communication = 'OFFLINE'
+        return communication, display_status(communication, pole.update_time, now)
+
+    # -------------------------------
+    # 🔹 SWEEP
+    # -------------------------------
+    def sweep(self, now=None):
+        """Apply every flip that is due. Returns the number of poles changed."""
+        now = now or datetime.datetime.utcnow()
+        registry.ensure_fresh()
+        due = self._pop_due(now)
+        if not due:
+            return 0
+
+        changes = []
+        for pole_id in due:
+            pole = registry.peek(pole_id)
+            if pole is None:
+                continue
+            communication, display = self._expected(pole, now)
+            if (communication, display) != (pole.communication_status, pole.display_status):
+                changes.append((pole, communication, display))
+            else:
+                self._reschedule(pole, now)
+        if not changes:
+            return 0
+
+        with db_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            # One guarded UPDATE per pole: a reading committed meanwhile wins
+            # (update_time), and when several sweepers race only the one whose
+            # UPDATE changed the row (status still as it saw it) owns the flip
+            # and raises its alert
+            flipped_ids = []
+            for pole, communication, display in changes:
+                cursor.execute("""
+                    UPDATE poles
+                    SET communication_status = %s,
+                        display_status = %s,
+                        status_changed_at = %s
+                    WHERE pole_id = %s AND update_time <=> %s
+                      AND communication_status <=> %s AND display_status <=> %s
+                """, (communication, display, now, pole.pole_id, pole.update_time,
+                      pole.communication_status, pole.display_status))
+                if cursor.rowcount == 1:
+                    flipped_ids.append(pole.pole_id)
+
+            previous = {pole.pole_id: pole.communication_status for pole, _, _ in changes}
+            fresh = registry.load(cursor, [pole.pole_id for pole, _, _ in changes])
+            flipped = {pole_id: fresh[pole_id] for pole_id in flipped_ids if pole_id in fresh}
+
+            alert_engine.ensure_fresh(cursor)
+            alert_rows = []
+            for pole_id, pole in flipped.items():
+                if previous[pole_id] == 'ONLINE' and pole.communication_status == 'OFFLINE':
+                    for message, severity, alert_type in alert_engine.check_silence(pole, now):
+                        alert_rows.append((pole_id, message, severity, alert_type, now))
+            try:
+                if alert_rows:
+                    cursor.executemany("""
+                        INSERT INTO alerts (pole_id, message, severity, alert_type, alert_status, timestamp)
+                        VALUES (%s, %s, %s, %s, 'ACTIVE', %s)
+                    """, alert_rows)
+                conn.commit()
+            except Exception:
+                alert_engine.release(alert_rows)
+                raise
+            alert_engine.confirm(alert_rows)
+
+        self._publish(flipped, alert_rows, now)
+        for pole in fresh.values():
+            self._reschedule(pole, now)
+        self.flipped += len(flipped)
+        self.alerts += len(alert_rows)
+        return len(flipped)
+
+    def _reschedule(self, pole, now):
+        deadline = self.next_deadline(pole)
+        if deadline is not None:
+            # Never due again in the same sweep
+            self.schedule(pole.pole_id, max(deadline, now + datetime.timedelta(seconds=self.tick)))
+
+    def _publish(self, poles, alert_rows, now):
+        counters = fleet_stats.counters
+        if counters is not None and alert_rows:
+            counters.alerts_opened(len(alert_rows))
+        if alert_rows:
+            fleet_stats.breakdown.alerts_opened([row[0] for row in alert_rows])
+        for pole in poles.values():
+            bus.publish("pole", pole_payload(pole, now))
+        for pole_id, message, severity, alert_type, timestamp in alert_rows:
+            bus.publish("alert", {
+                "pole_id": pole_id,
+                "message": message,
+                "severity": severity,
+                "alert_status": "ACTIVE",
+                "alert_type": alert_type,
+                "timestamp": timestamp.isoformat(),
+            })
+        if alert_rows:
+            stats_event = {"delta": {"active": 0, "inactive": 0, "alerts": len(alert_rows)}}
+            if counters is not None:
+                stats_event["totals"] = counters.current()
+            bus.publish("stats", stats_event)
+        if alert_rows:
+            cache.invalidate('poles', 'stats', 'alerts')
+        elif poles:
+            cache.invalidate('poles', 'stats')
+
+    # -------------------------------
+    # 🔹 THREAD
+    # -------------------------------
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='heartbeat', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                now = datetime.datetime.utcnow()
+                if self._scanned_at is None or time.monotonic() - self._scanned_at > self.rescan_interval:
+                    self.scan(now)
+                self.sweeps += 1
+                self.sweep(now)
+            except Exception:
+                log.exception("heartbeat sweep failed")
+            self._stopping.wait(self.tick)
+
+    def stats(self):
+        return {
+            "scheduled": len(self._deadlines),
+            "sweeps": self.sweeps,
+            "flipped": self.flipped,
+            "alerts": self.alerts,
+        }
+
+
+def _make_monitor():
+    return HeartbeatMonitor(
+        tick=float(os.getenv('HEARTBEAT_TICK_SECONDS', '5')),
+        rescan_interval=float(os.getenv('HEARTBEAT_RESCAN_SECONDS', '300')),
+    )
+
+
+monitor = None
+
+
+def init_heartbeat(app):
+    """Run the monitor in this process when HEARTBEAT_MODE=thread."""
+    global monitor
+    if os.getenv('HEARTBEAT_MODE', 'off').lower() != 'thread' or monitor is not None:
+        return
+    monitor = _make_monitor()
+    monitor.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    schema.ensure_schema()
+    monitor = _make_monitor()
+    print(f"heartbeat: timeout {monitor.timeout}, tick {monitor.tick}s")
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,127 @@
+# ingest_buffer.py
+import atexit
+import logging
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class IngestBuffer:
+    """Bounded in-process queue drained by a background write-behind thread.
+
+    Readings are flushed every ``flush_interval_ms`` or as soon as ``flush_rows``
+    are waiting, whichever comes first. ``write_batch(readings)`` does the
+    actual DB work and is called from the writer thread only.
+
+    Failed flushes are retried ``retries`` times. When ``is_data_error(exc)``
+    says the DB rejected the rows themselves, the batch is bisected instead
+    so only the offending readings are dropped (counted in ``invalid``).
+    """
+
+    def __init__(self, write_batch, max_size=10000, flush_interval_ms=200,
+                 flush_rows=500, retries=3, is_data_error=lambda exc: False):
+        self._write_batch = write_batch
+        self._is_data_error = is_data_error
+        self._queue = queue.Queue(maxsize=max_size)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_rows = flush_rows
+        self.retries = retries
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.flushes = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def submit(self, reading):
+        """Queue a validated reading. Returns False when the buffer is full."""
+        if self._stopping.is_set():
+            self.rejected += 1
+            return False
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def stop(self, timeout=10.0):
+        """Stop accepting readings and flush whatever is still queued."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "dropped": self.dropped,
+            "invalid": self.invalid,
+            "flushes": self.flushes,
+        }
+
+    # -------------------------------
+    # 🔹 WRITER THREAD
+    # -------------------------------
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._write_batch(batch)
+                self.written += len(batch)
+                self.flushes += 1
+                return
+            except Exception as exc:
+                if self._is_data_error(exc):
+                    self._isolate(batch, exc)
+                    return
+                log.exception("Ingest flush of %d readings failed (attempt %d/%d)",
+                              len(batch), attempt, self.retries)
+                time.sleep(min(0.5 * attempt, 2.0))
+        self.dropped += len(batch)
+
+    def _isolate(self, batch, exc):
+        """Bisect a batch the DB rejected until the bad readings stand alone."""
+        if len(batch) == 1:
+            log.error("Dropping reading rejected by the DB (%s): %r", exc, batch[0])
+            self.dropped += 1
+            self.invalid += 1
+            return
+        middle = len(batch) // 2
+        self._flush(batch[:middle])
+        self._flush(batch[middle:])
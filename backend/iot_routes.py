@@ -1,9 +1,273 @@
 from flask import Blueprint, request, jsonify
-from db import get_db_connection
+from db import get_db_connection, db_connection, is_data_error
+from ingest_buffer import IngestBuffer
+from pole_registry import registry, pole_payload
+from events import bus
+from response_cache import cache
+import fleet_stats
+import rollups
+from telemetry_windows import window_for, to_stored_second
+from alert_rules import engine as alert_engine
+import heartbeat
 import datetime
+import json
+import math
+import os
 
 iot_bp = Blueprint('iot', __name__)
 
+# Upper bound on records accepted by one /api/iot/data/batch request
+MAX_BATCH_RECORDS = int(os.getenv('INGEST_BATCH_MAX', '5000'))
+
+# Set INGEST_MODE=buffered to queue readings for the background writer instead
+# of writing each POST synchronously.
+ingest_buffer = None
+
+# Column limits: VARCHAR(64) ids/versions, signed INT signal_strength
+MAX_ID_LENGTH = 64
+SIGNAL_RANGE = (-2 ** 31, 2 ** 31 - 1)
+
+
+def parse_reading(data):
+    """Validate one device payload.
+
+    Returns ``(reading, None)`` on success or ``(None, error_message)``.
+    """
+    if not isinstance(data, dict) or not data:
+        return None, "No JSON data received"
+
+    # ✅ Validate mandatory fields
+    required = ["pole_id", "status"]
+    for field in required:
+        if field not in data:
+            return None, f"Missing field: {field}"
+
+    status = str(data["status"]).upper()
+
+    # ✅ Validate values
+    if status not in ["ON", "OFF"]:
+        return None, "Invalid status value"
+
+    # One bad record must not fail the multi-row statements of a whole batch
+    pole_id = data["pole_id"]
+    if isinstance(pole_id, bool) or not isinstance(pole_id, (str, int)) or pole_id == "":
+        return None, "Invalid pole_id"
+    if len(str(pole_id)) > MAX_ID_LENGTH:
+        return None, "pole_id too long"
+
+    signal_strength = data.get("signal_strength", None)
+    if signal_strength is not None:
+        if isinstance(signal_strength, bool) or not isinstance(signal_strength, (int, float)):
+            return None, "Invalid signal_strength"
+        if not math.isfinite(signal_strength) or not SIGNAL_RANGE[0] <= signal_strength <= SIGNAL_RANGE[1]:
+            return None, "signal_strength out of range"
+
+    firmware_version = data.get("firmware_version", None)
+    if firmware_version is not None and not isinstance(firmware_version, str):
+        return None, "Invalid firmware_version"
+    if firmware_version is not None and len(firmware_version) > MAX_ID_LENGTH:
+        return None, "firmware_version too long"
+
+    return {
+        "pole_id": str(pole_id),
+        "status": status,
+        "signal_strength": signal_strength,
+        "firmware_version": firmware_version,
+        # Whole seconds, so the time_window tag matches what the column stores
+        "timestamp": to_stored_second(datetime.datetime.utcnow()),
+    }, None
+
+
+def prepare_writes(poles, readings):
+    """Build everything one ingest transaction writes, without touching the DB.
+
+    ``poles`` maps pole_id to its current ``PoleState`` (from the registry);
+    alerts come from the rule engine, which deduplicates them against open
+    alerts in memory. The alerts are only claimed: the caller confirms them
+    via ``publish_readings`` after committing, or releases them with
+    ``alert_engine.release`` when the write fails. Poles are updated once
+    each, from their latest reading. Returns ``(unknown_pole_ids,
+    latest_reading_per_pole, alert_rows, statements)`` where ``statements``
+    is a list of ``(sql, rows)`` for ``executemany``; readings for unknown
+    poles are skipped.
+    """
+    pole_ids = list(dict.fromkeys(r["pole_id"] for r in readings))
+    last_status = {pole_id: pole.status for pole_id, pole in poles.items()}
+    last_time = {pole_id: pole.update_time for pole_id, pole in poles.items()}
+    unknown = set(pole_ids) - set(last_status)
+    rollup_acc = {}
+
+    telemetry_rows = []
+    alert_rows = []
+    latest = {}
+    for reading in readings:
+        pole_id = reading["pole_id"]
+        if pole_id in unknown:
+            continue
+        telemetry_rows.append((pole_id, reading["status"], reading["signal_strength"], reading["timestamp"],
+                               window_for(reading["timestamp"])))
+
+        for message, severity, alert_type in alert_engine.evaluate(reading, last_status[pole_id]):
+            alert_rows.append((pole_id, message, severity, alert_type, reading["timestamp"]))
+
+        if rollups.INGEST_ROLLUPS:
+            rollups.accumulate(rollup_acc, pole_id, last_status[pole_id], last_time[pole_id],
+                               reading["status"], reading["timestamp"], reading["signal_strength"])
+
+        last_status[pole_id] = reading["status"]
+        last_time[pole_id] = reading["timestamp"]
+        latest[pole_id] = reading
+
+    statements = []
+    if telemetry_rows:
+        statements.append(("""
+            INSERT INTO telemetry_data (pole_id, status, signal_strength, timestamp, time_window)
+            VALUES (%s, %s, %s, %s, %s)
+        """, telemetry_rows))
+
+    if latest:
+        statements.append(("""
+            UPDATE poles
+            SET status = %s,
+                communication_status = 'ONLINE',
+                display_status = 'ONLINE',
+                firmware_version = %s,
+                update_time = %s
+            WHERE pole_id = %s
+        """, [(r["status"], r["firmware_version"], r["timestamp"], pole_id)
+              for pole_id, r in latest.items()]))
+
+    if alert_rows:
+        statements.append(("""
+            INSERT INTO alerts (pole_id, message, severity, alert_type, alert_status, timestamp)
+            VALUES (%s, %s, %s, %s, 'ACTIVE', %s)
+        """, alert_rows))
+
+    if rollup_acc:
+        statements.append((rollups.UPSERT_SQL, rollups.upsert_rows(rollup_acc)))
+
+    return unknown, latest, alert_rows, statements
+
+
+def write_readings(cursor, readings):
+    """Persist validated readings with one multi-row statement per table.
+
+    Previous pole state comes from the pole registry, so known poles cost no
+    lookup query. Returns ``(unknown_pole_ids, latest_reading_per_pole,
+    alert_rows)``. The caller commits, then calls ``publish_readings`` (or
+    ``alert_engine.release(alert_rows)`` if the commit fails).
+    """
+    poles = registry.lookup(cursor, list(dict.fromkeys(r["pole_id"] for r in readings)))
+    alert_engine.ensure_fresh(cursor)
+    unknown, latest, alert_rows, statements = prepare_writes(poles, readings)
+    try:
+        for statement, rows in statements:
+            cursor.executemany(statement, rows)
+    except Exception:
+        alert_engine.release(alert_rows)
+        raise
+    return unknown, latest, alert_rows
+
+
+def publish_readings(latest, alert_rows):
+    """Propagate committed readings to in-memory state and subscribers.
+
+    Confirms the alerts claimed by ``prepare_writes``; the pole registry,
+    stats counters, heartbeat schedule and response cache are updated and
+    the changes are published to the event bus.
+    """
+    alert_engine.confirm(alert_rows)
+    counters = fleet_stats.counters
+    now = datetime.datetime.utcnow()
+    delta = {"active": 0, "inactive": 0, "alerts": len(alert_rows)}
+    # Whether anything the stats endpoints count (display status, firmware) moved
+    regrouped = False
+    for reading in latest.values():
+        before = registry.peek(reading["pole_id"])
+        if before is not None and (before.display_status != 'ONLINE'
+                                   or before.firmware_version != reading["firmware_version"]):
+            regrouped = True
+        previous = registry.apply_reading(reading)
+        if counters is not None:
+            counters.pole_status_changed(previous, reading["status"])
+        for key, step in fleet_stats.status_delta(previous, reading["status"]).items():
+            delta[key] += step
+        pole = registry.peek(reading["pole_id"])
+        if pole is not None:
+            if heartbeat.monitor is not None:
+                heartbeat.monitor.seen(pole)
+            bus.publish("pole", pole_payload(pole, now))
+    if counters is not None and alert_rows:
+        counters.alerts_opened(len(alert_rows))
+    if alert_rows:
+        fleet_stats.breakdown.alerts_opened([row[0] for row in alert_rows])
+
+    for pole_id, message, severity, alert_type, timestamp in alert_rows:
+        bus.publish("alert", {
+            "pole_id": pole_id,
+            "message": message,
+            "severity": severity,
+            "alert_status": "ACTIVE",
+            "alert_type": alert_type,
+            "timestamp": timestamp.isoformat(),
+        })
+
+    if any(delta.values()):
+        stats_event = {"delta": delta}
+        if counters is not None:
+            stats_event["totals"] = counters.current()
+        bus.publish("stats", stats_event)
+
+    # Alerts and stats responses survive readings that change neither
+    if latest:
+        tags = ['poles', 'telemetry']
+        if alert_rows:
+            tags.append('alerts')
+        if regrouped or any(delta.values()):
+            tags.append('stats')
+        cache.invalidate(*tags)
+
+
+def ingest_readings(conn, readings):
+    """Write readings, commit, then propagate the new state.
+
+    Returns the set of unknown pole ids.
+    """
+    cursor = conn.cursor(dictionary=True)
+    unknown, latest, alert_rows = write_readings(cursor, readings)
+    try:
+        conn.commit()
+    except Exception:
+        alert_engine.release(alert_rows)
+        raise
+    publish_readings(latest, alert_rows)
+    return unknown
+
+
+def _flush_readings(readings):
+    """Write-behind flush used by the ingest buffer thread."""
+    with db_connection() as conn:
+        ingest_readings(conn, readings)
+
+
+def init_ingest(app):
+    """Start the write-behind buffer when INGEST_MODE=buffered.
+
+    Tuned by INGEST_QUEUE_SIZE, INGEST_FLUSH_MS and INGEST_FLUSH_ROWS.
+    """
+    global ingest_buffer
+    if os.getenv('INGEST_MODE', 'sync').lower() != 'buffered' or ingest_buffer is not None:
+        return
+    ingest_buffer = IngestBuffer(
+        _flush_readings,
+        max_size=int(os.getenv('INGEST_QUEUE_SIZE', '10000')),
+        flush_interval_ms=int(os.getenv('INGEST_FLUSH_MS', '200')),
+        flush_rows=int(os.getenv('INGEST_FLUSH_ROWS', '500')),
+        is_data_error=is_data_error,
+    )
+    ingest_buffer.start()
+
+
 @iot_bp.route('/api/iot/data', methods=['POST'])
 def receive_iot_data():
     """
@@ -17,93 +281,86 @@ def receive_iot_data():
     }
     """
 
-    data = request.get_json()
-    if not data:
-        return jsonify({"error": "No JSON data received"}), 400
+    reading, error = parse_reading(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
 
-    # ✅ Validate mandatory fields
-    required = ["pole_id", "status"]
-    for field in required:
-        if field not in data:
-            return jsonify({"error": f"Missing field: {field}"}), 400
+    if ingest_buffer is not None:
+        if not ingest_buffer.submit(reading):
+            response = jsonify({"error": "Ingest queue full, retry later"})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        return jsonify({"message": "Telemetry data queued"}), 202
 
-    pole_id = data["pole_id"]
-    status = data["status"].upper()
-    signal_strength = data.get("signal_strength", None)
-    firmware_version = data.get("firmware_version", None)
+    conn = get_db_connection()
+    unknown = ingest_readings(conn, [reading])
+    conn.close()
 
-    # ✅ Validate values
-    if status not in ["ON", "OFF"]:
-        return jsonify({"error": "Invalid status value"}), 400
+    if unknown:
+        return jsonify({"error": f"Pole {reading['pole_id']} not found"}), 404
+
+    return jsonify({"message": "Telemetry data received successfully"}), 200
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
 
-    # ✅ Check if pole exists
-    cursor.execute("SELECT * FROM poles WHERE pole_id = %s", (pole_id,))
-    pole = cursor.fetchone()
+def _iter_batch_payload():
+    """Yield decoded records from a JSON array body or a streamed NDJSON body."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+        return
 
-    if not pole:
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array or an NDJSON body")
+    yield from data
+
+
+@iot_bp.route('/api/iot/data/batch', methods=['POST'])
+def receive_iot_batch():
+    """
+    Bulk variant of /api/iot/data for gateways relaying many poles.
+    Accepts a JSON array of readings, or one reading per line with
+    Content-Type: application/x-ndjson. Every record is validated like a
+    single POST; accepted records are written in one transaction.
+    """
+
+    results = []
+    readings = []
+    try:
+        for index, record in enumerate(_iter_batch_payload()):
+            if index >= MAX_BATCH_RECORDS:
+                return jsonify({"error": f"Batch exceeds {MAX_BATCH_RECORDS} records"}), 413
+            if record is None:
+                results.append({"index": index, "status": "rejected", "error": "Malformed JSON line"})
+                continue
+            reading, error = parse_reading(record)
+            if error:
+                results.append({"index": index, "status": "rejected", "error": error})
+                continue
+            results.append({"index": index, "pole_id": reading["pole_id"], "status": "accepted"})
+            readings.append(reading)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if readings:
+        conn = get_db_connection()
+        unknown = ingest_readings(conn, readings)
         conn.close()
-        return jsonify({"error": f"Pole {pole_id} not found"}), 404
-
-    # ✅ Insert telemetry record
-    cursor.execute("""
-        INSERT INTO telemetry_data (pole_id, status, signal_strength, timestamp)
-        VALUES (%s, %s, %s, %s)
-    """, (
-        pole_id,
-        status,
-        signal_strength,
-        datetime.datetime.utcnow()
-    ))
-
-    # ✅ Update pole info
-    cursor.execute("""
-        UPDATE poles
-        SET status = %s,
-            communication_status = 'ONLINE',
-            firmware_version = %s,
-            update_time = %s
-        WHERE pole_id = %s
-    """, (
-        status,
-        firmware_version,
-        datetime.datetime.utcnow(),
-        pole_id
-    ))
-
-    # ✅ Optional: trigger alert if OFFLINE or weak signal
-    alert_needed = False
-    alert_msg = ""
-    alert_type = ""
-    severity = ""
-
-    if signal_strength and signal_strength < -85:
-        alert_needed = True
-        alert_msg = f"Weak signal strength ({signal_strength} dBm)"
-        alert_type = "No Communication"
-        severity = "warning"
-
-    if status == "OFF" and pole["status"] == "ON":
-        alert_needed = True
-        alert_msg = "Sudden light OFF detected"
-        alert_type = "Manual Switch"
-        severity = "critical"
-
-    if alert_needed:
-        cursor.execute("""
-            INSERT INTO alerts (pole_id, message, severity, alert_type, alert_status, timestamp)
-            VALUES (%s, %s, %s, %s, 'ACTIVE', %s)
-        """, (
-            pole_id,
-            alert_msg,
-            severity,
-            alert_type,
-            datetime.datetime.utcnow()
-        ))
-
-    conn.commit()
-    conn.close()
 
-    return jsonify({"message": "Telemetry data received successfully"}), 200
\ No newline at end of file
+        for result in results:
+            if result["status"] == "accepted" and result["pole_id"] in unknown:
+                result["status"] = "rejected"
+                result["error"] = f"Pole {result['pole_id']} not found"
+
+    accepted = sum(1 for r in results if r["status"] == "accepted")
+    return jsonify({
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }), 200
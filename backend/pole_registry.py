@@ -0,0 +1,180 @@
+# pole_registry.py
+import datetime
+import os
+import threading
+import time
+
+from db import db_connection
+
+POLE_COLUMNS = (
+    'pole_id', 'cluster_id', 'latitude', 'longitude',
+    'status', 'communication_status', 'state', 'district',
+    'city_or_village', 'mode', 'firmware_version', 'update_time',
+    'display_status',
+)
+
+
+class PoleState:
+    """Last known state of one pole. Slotted to keep a large fleet compact."""
+
+    __slots__ = POLE_COLUMNS
+
+    def __init__(self, row):
+        for column in POLE_COLUMNS:
+            setattr(self, column, row.get(column))
+
+    def to_dict(self):
+        return {column: getattr(self, column) for column in POLE_COLUMNS}
+
+
+# OFFLINE poles last seen within this window are shown as MAINTENANCE
+MAINTENANCE_WINDOW = datetime.timedelta(days=3)
+
+
+def display_status(communication_status, update_time, now):
+    """ONLINE stays ONLINE; OFFLINE poles seen within 3 days show as MAINTENANCE."""
+    if communication_status == 'OFFLINE' and update_time:
+        return 'MAINTENANCE' if now - update_time < MAINTENANCE_WINDOW else 'OFFLINE'
+    return communication_status
+
+
+def pole_payload(pole, now):
+    """JSON-ready dict for one pole, as served by /api/poles.
+
+    ``display_status`` is the value stored by the heartbeat monitor; it is
+    only derived here for rows the monitor has not visited yet.
+    """
+    row = pole.to_dict()
+    if row['display_status'] is None:
+        row['display_status'] = display_status(row['communication_status'], row['update_time'], now)
+    if row['update_time']:
+        row['update_time'] = row['update_time'].isoformat()
+    return row
+
+
+class PoleRegistry:
+    """Process-local view of the ``poles`` table keyed by ``pole_id``.
+
+    Ingest writes through with ``apply_reading`` after each commit. The whole
+    table is reloaded when older than ``refresh_interval`` seconds or after
+    ``invalidate()``, so rows edited directly in the DB are picked up.
+
+    Listeners added with ``add_listener`` are called as
+    ``listener(poles, full)`` after poles change; ``full`` means ``poles`` is
+    the whole fleet after a reload.
+    """
+
+    def __init__(self, refresh_interval=60.0):
+        self.refresh_interval = refresh_interval
+        self._poles = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, poles, full=False):
+        for listener in self._listeners:
+            listener(poles, full)
+
+    # -------------------------------
+    # 🔹 LOADING
+    # -------------------------------
+    def refresh(self, cursor=None):
+        """Reload every pole, on ``cursor`` if given or on a pooled connection."""
+        with self._refresh_lock:
+            self._reload(cursor)
+
+    def _reload(self, cursor):
+        if cursor is None:
+            with db_connection() as conn:
+                poles = self._load_all(conn.cursor(dictionary=True))
+        else:
+            poles = self._load_all(cursor)
+        with self._lock:
+            self._poles = poles
+            self._loaded_at = time.monotonic()
+        self._notify(list(poles.values()), full=True)
+
+    def _load_all(self, cursor):
+        cursor.execute(f"SELECT {', '.join(POLE_COLUMNS)} FROM poles")
+        return {row['pole_id']: PoleState(row) for row in cursor.fetchall()}
+
+    def _stale(self):
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self.refresh_interval
+
+    def ensure_fresh(self, cursor=None):
+        if not self._stale():
+            return
+        with self._refresh_lock:
+            # Another thread may have reloaded while we waited
+            if self._stale():
+                self._reload(cursor)
+
+    def invalidate(self):
+        """Force a full reload on next access."""
+        self._loaded_at = None
+
+    def load(self, cursor, pole_ids):
+        """(Re)load the given poles, e.g. ones created since the last refresh."""
+        placeholders = ", ".join(["%s"] * len(pole_ids))
+        cursor.execute(f"SELECT {', '.join(POLE_COLUMNS)} FROM poles WHERE pole_id IN ({placeholders})",
+                       list(pole_ids))
+        return self.store(cursor.fetchall())
+
+    def store(self, rows):
+        """Add or replace poles from ``poles`` rows (dicts); returns them by id."""
+        found = {row['pole_id']: PoleState(row) for row in rows}
+        with self._lock:
+            self._poles.update(found)
+        self._notify(list(found.values()))
+        return found
+
+    # -------------------------------
+    # 🔹 READS
+    # -------------------------------
+    def get(self, pole_id):
+        self.ensure_fresh()
+        return self._poles.get(pole_id)
+
+    def peek(self, pole_id):
+        """Like ``get`` but never triggers a reload; for use on the ingest path."""
+        return self._poles.get(pole_id)
+
+    def all(self):
+        self.ensure_fresh()
+        return list(self._poles.values())
+
+    def lookup(self, cursor, pole_ids):
+        """Return ``{pole_id: PoleState}`` for the given ids, hitting the DB only for misses."""
+        self.ensure_fresh(cursor)
+        poles = self._poles
+        found = {pid: poles[pid] for pid in pole_ids if pid in poles}
+        missing = [pid for pid in pole_ids if pid not in found]
+        if missing:
+            found.update(self.load(cursor, missing))
+        return found
+
+    # -------------------------------
+    # 🔹 WRITE-THROUGH
+    # -------------------------------
+    def apply_reading(self, reading):
+        """Record a committed reading. Returns the pole's previous status."""
+        with self._lock:
+            pole = self._poles.get(reading['pole_id'])
+            if pole is None:
+                return None
+            previous = pole.status
+            pole.status = reading['status']
+            pole.communication_status = 'ONLINE'
+            pole.display_status = 'ONLINE'
+            pole.firmware_version = reading['firmware_version']
+            pole.update_time = reading['timestamp']
+        self._notify([pole])
+        return previous
+
+
+registry = PoleRegistry(refresh_interval=float(os.getenv('POLE_REGISTRY_REFRESH', '60')))
@@ -0,0 +1,231 @@
+# request_metrics.py
+"""Per-request instrumentation and the Prometheus text behind ``/api/metrics``.
+
+For every request this records, per route: wall time (histogram), DB time
+and query count (via ``db.TimedCursor``), JSON serialization time and
+response bytes. Streamed responses (exports, SSE) are recorded when the
+stream closes, so their DB time and bytes are included.
+
+``render()`` adds process gauges: request and export pools, response cache,
+ingest buffer, event bus, heartbeat, alert engine and auth caches.
+"""
+import os
+import threading
+import time
+
+from flask import g, has_app_context, request
+from flask.json.provider import DefaultJSONProvider
+
+import db
+from response_cache import cache
+from events import bus
+from alert_rules import engine as alert_engine
+import auth
+import heartbeat
+import iot_routes
+
+ENABLED = os.getenv('METRICS_ENABLED', '1') not in ('0', 'false', 'off')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    __slots__ = ('requests', 'duration', 'db_seconds', 'queries', 'serialize_seconds',
+                 'response_bytes', 'buckets', 'statuses')
+
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.serialize_seconds = 0.0
+        self.response_bytes = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.statuses = {}
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "duration": self.duration,
+            "db_seconds": self.db_seconds,
+            "queries": self.queries,
+            "serialize_seconds": self.serialize_seconds,
+            "response_bytes": self.response_bytes,
+            "statuses": dict(self.statuses),
+        }
+
+
+class RequestMetrics:
+    """Totals per ``(route, method)``. Route is the URL rule, so ids do not add series."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, duration, db_seconds, queries, serialize_seconds, nbytes):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = RouteStats()
+            stats.requests += 1
+            stats.duration += duration
+            stats.db_seconds += db_seconds
+            stats.queries += queries
+            stats.serialize_seconds += serialize_seconds
+            stats.response_bytes += nbytes
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def snapshot(self):
+        """``{(route, method): {...totals}}`` for reports such as the bench suite."""
+        with self._lock:
+            return {key: stats.to_dict() for key, stats in self._routes.items()}
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            family("solar_http_requests_total", "counter", "Requests served, by route, method and status.")
+            for (route, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'solar_http_requests_total{{{_labels(route, method)},status="{status}"}} {count}')
+
+            family("solar_http_request_duration_seconds", "histogram", "Request wall time.")
+            for (route, method), stats in routes:
+                labels = _labels(route, method)
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    lines.append(f'solar_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'solar_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.requests}')
+                lines.append(f'solar_http_request_duration_seconds_sum{{{labels}}} {stats.duration:.6f}')
+                lines.append(f'solar_http_request_duration_seconds_count{{{labels}}} {stats.requests}')
+
+            for name, attr, help_text in (
+                    ("solar_http_db_seconds_total", "db_seconds", "Time spent in DB calls."),
+                    ("solar_http_db_queries_total", "queries", "DB statements executed."),
+                    ("solar_http_serialize_seconds_total", "serialize_seconds", "Time spent encoding JSON."),
+                    ("solar_http_response_bytes_total", "response_bytes", "Response body bytes sent.")):
+                family(name, "counter", help_text)
+                for (route, method), stats in routes:
+                    value = getattr(stats, attr)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{name}{{{_labels(route, method)}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(route, method):
+    return f'route="{_escape(route)}",method="{method}"'
+
+
+metrics = RequestMetrics()
+
+
+# -------------------------------
+# 🔹 FLASK HOOKS
+# -------------------------------
+class TimedJSONProvider(DefaultJSONProvider):
+    """Default JSON provider that also adds encode time to the current request."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_app_context() and 'serialize_seconds' in g:
+                g.serialize_seconds += time.perf_counter() - start
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.serialize_seconds = 0.0
+    g._query_stats = db.QueryStats()
+
+
+def _counting(body, on_close):
+    sent = 0
+    try:
+        for chunk in body:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        # Let the wrapped stream clean up (e.g. SSE unsubscribe)
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+        on_close(sent)
+
+
+def _after_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    method = request.method
+    status = response.status_code
+    query_stats = g._query_stats
+    serialize = g.serialize_seconds
+
+    def record(nbytes):
+        metrics.observe(route, method, status, time.perf_counter() - started,
+                        query_stats.seconds, query_stats.queries, serialize, nbytes)
+
+    if response.is_streamed:
+        response.response = _counting(response.response, record)
+    else:
+        record(response.content_length or 0)
+    return response
+
+
+def init_app(app):
+    """Instrument every request of ``app`` unless METRICS_ENABLED=0."""
+    if not ENABLED:
+        return
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+
+# -------------------------------
+# 🔹 EXPOSITION
+# -------------------------------
+def _gauge_lines(prefix, values, kind="gauge"):
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render():
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = metrics.render()
+    lines += _gauge_lines("solar_db_pool", db.get_pool_metrics())
+    lines += _gauge_lines("solar_db_export_pool", db.get_export_pool().metrics())
+    lines += _gauge_lines("solar_response_cache", {"hits_total": cache.hits,
+                                                   "misses_total": cache.misses}, "counter")
+    lines += _gauge_lines("solar_auth_token_cache", {"hits_total": auth.token_cache.hits,
+                                                     "misses_total": auth.token_cache.misses}, "counter")
+    lines += _gauge_lines("solar_alerts", {"suppressed_total": alert_engine.suppressed}, "counter")
+    lines += _gauge_lines("solar_sse", {"subscribers": bus.subscriber_count()})
+    if iot_routes.ingest_buffer is not None:
+        lines += _gauge_lines("solar_ingest_buffer", iot_routes.ingest_buffer.stats())
+    if heartbeat.monitor is not None:
+        lines += _gauge_lines("solar_heartbeat", heartbeat.monitor.stats())
+    return "\n".join(lines) + "\n"
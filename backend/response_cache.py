@@ -0,0 +1,89 @@
+# response_cache.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+
+
+class ResponseCache:
+    """Size-bounded LRU of rendered GET responses with a per-endpoint TTL.
+
+    Entries are keyed by path and query args and tagged with the data they
+    depend on (``poles``, ``stats``...), so writers can drop them with
+    ``invalidate(*tags)``. Every cached response carries a strong ETag and
+    ``If-None-Match`` is answered with 304.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, body, mimetype, etag, tags)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, ttl, tags=(), bypass_args=()):
+        """Cache a GET view for ``ttl`` seconds.
+
+        Requests carrying any of ``bypass_args`` (e.g. per-client cursors that
+        are never repeated) go straight to the view and are not stored.
+        """
+        tags = frozenset(tags)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if any(arg in request.args for arg in bypass_args):
+                    return view(*args, **kwargs)
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                entry = self._get(key)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    etag = hashlib.sha1(body).hexdigest()
+                    self._put(key, (time.monotonic() + ttl, body, response.mimetype, etag, tags))
+                else:
+                    _, body, mimetype, etag, _ = entry
+                    response = make_response(body)
+                    response.mimetype = mimetype
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+        """Drop entries depending on any of ``tags`` (all entries if none given)."""
+        with self._lock:
+            if not tags:
+                self._entries.clear()
+                return
+            stale = [key for key, entry in self._entries.items() if entry[4].intersection(tags)]
+            for key in stale:
+                del self._entries[key]
+
+
+cache = ResponseCache(max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '256')))
@@ -0,0 +1,307 @@
+# retention.py
+"""Retention job for ``telemetry_data`` and ``alerts``.
+
+Raw rows older than the retention window are archived day by day to gzip CSV
+files (optionally folded into the rollup tables first) and then removed:
+
+- ``telemetry_data`` partitioned by day is trimmed with ``DROP PARTITION``,
+  otherwise with small batched DELETEs;
+- ``alerts`` only loses closed (non-ACTIVE) alerts, with batched DELETEs, so
+  open alerts and the dashboard counters are never affected.
+
+One-off conversion of telemetry_data to daily RANGE partitions::
+
+    python retention.py --partition
+
+Nightly run from cron::
+
+    15 2 * * *  cd /srv/solar/backend && python retention.py --days 90 --rollup
+"""
+import argparse
+import csv
+import datetime
+import glob
+import gzip
+import os
+import re
+
+from db import db_connection
+from exporter import EXPORT_TABLES, iter_batches, iter_csv, gzip_chunks
+import rollups
+
+ARCHIVE_DIR = os.getenv('RETENTION_ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'archive'))
+DELETE_BATCH_ROWS = 10000
+# Daily partitions kept ready ahead of today
+PARTITIONS_AHEAD = 7
+
+_PARTITION_NAME = re.compile(r"^p(\d{8})$")
+
+
+def _day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _days(start, end):
+    day = _day(start)
+    while day < end:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+# -------------------------------
+# 🔹 PARTITIONS
+# -------------------------------
+def list_partitions(cursor, table):
+    """``[(name, upper_bound_or_None), ...]`` for a RANGE-partitioned table; [] if not partitioned."""
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    partitions = []
+    for name, description in cursor.fetchall():
+        bound = None
+        if description and description.upper() != 'MAXVALUE':
+            bound = datetime.datetime.fromisoformat(description.strip("'"))
+        partitions.append((name, bound))
+    return partitions
+
+
+def partition_table(table='telemetry_data', days_back=None):
+    """Convert ``table`` to daily RANGE COLUMNS(timestamp) partitions.
+
+    Past days get their own partitions back to the oldest row (or only
+    ``days_back`` days, older rows sharing the first partition), so each can
+    be dropped as soon as it leaves the retention window.
+
+    MySQL requires the partition column in every unique key, so the primary
+    key becomes ``(id, timestamp)``. This rewrites the table; run it in a
+    maintenance window.
+    """
+    today = _day(datetime.datetime.utcnow())
+    if days_back is None:
+        oldest = _oldest(table)
+        days_back = (today - _day(oldest)).days - 1 if oldest is not None else 0
+    days_back = max(days_back, 0)
+    first = today - datetime.timedelta(days=days_back)
+    bounds = [first + datetime.timedelta(days=i) for i in range(days_back + PARTITIONS_AHEAD + 1)]
+    partitions = ", ".join(
+        f"PARTITION p{bound:%Y%m%d} VALUES LESS THAN ('{bound:%Y-%m-%d}')" for bound in bounds)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            ALTER TABLE {table}
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id, timestamp)
+            PARTITION BY RANGE COLUMNS (timestamp) (
+                {partitions},
+                PARTITION pmax VALUES LESS THAN (MAXVALUE)
+            )
+        """)
+        conn.commit()
+
+
+def ensure_future_partitions(cursor, table, partitions):
+    """Split ``pmax`` so daily partitions exist PARTITIONS_AHEAD days ahead."""
+    bounds = [bound for _, bound in partitions if bound is not None]
+    if not bounds or not any(name == 'pmax' for name, _ in partitions):
+        return []
+    target = _day(datetime.datetime.utcnow()) + datetime.timedelta(days=PARTITIONS_AHEAD + 1)
+    new_bounds = []
+    bound = max(bounds)
+    while bound < target:
+        bound += datetime.timedelta(days=1)
+        new_bounds.append(bound)
+    if new_bounds:
+        parts = ", ".join(
+            f"PARTITION p{b:%Y%m%d} VALUES LESS THAN ('{b:%Y-%m-%d}')" for b in new_bounds)
+        cursor.execute(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (
+                {parts},
+                PARTITION pmax VALUES LESS THAN (MAXVALUE)
+            )
+        """)
+    return new_bounds
+
+
+# -------------------------------
+# 🔹 ARCHIVE + PRUNE
+# -------------------------------
+def archive_path(dataset, day, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, dataset, f"{dataset}_{day:%Y-%m-%d}.csv.gz")
+
+
+def archived_max_key(dataset, day, archive_dir=ARCHIVE_DIR):
+    """Highest key in the archive files already written for ``day``, or None."""
+    _, key, _ = EXPORT_TABLES[dataset]
+    base = archive_path(dataset, day, archive_dir)[:-len(".csv.gz")]
+    highest = None
+    for path in [base + ".csv.gz", *glob.glob(glob.escape(base) + ".*.csv.gz")]:
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', newline='') as archived:
+            reader = csv.reader(archived)
+            header = next(reader, [])
+            if key not in header:
+                continue
+            index = header.index(key)
+            for row in reader:
+                value = int(row[index])
+                if highest is None or value > highest:
+                    highest = value
+    return highest
+
+
+def archive_day(dataset, day, archive_dir=ARCHIVE_DIR, conditions=(), keys=None):
+    """Write one day of ``dataset`` to ``<archive_dir>/<dataset>/<dataset>_<day>.csv.gz``.
+
+    An existing archive is never overwritten: rows archived for the same day
+    on a later run (e.g. alerts closed since) go to an additional part file
+    ``<dataset>_<day>.<run timestamp>.csv.gz`` next to it. Pass a list as
+    ``keys`` to collect the primary keys of the rows written.
+    """
+    next_day = day + datetime.timedelta(days=1)
+    day_filter = ("timestamp >= %s AND timestamp < %s", [day, next_day])
+    path = archive_path(dataset, day, archive_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        path = path[:-len(".csv.gz")] + f".{datetime.datetime.utcnow():%Y%m%dT%H%M%S%f}.csv.gz"
+    tmp_path = path + ".part"
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += len(batch.rows)
+            if keys is not None and batch.rows:
+                index = batch.columns.index(EXPORT_TABLES[dataset][1])
+                keys.extend(row[index] for row in batch.rows)
+            yield batch
+
+    batches = counted(iter_batches(dataset, keyset=True, conditions=(day_filter, *conditions)))
+    with open(tmp_path, 'wb') as out:
+        for chunk in gzip_chunks(iter_csv(batches)):
+            out.write(chunk)
+    if rows:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return rows
+
+
+def delete_before(table, cutoff, extra_where="", params=()):
+    """Batched DELETE so no single statement holds locks for long."""
+    total = 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE timestamp < %s {extra_where} LIMIT {DELETE_BATCH_ROWS}",
+                (cutoff, *params))
+            deleted = cursor.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < DELETE_BATCH_ROWS:
+                return total
+
+
+def delete_keys(table, key, keys):
+    """Delete exactly the rows with the given primary keys, in batches."""
+    total = 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for i in range(0, len(keys), DELETE_BATCH_ROWS):
+            chunk = keys[i:i + DELETE_BATCH_ROWS]
+            cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            total += cursor.rowcount
+            conn.commit()
+    return total
+
+
+def _oldest(table, extra_where="", params=()):
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT MIN(timestamp) FROM {table} WHERE 1=1 {extra_where}", params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def run(days, alert_days=None, archive=True, rollup=False, dry_run=False, log=print):
+    cutoff = _day(datetime.datetime.utcnow()) - datetime.timedelta(days=days)
+    log(f"telemetry_data: retaining rows from {cutoff:%Y-%m-%d}")
+
+    oldest = _oldest('telemetry_data')
+    if oldest is not None and oldest < cutoff:
+        for day in _days(oldest, cutoff):
+            conditions = ()
+            if archive and os.path.exists(archive_path('telemetry', day)):
+                # Archived by an earlier run; rows that arrived since (late
+                # readings) still go to a part file before the day is dropped
+                last_id = archived_max_key('telemetry', day)
+                conditions = (("id > %s", [last_id]),) if last_id is not None else ()
+            elif rollup and not dry_run:
+                rollups.rebuild(day, day + datetime.timedelta(days=1))
+            if archive and not dry_run:
+                archived = archive_day('telemetry', day, conditions=conditions)
+                log(f"  archived {archived} rows for {day:%Y-%m-%d}")
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        partitions = list_partitions(cursor, 'telemetry_data')
+        if partitions:
+            expired = [name for name, bound in partitions
+                       if bound is not None and bound <= cutoff and _PARTITION_NAME.match(name)]
+            if expired and not dry_run:
+                cursor.execute(f"ALTER TABLE telemetry_data DROP PARTITION {', '.join(expired)}")
+            log(f"  {'would drop' if dry_run else 'dropped'} {len(expired)} partition(s)")
+            if not dry_run:
+                added = ensure_future_partitions(cursor, 'telemetry_data', list_partitions(cursor, 'telemetry_data'))
+                log(f"  added {len(added)} future partition(s)")
+            conn.commit()
+
+    if not partitions and not dry_run:
+        log(f"  deleted {delete_before('telemetry_data', cutoff)} rows")
+
+    # Closed alerts only; open alerts stay until someone resolves them
+    alert_cutoff = _day(datetime.datetime.utcnow()) - datetime.timedelta(days=alert_days or days)
+    closed = "AND alert_status <> 'ACTIVE'"
+    log(f"alerts: retaining closed alerts from {alert_cutoff:%Y-%m-%d}")
+    oldest = _oldest('alerts', closed)
+    if oldest is not None and oldest < alert_cutoff and not dry_run:
+        if archive:
+            # Delete exactly what was archived: an alert closed in between
+            # waits for the next run instead of going unarchived
+            deleted = 0
+            for day in _days(oldest, alert_cutoff):
+                keys = []
+                archived = archive_day('alerts', day, conditions=(("alert_status <> 'ACTIVE'", []),), keys=keys)
+                deleted += delete_keys('alerts', 'id', keys)
+                log(f"  archived {archived} alerts for {day:%Y-%m-%d}")
+        else:
+            deleted = delete_before('alerts', alert_cutoff, closed)
+        log(f"  deleted {deleted} alerts")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive and prune old telemetry and alerts")
+    parser.add_argument('--days', type=int, default=int(os.getenv('RETENTION_DAYS', '90')),
+                        help="days of raw telemetry to keep (default 90)")
+    parser.add_argument('--alert-days', type=int, default=None,
+                        help="days of closed alerts to keep (default: same as --days)")
+    parser.add_argument('--no-archive', action='store_true', help="delete without writing archive files")
+    parser.add_argument('--rollup', action='store_true', help="rebuild rollups for each day before pruning it")
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--partition', action='store_true',
+                        help="one-off: convert telemetry_data to daily partitions, then exit")
+    parser.add_argument('--partition-days-back', type=int, default=None,
+                        help="with --partition, create daily partitions for this many past days "
+                             "(default: back to the oldest row)")
+    args = parser.parse_args()
+
+    if args.partition:
+        partition_table('telemetry_data', args.partition_days_back)
+        print("telemetry_data is now partitioned by day")
+    else:
+        run(args.days, args.alert_days, archive=not args.no_archive,
+            rollup=args.rollup, dry_run=args.dry_run)
@@ -0,0 +1,210 @@
+# rollups.py
+"""Per-pole hourly and daily telemetry aggregates (``telemetry_rollup``).
+
+Maintained incrementally by ingest when ROLLUP_MODE=ingest, or rebuilt from
+raw telemetry by the compactor::
+
+    python rollups.py --from 2025-01-01 --to 2025-02-01
+"""
+import argparse
+import datetime
+import os
+
+from db import db_connection
+
+BUCKETS = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+
+# Gaps between readings longer than this are not counted as ON/OFF time
+MAX_GAP = datetime.timedelta(seconds=int(os.getenv('ROLLUP_MAX_GAP_SECONDS', str(6 * 3600))))
+# Upper bound on points returned by /api/telemetry/rollup in auto mode
+MAX_POINTS = int(os.getenv('ROLLUP_MAX_POINTS', '500'))
+
+INGEST_ROLLUPS = os.getenv('ROLLUP_MODE', 'off').lower() == 'ingest'
+
+# Accumulator slots
+_COUNT, _ON_S, _OFF_S, _SIG_MIN, _SIG_SUM, _SIG_N, _FIRST_ON, _FIRST_OFF = range(8)
+
+UPSERT_SQL = """
+    INSERT INTO telemetry_rollup
+        (pole_id, bucket, bucket_start, reading_count, on_seconds, off_seconds,
+         signal_min, signal_sum, signal_count, first_on, first_off)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        reading_count = reading_count + VALUES(reading_count),
+        on_seconds = on_seconds + VALUES(on_seconds),
+        off_seconds = off_seconds + VALUES(off_seconds),
+        signal_min = LEAST(COALESCE(signal_min, VALUES(signal_min)),
+                           COALESCE(VALUES(signal_min), signal_min)),
+        signal_sum = signal_sum + VALUES(signal_sum),
+        signal_count = signal_count + VALUES(signal_count),
+        first_on = LEAST(COALESCE(first_on, VALUES(first_on)),
+                         COALESCE(VALUES(first_on), first_on)),
+        first_off = LEAST(COALESCE(first_off, VALUES(first_off)),
+                          COALESCE(VALUES(first_off), first_off))
+"""
+
+
+def bucket_start(timestamp, bucket):
+    if bucket == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _slot(acc, pole_id, bucket, start):
+    key = (pole_id, bucket, start)
+    slot = acc.get(key)
+    if slot is None:
+        slot = acc[key] = [0, 0, 0, None, 0, 0, None, None]
+    return slot
+
+
+def accumulate(acc, pole_id, prev_status, prev_time, status, timestamp, signal_strength):
+    """Fold one reading into ``acc``.
+
+    The time since the previous reading is credited to the previous status
+    and split across the hour/day buckets it spans.
+    """
+    for bucket, width in BUCKETS.items():
+        if prev_time is not None and prev_status in ('ON', 'OFF') and \
+                datetime.timedelta(0) < timestamp - prev_time <= MAX_GAP:
+            column = _ON_S if prev_status == 'ON' else _OFF_S
+            cursor = prev_time
+            while cursor < timestamp:
+                start = bucket_start(cursor, bucket)
+                end = min(start + width, timestamp)
+                _slot(acc, pole_id, bucket, start)[column] += int((end - cursor).total_seconds())
+                cursor = end
+
+        slot = _slot(acc, pole_id, bucket, bucket_start(timestamp, bucket))
+        slot[_COUNT] += 1
+        if isinstance(signal_strength, (int, float)):
+            slot[_SIG_MIN] = signal_strength if slot[_SIG_MIN] is None else min(slot[_SIG_MIN], signal_strength)
+            slot[_SIG_SUM] += signal_strength
+            slot[_SIG_N] += 1
+        first = _FIRST_ON if status == 'ON' else _FIRST_OFF
+        if slot[first] is None or timestamp < slot[first]:
+            slot[first] = timestamp
+
+
+def upsert_rows(acc):
+    """Parameter rows for UPSERT_SQL."""
+    return [(pole_id, bucket, start, *slot) for (pole_id, bucket, start), slot in acc.items()]
+
+
+def write_rollups(cursor, acc):
+    """Upsert accumulated buckets. The caller commits."""
+    if acc:
+        cursor.executemany(UPSERT_SQL, upsert_rows(acc))
+
+
+# -------------------------------
+# 🔹 COMPACTOR
+# -------------------------------
+def rebuild(start, end, flush_rows=5000):
+    """Recompute rollups for ``[start, end)`` (whole days) from raw telemetry."""
+    start = bucket_start(start, 'day')
+    end = bucket_start(end, 'day')
+    if end <= start:
+        end = start + BUCKETS['day']
+
+    written = 0
+    # Raw rows stream on their own unbuffered connection while buckets are written
+    with db_connection() as conn, db_connection() as read_conn:
+        write_cursor = conn.cursor()
+        write_cursor.execute(
+            "DELETE FROM telemetry_rollup WHERE bucket_start >= %s AND bucket_start < %s",
+            (start, end))
+
+        read_cursor = read_conn.cursor(buffered=False)
+        read_cursor.execute("""
+            SELECT pole_id, status, signal_strength, timestamp
+            FROM telemetry_data
+            WHERE timestamp >= %s AND timestamp < %s
+            ORDER BY pole_id, timestamp
+        """, (start, end))
+
+        acc = {}
+        prev_pole = prev_status = prev_time = None
+        while True:
+            rows = read_cursor.fetchmany(flush_rows)
+            if not rows:
+                break
+            for pole_id, status, signal_strength, timestamp in rows:
+                if pole_id != prev_pole:
+                    if len(acc) >= flush_rows:
+                        write_rollups(write_cursor, acc)
+                        written += len(acc)
+                        acc = {}
+                    prev_pole, prev_status, prev_time = pole_id, None, None
+                accumulate(acc, pole_id, prev_status, prev_time, status, timestamp, signal_strength)
+                prev_status, prev_time = status, timestamp
+        write_rollups(write_cursor, acc)
+        written += len(acc)
+        conn.commit()
+    return written
+
+
+# -------------------------------
+# 🔹 QUERIES
+# -------------------------------
+def pick_bucket(start, end, requested='auto'):
+    """Use the requested bucket, or the finest one that stays under MAX_POINTS."""
+    if requested in BUCKETS:
+        return requested
+    for bucket, width in BUCKETS.items():
+        if (end - start) / width <= MAX_POINTS:
+            return bucket
+    return 'day'
+
+
+def query_rollups(cursor, bucket, start, end, pole_id=None):
+    """Rollup rows for one pole, or summed across the fleet when ``pole_id`` is None."""
+    if pole_id:
+        cursor.execute("""
+            SELECT bucket_start, reading_count, on_seconds, off_seconds,
+                   signal_min, signal_sum, signal_count, first_on, first_off
+            FROM telemetry_rollup
+            WHERE pole_id = %s AND bucket = %s
+              AND bucket_start >= %s AND bucket_start < %s
+            ORDER BY bucket_start
+        """, (pole_id, bucket, bucket_start(start, bucket), end))
+    else:
+        cursor.execute("""
+            SELECT bucket_start, SUM(reading_count) AS reading_count,
+                   SUM(on_seconds) AS on_seconds, SUM(off_seconds) AS off_seconds,
+                   MIN(signal_min) AS signal_min, SUM(signal_sum) AS signal_sum,
+                   SUM(signal_count) AS signal_count,
+                   MIN(first_on) AS first_on, MIN(first_off) AS first_off
+            FROM telemetry_rollup
+            WHERE bucket = %s AND bucket_start >= %s AND bucket_start < %s
+            GROUP BY bucket_start
+            ORDER BY bucket_start
+        """, (bucket, bucket_start(start, bucket), end))
+
+    data = []
+    for row in cursor.fetchall():
+        signal_count = int(row.pop('signal_count') or 0)
+        signal_sum = row.pop('signal_sum') or 0
+        for key in ('reading_count', 'on_seconds', 'off_seconds'):
+            row[key] = int(row[key] or 0)
+        row['signal_avg'] = round(float(signal_sum) / signal_count, 1) if signal_count else None
+        for key in ('bucket_start', 'first_on', 'first_off'):
+            if row[key]:
+                row[key] = row[key].isoformat()
+        data.append(row)
+    return data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild telemetry rollups from raw telemetry")
+    parser.add_argument('--from', dest='start', required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', help="day after the last one (default: tomorrow)")
+    args = parser.parse_args()
+
+    start = datetime.datetime.fromisoformat(args.start)
+    end = (datetime.datetime.fromisoformat(args.end) if args.end
+           else bucket_start(datetime.datetime.utcnow(), 'day') + BUCKETS['day'])
+    print(f"rebuilt {rebuild(start, end)} rollup buckets for {start:%Y-%m-%d} .. {end:%Y-%m-%d}")
@@ -0,0 +1,121 @@
+# schema.py
+"""Idempotent schema additions needed by the backend's query paths.
+
+Applied when the API, the async ingest server or the standalone heartbeat
+process starts (``ensure_schema``), unless SCHEMA_AUTO_MIGRATE=0; then run
+``python schema.py`` after deploying instead (safe to re-run).
+"""
+import logging
+import os
+
+import mysql.connector
+
+from db import db_connection
+
+log = logging.getLogger(__name__)
+
+AUTO_MIGRATE = os.getenv('SCHEMA_AUTO_MIGRATE', '1').lower() in ('1', 'true', 'yes')
+
+# MySQL error codes meaning "already applied"
+_ALREADY_APPLIED = {
+    1050,  # table already exists
+    1060,  # duplicate column name
+    1061,  # duplicate key name
+}
+
+# (name, statement) — applied in order
+MIGRATIONS = [
+    # /api/poles?since= delta sync
+    ("poles_update_time_idx",
+     "CREATE INDEX idx_poles_update_time ON poles (update_time)"),
+    # Hourly/daily aggregates behind /api/telemetry/rollup (see rollups.py)
+    ("telemetry_rollup_table", """
+        CREATE TABLE telemetry_rollup (
+            pole_id VARCHAR(64) NOT NULL,
+            bucket ENUM('hour', 'day') NOT NULL,
+            bucket_start DATETIME NOT NULL,
+            reading_count INT NOT NULL DEFAULT 0,
+            on_seconds INT NOT NULL DEFAULT 0,
+            off_seconds INT NOT NULL DEFAULT 0,
+            signal_min INT NULL,
+            signal_sum BIGINT NOT NULL DEFAULT 0,
+            signal_count INT NOT NULL DEFAULT 0,
+            first_on DATETIME NULL,
+            first_off DATETIME NULL,
+            PRIMARY KEY (pole_id, bucket, bucket_start),
+            KEY idx_rollup_bucket_start (bucket, bucket_start)
+        )
+    """),
+    ("telemetry_pole_timestamp_idx",
+     "CREATE INDEX idx_telemetry_pole_ts ON telemetry_data (pole_id, timestamp)"),
+    ("telemetry_timestamp_idx",
+     "CREATE INDEX idx_telemetry_ts ON telemetry_data (timestamp)"),
+    # Dawn/dusk window tagged at ingest (see telemetry_windows.py); run
+    # `python telemetry_windows.py --backfill` once after adding the column
+    ("telemetry_time_window_column",
+     "ALTER TABLE telemetry_data ADD COLUMN time_window VARCHAR(16) NULL"),
+    ("telemetry_pole_window_idx",
+     "CREATE INDEX idx_telemetry_pole_window_ts ON telemetry_data (pole_id, time_window, timestamp)"),
+    ("telemetry_window_idx",
+     "CREATE INDEX idx_telemetry_window_ts ON telemetry_data (time_window, timestamp)"),
+    # Stored ONLINE/MAINTENANCE/OFFLINE state maintained by heartbeat.py;
+    # status_changed_at lets ?since= pick up flips that do not move update_time
+    ("poles_display_status_column",
+     "ALTER TABLE poles ADD COLUMN display_status VARCHAR(16) NULL"),
+    ("poles_status_changed_at_column",
+     "ALTER TABLE poles ADD COLUMN status_changed_at DATETIME NULL"),
+    ("poles_status_changed_at_idx",
+     "CREATE INDEX idx_poles_status_changed_at ON poles (status_changed_at)"),
+    # /api/alerts keyset pages on (timestamp, id), optionally filtered
+    ("alerts_ts_idx",
+     "CREATE INDEX idx_alerts_ts_id ON alerts (timestamp, id)"),
+    ("alerts_pole_ts_idx",
+     "CREATE INDEX idx_alerts_pole_ts_id ON alerts (pole_id, timestamp, id)"),
+    ("alerts_status_ts_idx",
+     "CREATE INDEX idx_alerts_status_ts_id ON alerts (alert_status, timestamp, id)"),
+    ("alerts_severity_ts_idx",
+     "CREATE INDEX idx_alerts_severity_ts_id ON alerts (severity, timestamp, id)"),
+    ("alerts_type_ts_idx",
+     "CREATE INDEX idx_alerts_type_ts_id ON alerts (alert_type, timestamp, id)"),
+]
+
+
+def apply_migrations(verbose=False):
+    applied = []
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for name, statement in MIGRATIONS:
+            try:
+                cursor.execute(statement)
+                applied.append(name)
+            except mysql.connector.Error as e:
+                if e.errno not in _ALREADY_APPLIED:
+                    raise
+                continue
+            if verbose:
+                print(f"applied {name}")
+        conn.commit()
+    return applied
+
+
+def ensure_schema():
+    """Apply pending migrations at start-up when SCHEMA_AUTO_MIGRATE is on.
+
+    Ingest writes ``time_window`` / ``display_status``, so an un-migrated
+    database would fail every write. Failures (e.g. a DB user without ALTER
+    rights) are logged, not raised, so the read API still starts.
+    """
+    if not AUTO_MIGRATE:
+        return
+    try:
+        applied = apply_migrations()
+    except Exception:
+        log.exception("Schema migrations failed; run `python schema.py` with a privileged DB user")
+        return
+    if applied:
+        log.info("Applied schema migrations: %s", ", ".join(applied))
+
+
+if __name__ == '__main__':
+    done = apply_migrations(verbose=True)
+    print(f"{len(done)} migration(s) applied, {len(MIGRATIONS) - len(done)} already present")
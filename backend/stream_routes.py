@@ -0,0 +1,57 @@
+from flask import Blueprint, request, Response, stream_with_context
+from events import bus
+import os
+import queue
+
+stream_bp = Blueprint('stream', __name__)
+
+# Seconds between keepalive comments on an idle stream
+HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT', '15'))
+
+
+def _format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+@stream_bp.route('/api/stream', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events feed of dashboard deltas:
+    - pole:  one changed pole, same shape as an /api/poles entry
+    - alert: one newly raised alert, same shape as an /api/alerts entry
+    - stats: {"delta": {...}} changes to the /api/stats counters
+    - reset: the replay buffer no longer covers Last-Event-ID; refetch in full
+    Reconnecting clients resume from Last-Event-ID (header or query arg).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscriber, backlog, complete = bus.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if not complete:
+                yield "event: reset\ndata: {}\n\n"
+            for item in backlog:
+                yield _format_event(*item)
+            while True:
+                try:
+                    item = subscriber.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    # Dropped as a slow consumer; the client reconnects and replays
+                    return
+                yield _format_event(*item)
+        finally:
+            bus.unsubscribe(subscriber)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
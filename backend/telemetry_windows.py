@@ -0,0 +1,146 @@
+# telemetry_windows.py
+"""Dawn/dusk reporting windows stamped onto ``telemetry_data.time_window``.
+
+Windows come from TELEMETRY_WINDOWS, e.g. ``dawn=06:30-07:00,dusk=18:00-18:30``
+(bounds inclusive, compared against the stored timestamp's time of day).
+Ingest tags each reading; after changing the windows re-tag history with::
+
+    python telemetry_windows.py --backfill
+"""
+import argparse
+import datetime
+import os
+
+from db import db_connection
+
+DEFAULT_WINDOWS = "dawn=06:30-07:00,dusk=18:00-18:30"
+
+
+def parse_windows(spec):
+    """``"name=HH:MM-HH:MM,..."`` -> ``[(name, start_time, end_time), ...]``"""
+    windows = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, bounds = part.partition('=')
+        start, _, end = bounds.partition('-')
+        windows.append((name.strip(),
+                        datetime.time.fromisoformat(start.strip()),
+                        datetime.time.fromisoformat(end.strip())))
+    return windows
+
+
+WINDOWS = parse_windows(os.getenv('TELEMETRY_WINDOWS', DEFAULT_WINDOWS))
+WINDOW_NAMES = [name for name, _, _ in WINDOWS]
+
+
+def to_stored_second(timestamp):
+    """Round to whole seconds the way a DATETIME(0) column stores the value."""
+    if timestamp.microsecond >= 500000:
+        timestamp += datetime.timedelta(seconds=1)
+    return timestamp.replace(microsecond=0)
+
+
+def window_for(timestamp):
+    """Name of the window ``timestamp`` falls in (as stored), or None."""
+    time_of_day = to_stored_second(timestamp).time()
+    for name, start, end in WINDOWS:
+        if start <= time_of_day <= end:
+            return name
+    return None
+
+
+def window_query(pole_id=None, limit=None, before=None, table='telemetry_data'):
+    """SQL and params for readings inside the windows, newest first.
+
+    Served by the (pole_id, time_window, timestamp) / (time_window, timestamp)
+    indexes. ``before`` is a ``(timestamp, id)`` keyset cursor. With
+    ``limit``, each window is read with its own LIMIT and the pages merged,
+    since an IN list cannot be read in timestamp order from the index.
+    """
+    clauses = []
+    params = []
+    if pole_id:
+        clauses.append("pole_id = %s")
+        params.append(pole_id)
+    if before:
+        clauses.append("(timestamp < %s OR (timestamp = %s AND id < %s))")
+        params += [before[0], before[0], before[1]]
+
+    if limit is None:
+        clauses.append(f"time_window IN ({', '.join(['%s'] * len(WINDOW_NAMES))})")
+        query = f"""
+            SELECT id, pole_id, status, timestamp
+            FROM {table}
+            WHERE {' AND '.join(clauses)}
+            ORDER BY timestamp DESC, id DESC
+        """
+        return query, params + WINDOW_NAMES
+
+    branches = []
+    branch_params = []
+    for i, name in enumerate(WINDOW_NAMES):
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT id, pole_id, status, timestamp
+                FROM {table}
+                WHERE {' AND '.join(clauses + ["time_window = %s"])}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT {int(limit)}
+            ) AS w{i}
+        """)
+        branch_params += params + [name]
+    query = " UNION ALL ".join(branches) + f" ORDER BY timestamp DESC, id DESC LIMIT {int(limit)}"
+    return query, branch_params
+
+
+def backfill(batch_rows=10000, verbose=False):
+    """Re-tag stored telemetry against the configured windows, in small batches."""
+    statements = []
+    if WINDOW_NAMES:
+        placeholders = ", ".join(["%s"] * len(WINDOW_NAMES))
+        statements.append((
+            f"UPDATE telemetry_data SET time_window = NULL "
+            f"WHERE time_window IS NOT NULL AND time_window NOT IN ({placeholders}) LIMIT {int(batch_rows)}",
+            WINDOW_NAMES))
+    else:
+        statements.append((
+            f"UPDATE telemetry_data SET time_window = NULL "
+            f"WHERE time_window IS NOT NULL LIMIT {int(batch_rows)}", []))
+    for name, start, end in WINDOWS:
+        statements.append((
+            f"UPDATE telemetry_data SET time_window = NULL "
+            f"WHERE time_window = %s AND TIME(timestamp) NOT BETWEEN %s AND %s LIMIT {int(batch_rows)}",
+            [name, start, end]))
+        statements.append((
+            f"UPDATE telemetry_data SET time_window = %s "
+            f"WHERE (time_window IS NULL OR time_window <> %s) "
+            f"AND TIME(timestamp) BETWEEN %s AND %s LIMIT {int(batch_rows)}",
+            [name, name, start, end]))
+
+    total = 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for statement, params in statements:
+            while True:
+                cursor.execute(statement, params)
+                changed = cursor.rowcount
+                conn.commit()
+                total += changed
+                if verbose and changed:
+                    print(f"updated {changed} rows")
+                if changed < batch_rows:
+                    break
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain telemetry_data.time_window")
+    parser.add_argument('--backfill', action='store_true', help="re-tag stored rows")
+    parser.add_argument('--batch-rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    print("windows:", ", ".join(f"{n}={s:%H:%M}-{e:%H:%M}" for n, s, e in WINDOWS) or "none")
+    if args.backfill:
+        print(f"{backfill(args.batch_rows, verbose=True)} rows re-tagged")
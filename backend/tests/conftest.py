@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""Shared fixtures: the app against a fresh SQLite stand-in per test module.
+
+The registry, alert engine, counters and caches are process-wide, so each
+fresh database also resets them; otherwise poles and open alerts from an
+earlier module's database would leak into the next one.
+"""
+import datetime
+import os
+import sys
+
+os.environ.setdefault('STATS_MODE', 'incremental')
+# The stand-in creates the full schema; schema.py's statements are MySQL's
+os.environ.setdefault('SCHEMA_AUTO_MIGRATE', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+from bench import standin
+
+POLE_INSERT = """
+    INSERT INTO poles (pole_id, cluster_id, latitude, longitude, status, communication_status,
+                       state, district, city_or_village, mode, firmware_version, update_time)
+    VALUES (%s, %s, %s, %s, %s, 'ONLINE', 'Maharashtra', 'Pune', 'Pune-01', 'AUTO', 'v1.0.3', %s)
+"""
+
+
+def reset_state():
+    """Forget everything the process cached about the previous database."""
+    import fleet_stats
+    from alert_rules import engine
+    from geo_index import geo_index
+    from pole_registry import registry
+    from response_cache import cache
+
+    registry.invalidate()
+    with engine._lock:
+        engine._open = set()
+        engine._pending = set()
+        engine._last_fired = {}
+        engine._loaded_at = None
+    if fleet_stats.counters is not None:
+        fleet_stats.counters._counts = None
+        fleet_stats.counters._reconciled_at = None
+    fleet_stats.breakdown._reconciled_at = None
+    geo_index.__init__(geo_index.max_zoom)
+    cache.invalidate()
+
+
+def install(path, pool_size=4):
+    standin.install(str(path), pool_size=pool_size)
+    reset_state()
+
+
+def seed_poles(pole_ids, status='ON', lat=18.5, lon=73.8, cluster='C1', now=None):
+    """Insert poles sharing the given attributes."""
+    now = now or datetime.datetime.utcnow()
+    with db.db_connection() as conn:
+        conn.cursor().executemany(POLE_INSERT, [(pole_id, cluster, lat, lon, status, now)
+                                                for pole_id in pole_ids])
+        conn.commit()
+    from pole_registry import registry
+    registry.invalidate()
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    install(tmp_path_factory.mktemp('app') / 'app.db')
+    from app import app
+    return app.test_client()
@@ -0,0 +1,72 @@
+# tests/test_alerts.py
+"""Alert dedupe across ingest: open alerts, failed writes and the cooldown."""
+import pytest
+
+import db
+import iot_routes
+from alert_rules import engine as alert_engine
+from conftest import seed_poles
+
+WEAK = -95  # below ALERT_WEAK_SIGNAL_DBM
+
+
+@pytest.fixture(scope='module', autouse=True)
+def poles(client):
+    seed_poles(['A00001', 'A00002', 'A00003'])
+
+
+def _weak(client, pole_id):
+    response = client.post('/api/iot/data', json={"pole_id": pole_id, "status": "ON", "signal_strength": WEAK})
+    assert response.status_code == 200
+
+
+def _alerts(pole_id):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT alert_type, alert_status FROM alerts WHERE pole_id = %s", (pole_id,))
+        return cursor.fetchall()
+
+
+def test_open_alert_is_not_raised_twice(client):
+    _weak(client, 'A00001')
+    _weak(client, 'A00001')
+    assert _alerts('A00001') == [('No Communication', 'ACTIVE')]
+
+
+class FailingCommit:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return self._conn.cursor(*args, **kwargs)
+
+    def commit(self):
+        raise RuntimeError("commit failed")
+
+
+def test_failed_write_releases_its_claim(client):
+    reading, _ = iot_routes.parse_reading({"pole_id": "A00002", "status": "ON", "signal_strength": WEAK})
+    with db.db_connection() as conn:
+        with pytest.raises(RuntimeError):
+            iot_routes.ingest_readings(FailingCommit(conn), [reading])
+        conn.rollback()
+    assert _alerts('A00002') == []
+
+    # The retried reading raises the alert the failed one had claimed
+    _weak(client, 'A00002')
+    assert _alerts('A00002') == [('No Communication', 'ACTIVE')]
+
+
+def test_closed_alert_waits_for_the_cooldown(client, monkeypatch):
+    _weak(client, 'A00003')
+    with db.db_connection() as conn:
+        conn.cursor().execute("UPDATE alerts SET alert_status = 'CLOSED' WHERE pole_id = 'A00003'")
+        conn.commit()
+    alert_engine.resolved('A00003', 'No Communication')
+
+    _weak(client, 'A00003')
+    assert _alerts('A00003') == [('No Communication', 'CLOSED')]
+
+    monkeypatch.setattr(alert_engine, 'cooldown', 0)
+    _weak(client, 'A00003')
+    assert sorted(_alerts('A00003')) == [('No Communication', 'ACTIVE'), ('No Communication', 'CLOSED')]
@@ -0,0 +1,79 @@
+# tests/test_alerts_paging.py
+"""Keyset paging of /api/alerts."""
+import datetime
+
+import pytest
+
+import db
+
+START = datetime.datetime(2025, 1, 1)
+
+
+def _insert_alerts(rows):
+    with db.db_connection() as conn:
+        conn.cursor().executemany("""
+            INSERT INTO alerts (pole_id, message, severity, alert_status, alert_type, timestamp)
+            VALUES (%s, 'm', 'warning', %s, 'Manual Switch', %s)
+        """, rows)
+        conn.commit()
+
+
+@pytest.fixture(scope='module', autouse=True)
+def alerts(client):
+    # Pairs share a timestamp, so the id tie-break is exercised
+    _insert_alerts([(f"P{i % 3:05d}", 'ACTIVE' if i % 4 else 'CLOSED', START + datetime.timedelta(minutes=i // 2))
+                    for i in range(25)])
+
+
+def _pages(client, **args):
+    pages = []
+    cursor = None
+    while True:
+        query = dict(args, **({'before': cursor} if cursor else {}))
+        body = client.get('/api/alerts', query_string=query).get_json()
+        pages.append(body)
+        cursor = body['next']
+        if not cursor:
+            return pages
+
+
+def test_total_only_on_first_page(client):
+    pages = _pages(client, limit=10)
+    assert pages[0]['total'] == 25
+    assert [page['total'] for page in pages[1:]] == [None, None]
+    second = client.get('/api/alerts', query_string={'limit': 10, 'before': pages[0]['next'],
+                                                     'with_total': 1}).get_json()
+    assert second['total'] == 25
+
+
+def _key(row):
+    return row['timestamp'], row['id']
+
+
+def test_cursor_is_stable_under_concurrent_inserts(client):
+    before = [row for page in _pages(client, limit=1000) for row in page['data']]
+
+    first = client.get('/api/alerts', query_string={'limit': 7}).get_json()
+    # New alerts land while the client pages: newer ones, and one sharing the
+    # timestamp of the page boundary (it gets a higher id, so sorts above it)
+    boundary = datetime.datetime.fromisoformat(first['data'][-1]['timestamp'])
+    _insert_alerts([('P00009', 'ACTIVE', START + datetime.timedelta(days=1)),
+                    ('P00009', 'ACTIVE', boundary)])
+
+    rows = list(first['data'])
+    cursor = first['next']
+    while cursor:
+        page = client.get('/api/alerts', query_string={'limit': 7, 'before': cursor}).get_json()
+        rows += page['data']
+        cursor = page['next']
+
+    assert [row['id'] for row in rows] == [row['id'] for row in before]
+    assert rows == sorted(rows, key=_key, reverse=True)
+
+
+def test_filtered_pages_cover_exactly_the_matches(client):
+    rows = [row for page in _pages(client, limit=4, alert_status='CLOSED') for row in page['data']]
+    assert rows and all(row['alert_status'] == 'CLOSED' for row in rows)
+    assert len({row['id'] for row in rows}) == len(rows)
+    everything = client.get('/api/alerts', query_string={'limit': 500, 'alert_status': 'CLOSED'}).get_json()
+    assert everything['total'] == len(rows)
@@ -0,0 +1,50 @@
+# tests/test_asgi_ingest.py
+"""Async writer: per-pole ordering and isolation of a rejected reading."""
+import asyncio
+import sqlite3
+
+import pytest
+
+pytest.importorskip('mysql.connector.aio')
+
+import asgi_ingest
+
+
+class FakeConnection:
+    async def close(self):
+        pass
+
+
+def test_rejected_reading_fails_alone_and_order_is_kept(monkeypatch):
+    written = []
+
+    async def connect(**settings):
+        return FakeConnection()
+
+    async def write(self, cnx, readings):
+        if any(r['signal_strength'] == 'bad' for r in readings):
+            raise sqlite3.DataError("out of range")
+        written.extend(readings)
+        return set()
+
+    monkeypatch.setattr(asgi_ingest, 'connect', connect)
+    monkeypatch.setattr(asgi_ingest.AsyncIngestWriter, '_write', write)
+
+    async def scenario():
+        writer = asgi_ingest.AsyncIngestWriter(writers=3, linger_ms=5)
+        writer.start()
+        readings = [{'pole_id': f"P{i % 4:05d}", 'signal_strength': i} for i in range(40)]
+        readings[17]['signal_strength'] = 'bad'
+        futures = [writer.submit(reading) for reading in readings]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await writer.stop()
+        return readings, results, writer.stats()
+
+    readings, results, stats = asyncio.run(scenario())
+
+    assert isinstance(results[17], sqlite3.DataError)
+    assert all(result is True for i, result in enumerate(results) if i != 17)
+    assert stats['failed'] == 1
+    for pole_id in {r['pole_id'] for r in readings}:
+        expected = [r['signal_strength'] for r in readings if r['pole_id'] == pole_id and r is not readings[17]]
+        assert [r['signal_strength'] for r in written if r['pole_id'] == pole_id] == expected
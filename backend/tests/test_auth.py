@@ -0,0 +1,49 @@
+# tests/test_auth.py
+"""Changing or deleting a user revokes the tokens issued to them."""
+import pytest
+
+
+def _sign_in(client, email, password='secret'):
+    response = client.post('/api/auth/signin', json={'email': email, 'password': password})
+    assert response.status_code == 200
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+@pytest.fixture(scope='module')
+def users(client):
+    for name, role in (('Asha', 'admin'), ('Ravi', 'technician')):
+        response = client.post('/api/auth/signup', json={
+            'name': name, 'email': f"{name.lower()}@example.com", 'phone': '1', 'password': 'secret', 'role': role})
+        assert response.status_code == 201
+    return _sign_in(client, 'asha@example.com'), _sign_in(client, 'ravi@example.com')
+
+
+def _user_id(client, email):
+    import db
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
+        return cursor.fetchone()[0]
+
+
+def test_role_change_revokes_tokens(client, users):
+    admin, technician = users
+    assert client.get('/api/auth/user-info', headers=technician).get_json()['role'] == 'technician'
+
+    ravi = _user_id(client, 'ravi@example.com')
+    assert client.put(f'/api/auth/users/{ravi}/role', json={'role': 'admin'}, headers=technician).status_code == 403
+    assert client.put(f'/api/auth/users/{ravi}/role', json={'role': 'admin'}, headers=admin).status_code == 200
+
+    response = client.get('/api/auth/user-info', headers=technician)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Token revoked'
+
+
+def test_password_change_revokes_tokens(client, users):
+    admin, _ = users
+    assert client.post('/api/auth/change-password', headers=admin,
+                       json={'current_password': 'wrong', 'new_password': 'x'}).status_code == 401
+    assert client.post('/api/auth/change-password', headers=admin,
+                       json={'current_password': 'secret', 'new_password': 'secret2'}).status_code == 200
+    assert client.get('/api/auth/user-info', headers=admin).status_code == 401
+    assert client.post('/api/auth/signin', json={'email': 'asha@example.com', 'password': 'secret'}).status_code == 401
@@ -0,0 +1,34 @@
+# tests/test_export.py
+"""Columnar exports of an empty result are valid zero-row files."""
+import io
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq
+
+
+def _export(client, export_format, **args):
+    response = client.get('/api/export/alerts', query_string={'format': export_format, **args})
+    assert response.status_code == 200
+    return response.get_data()
+
+
+@pytest.mark.parametrize('paginate', [None, 'keyset'])
+def test_empty_arrow_export(client, paginate):
+    body = _export(client, 'arrow', **({'paginate': paginate} if paginate else {}))
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.num_rows == 0
+    assert 'pole_id' in table.column_names
+
+
+@pytest.mark.parametrize('paginate', [None, 'keyset'])
+def test_empty_parquet_export(client, paginate):
+    body = _export(client, 'parquet', **({'paginate': paginate} if paginate else {}))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.num_rows == 0
+    assert 'alert_status' in table.column_names
+
+
+def test_empty_csv_export_is_unchanged(client):
+    assert _export(client, 'csv') == b"No data available"
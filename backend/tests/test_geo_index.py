@@ -0,0 +1,56 @@
+# tests/test_geo_index.py
+"""/api/poles/map: grid clusters and individual poles per viewport."""
+import pytest
+
+import db
+from conftest import seed_poles
+from pole_registry import registry
+from response_cache import cache
+
+STATE = '72,18,75,20'  # west,south,east,north around Pune and Mumbai
+
+
+@pytest.fixture(scope='module', autouse=True)
+def poles(client):
+    seed_poles(['G-PUNE-1', 'G-PUNE-2', 'G-PUNE-3'], lat=18.52, lon=73.85)
+    seed_poles(['G-MUM-1', 'G-MUM-2'], lat=19.07, lon=72.87)
+    seed_poles(['G-BAD'], lat=200, lon=73.85)  # unusable position, never indexed
+
+
+def _map(client, bbox, zoom):
+    response = client.get('/api/poles/map', query_string={'bbox': bbox, 'zoom': zoom})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_clusters_cover_only_the_viewport(client):
+    clusters = sorted(_map(client, STATE, 8)['clusters'], key=lambda c: c['count'])
+    assert [c['count'] for c in clusters] == [2, 3]
+    assert (clusters[1]['lat'], clusters[1]['lon']) == (18.52, 73.85)
+    assert clusters[1]['status_counts']['ON'] == 3
+
+    east_only = _map(client, '73.5,18,75,20', 8)['clusters']
+    assert [c['count'] for c in east_only] == [3]
+    assert sum(c['count'] for c in _map(client, '-180,-90,180,90', 0)['clusters']) == 5
+
+
+def test_zoomed_in_viewport_returns_poles(client):
+    body = _map(client, '73.8,18.5,73.9,18.6', 15)
+    assert body['clusters'] == []
+    assert sorted(p['pole_id'] for p in body['poles']) == ['G-PUNE-1', 'G-PUNE-2', 'G-PUNE-3']
+
+
+def test_index_follows_ingest_and_moves(client):
+    assert client.post('/api/iot/data', json={"pole_id": "G-PUNE-1", "status": "OFF"}).status_code == 200
+    pune = max(_map(client, STATE, 8)['clusters'], key=lambda c: c['count'])
+    assert (pune['status_counts']['ON'], pune['status_counts']['OFF']) == (2, 1)
+
+    with db.db_connection() as conn:
+        conn.cursor().execute("UPDATE poles SET latitude = 19.07, longitude = 72.87 WHERE pole_id = 'G-PUNE-2'")
+        conn.commit()
+    registry.refresh()
+    cache.invalidate('poles')
+    counts = sorted(c['count'] for c in _map(client, STATE, 8)['clusters'])
+    assert counts == [2, 3]  # Mumbai now has 3
+    moved = _map(client, '73.8,18.5,73.9,18.6', 15)['poles']
+    assert sorted(p['pole_id'] for p in moved) == ['G-PUNE-1', 'G-PUNE-3']
@@ -0,0 +1,85 @@
+# tests/test_heartbeat.py
+"""Heartbeat sweeps: flips are stored, and each silent pole alerts once."""
+import datetime
+
+import pytest
+
+import db
+import heartbeat
+from alert_rules import engine as alert_engine
+from conftest import seed_poles
+from pole_registry import registry
+
+SEEDED = datetime.datetime(2025, 1, 1)
+
+
+def _alerts(pole_id):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT alert_type FROM alerts WHERE pole_id = %s", (pole_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+
+@pytest.fixture
+def silent_pole(client):
+    pole_id = f"H{len(registry.all()):05d}"
+    seed_poles([pole_id], now=SEEDED)
+    registry.refresh()
+    return pole_id
+
+
+def test_racing_sweepers_alert_once(silent_pole, monkeypatch):
+    due = SEEDED + datetime.timedelta(seconds=heartbeat.HEARTBEAT_TIMEOUT + 60)
+    stale = registry.peek(silent_pole)
+    first, second = heartbeat.HeartbeatMonitor(), heartbeat.HeartbeatMonitor()
+    for monitor in (first, second):
+        monitor.schedule(silent_pole, due)
+
+    assert first.sweep(due) == 1
+    # The second sweeper runs in another process: it still sees the pole
+    # ONLINE and its alert engine knows nothing of the first one's alert
+    with alert_engine._lock:
+        alert_engine._open.clear()
+        alert_engine._last_fired.clear()
+    monkeypatch.setattr(heartbeat.registry, 'peek', lambda pole_id: stale)
+    assert second.sweep(due) == 0
+
+    assert _alerts(silent_pole) == ['Missing Heartbeat']
+    assert registry.get(silent_pole).communication_status == 'OFFLINE'
+
+
+def test_sweep_flips_silent_pole_once_then_ages_out_of_maintenance(silent_pole):
+    monitor = heartbeat.HeartbeatMonitor()
+    silent = SEEDED + datetime.timedelta(seconds=heartbeat.HEARTBEAT_TIMEOUT)
+    monitor.schedule(silent_pole, SEEDED)
+    assert monitor.sweep(SEEDED) == 1  # stores the display_status the seed left NULL
+    assert registry.get(silent_pole).display_status == 'ONLINE'
+
+    assert monitor.sweep(silent - datetime.timedelta(seconds=1)) == 0
+    assert monitor.sweep(silent) == 1
+    pole = registry.get(silent_pole)
+    assert (pole.communication_status, pole.display_status) == ('OFFLINE', 'MAINTENANCE')
+
+    # Rescheduled for the end of the maintenance window; no second alert
+    assert monitor.sweep(silent + datetime.timedelta(hours=1)) == 0
+    aged = SEEDED + heartbeat.MAINTENANCE_WINDOW
+    assert monitor.sweep(aged) == 1
+    assert registry.get(silent_pole).display_status == 'OFFLINE'
+    assert _alerts(silent_pole) == ['Missing Heartbeat']
+    assert monitor.stats()['flipped'] == 3
+
+
+def test_reading_before_the_sweep_wins(silent_pole, client):
+    monitor = heartbeat.HeartbeatMonitor()
+    due = SEEDED + datetime.timedelta(seconds=heartbeat.HEARTBEAT_TIMEOUT)
+    monitor.schedule(silent_pole, SEEDED)
+    monitor.sweep(SEEDED)
+    # Committed by another process: the registry here has not seen it yet
+    with db.db_connection() as conn:
+        conn.cursor().execute("UPDATE poles SET update_time = %s WHERE pole_id = %s",
+                              (due - datetime.timedelta(minutes=1), silent_pole))
+        conn.commit()
+
+    assert monitor.sweep(due) == 0
+    assert registry.get(silent_pole).communication_status == 'ONLINE'
+    assert _alerts(silent_pole) == []
@@ -0,0 +1,37 @@
+# tests/test_ingest_buffer.py
+"""A reading the DB rejects is dropped alone; the rest of its chunk is written."""
+import sqlite3
+
+import db
+from ingest_buffer import IngestBuffer
+
+
+def test_data_error_drops_only_the_bad_reading():
+    written = []
+
+    def write_batch(readings):
+        if any(r['pole_id'] == 'BAD' for r in readings):
+            raise sqlite3.IntegrityError("rejected")
+        written.extend(readings)
+
+    buffer = IngestBuffer(write_batch, is_data_error=db.is_data_error)
+    batch = [{'pole_id': f"P{i:05d}"} for i in range(9)]
+    batch.insert(4, {'pole_id': 'BAD'})
+    buffer._flush(batch)
+
+    assert [r['pole_id'] for r in written] == [f"P{i:05d}" for i in range(9)]
+    stats = buffer.stats()
+    assert (stats['written'], stats['dropped'], stats['invalid']) == (9, 1, 1)
+
+
+def test_connection_errors_are_not_bisected():
+    calls = []
+
+    def write_batch(readings):
+        calls.append(len(readings))
+        raise RuntimeError("Database connection failed")
+
+    buffer = IngestBuffer(write_batch, retries=2, is_data_error=db.is_data_error)
+    buffer._flush([{'pole_id': 'P00001'}, {'pole_id': 'P00002'}])
+    assert calls == [2, 2]
+    assert (buffer.dropped, buffer.invalid) == (2, 0)
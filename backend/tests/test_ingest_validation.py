@@ -0,0 +1,46 @@
+# tests/test_ingest_validation.py
+"""Records the columns cannot hold are rejected per record, not per batch."""
+import pytest
+
+import db
+from conftest import seed_poles
+
+
+@pytest.fixture(scope='module', autouse=True)
+def poles(client):
+    seed_poles(['P00001', 'P00002'])
+
+
+def _telemetry_count():
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM telemetry_data")
+        return cursor.fetchone()[0]
+
+
+def test_batch_rejects_only_the_bad_records(client):
+    before = _telemetry_count()
+    body = """[
+        {"pole_id": "P00001", "status": "ON", "signal_strength": -70},
+        {"pole_id": "P00002", "status": "ON", "signal_strength": NaN},
+        {"pole_id": "P00002", "status": "ON", "signal_strength": Infinity},
+        {"pole_id": "P00002", "status": "ON", "signal_strength": 1e30},
+        {"pole_id": "%s", "status": "ON"},
+        {"pole_id": "P00002", "status": "OFF", "firmware_version": "%s"}
+    ]""" % ('P' * 65, 'v' * 65)
+    response = client.post('/api/iot/data/batch', data=body, content_type='application/json')
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['accepted'], result['rejected']) == (1, 5)
+    assert [r['status'] for r in result['results']] == ['accepted'] + ['rejected'] * 5
+    assert [r['error'] for r in result['results'][1:]] == [
+        'signal_strength out of range', 'signal_strength out of range', 'signal_strength out of range',
+        'pole_id too long', 'firmware_version too long']
+    assert _telemetry_count() == before + 1
+
+
+def test_single_reading_out_of_range(client):
+    response = client.post('/api/iot/data', json={"pole_id": "P00001", "status": "ON",
+                                                  "signal_strength": 2 ** 31})
+    assert response.status_code == 400
@@ -0,0 +1,56 @@
+# tests/test_response_cache.py
+"""ETag/304 on cached endpoints, and which writes invalidate them."""
+import pytest
+
+from conftest import seed_poles
+from response_cache import cache
+
+
+@pytest.fixture(scope='module', autouse=True)
+def poles(client):
+    seed_poles(['E00001', 'E00002'], status='ON')
+
+
+def _get(client, path, etag=None):
+    return client.get(path, headers={'If-None-Match': etag} if etag else {})
+
+
+def _etag(response):
+    return response.headers['ETag'].strip('"')
+
+
+def _post(client, pole_id, status='ON', signal=-60):
+    response = client.post('/api/iot/data', json={"pole_id": pole_id, "status": status, "signal_strength": signal})
+    assert response.status_code == 200
+
+
+def test_unchanged_alerts_answer_304_across_unrelated_ingest(client):
+    etag = _etag(_get(client, '/api/alerts'))
+    assert _get(client, '/api/alerts', etag).status_code == 304
+
+    _post(client, 'E00001')  # raises no alert
+    hits = cache.hits
+    assert _get(client, '/api/alerts', etag).status_code == 304
+    assert cache.hits == hits + 1  # served from the entry the ingest left alone
+
+
+def test_alerting_ingest_invalidates_alerts(client):
+    etag = _etag(_get(client, '/api/alerts'))
+    _post(client, 'E00002', signal=-95)
+
+    response = _get(client, '/api/alerts', etag)
+    assert response.status_code == 200
+    assert [alert['pole_id'] for alert in response.get_json()] == ['E00002']
+
+
+def test_status_change_invalidates_stats_and_poles(client):
+    stats = _get(client, '/api/stats')
+    poles = _get(client, '/api/poles')
+    _post(client, 'E00001', status='OFF')
+
+    fresh_stats = _get(client, '/api/stats', _etag(stats))
+    assert fresh_stats.status_code == 200
+    assert fresh_stats.get_json()['active'] == stats.get_json()['active'] - 1
+    fresh_poles = _get(client, '/api/poles', _etag(poles))
+    assert fresh_poles.status_code == 200
+    assert {p['pole_id']: p['status'] for p in fresh_poles.get_json()}['E00001'] == 'OFF'
@@ -0,0 +1,48 @@
+# tests/test_retention.py
+"""Retention never removes rows it has not archived."""
+import datetime
+
+import db
+import retention
+
+DAY = datetime.datetime(2025, 1, 1)
+
+
+def _execute(statement, params=()):
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(statement, params)
+        rows = cursor.fetchall() if cursor.description else None
+        conn.commit()
+    return rows
+
+
+def test_alert_closed_after_archiving_is_kept(client, tmp_path):
+    for status in ('CLOSED', 'CLOSED', 'ACTIVE'):
+        _execute("INSERT INTO alerts (pole_id, message, alert_status, alert_type, timestamp) "
+                 "VALUES ('P00001', 'm', %s, 'Manual Switch', %s)", (status, DAY + datetime.timedelta(hours=1)))
+
+    keys = []
+    archived = retention.archive_day('alerts', DAY, str(tmp_path),
+                                     conditions=(("alert_status <> 'ACTIVE'", []),), keys=keys)
+    # Closed between archiving and deleting
+    _execute("UPDATE alerts SET alert_status = 'CLOSED' WHERE alert_status = 'ACTIVE'")
+
+    assert archived == 2
+    assert retention.delete_keys('alerts', 'id', keys) == 2
+    assert _execute("SELECT alert_status FROM alerts") == [('CLOSED',)]
+
+
+def test_late_telemetry_goes_to_a_part_file(client, tmp_path):
+    insert = "INSERT INTO telemetry_data (pole_id, status, timestamp) VALUES ('P00001', 'ON', %s)"
+    for minute in range(3):
+        _execute(insert, (DAY + datetime.timedelta(minutes=minute),))
+    assert retention.archive_day('telemetry', DAY, str(tmp_path)) == 3
+    last_id = retention.archived_max_key('telemetry', DAY, str(tmp_path))
+
+    _execute(insert, (DAY + datetime.timedelta(hours=5),))  # late reading
+    late = retention.archive_day('telemetry', DAY, str(tmp_path), conditions=(("id > %s", [last_id]),))
+
+    assert late == 1
+    assert len(list((tmp_path / 'telemetry').glob('telemetry_2025-01-01.*.csv.gz'))) == 1
+    assert retention.archived_max_key('telemetry', DAY, str(tmp_path)) == last_id + 1
@@ -0,0 +1,77 @@
+# tests/test_rollups.py
+"""Telemetry rollups: bucket boundaries when accumulating and when querying."""
+import datetime
+
+import pytest
+
+import db
+import rollups
+
+DAY = datetime.datetime(2025, 1, 1)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def seeded_rollups(client):
+    with db.db_connection() as conn:
+        conn.cursor().executemany("""
+            INSERT INTO telemetry_rollup (pole_id, bucket, bucket_start, reading_count,
+                                          on_seconds, off_seconds, signal_sum, signal_count)
+            VALUES ('P00001', 'hour', %s, %s, 0, 0, 0, 0)
+        """, [(DAY + datetime.timedelta(hours=hour), hour + 1) for hour in range(4)])
+        conn.commit()
+
+
+def _buckets(client, **args):
+    response = client.get('/api/telemetry/rollup', query_string={'pole_id': 'P00001', 'bucket': 'hour', **args})
+    assert response.status_code == 200, response.get_json()
+    return [row['bucket_start'] for row in response.get_json()['data']]
+
+
+def test_z_suffixed_bounds(client):
+    assert _buckets(client, **{'from': '2025-01-01T01:00:00Z', 'to': '2025-01-01T03:00:00Z'}) == [
+        '2025-01-01T01:00:00', '2025-01-01T02:00:00']
+
+
+def test_offset_bounds_are_converted_to_utc(client):
+    assert _buckets(client, **{'from': '2025-01-01T07:30:00+05:30', 'to': '2025-01-01T03:00:00'}) == [
+        '2025-01-01T02:00:00']
+
+
+def test_from_inside_a_bucket_includes_it_and_to_is_exclusive(client):
+    assert _buckets(client, **{'from': '2025-01-01T01:30:00', 'to': '2025-01-01T03:00:00'}) == [
+        '2025-01-01T01:00:00', '2025-01-01T02:00:00']
+    assert _buckets(client, **{'from': '2025-01-01T01:30:00', 'to': '2025-01-01T03:00:01'})[-1] == \
+        '2025-01-01T03:00:00'
+
+
+def test_empty_or_inverted_range_is_rejected(client):
+    response = client.get('/api/telemetry/rollup', query_string={
+        'from': '2025-01-01T02:00:00Z', 'to': '2025-01-01T07:30:00+05:30'})
+    assert response.status_code == 400
+
+
+def _acc(readings):
+    acc = {}
+    prev_status = prev_time = None
+    for status, timestamp in readings:
+        rollups.accumulate(acc, 'P1', prev_status, prev_time, status, timestamp, -70)
+        prev_status, prev_time = status, timestamp
+    return acc
+
+
+def test_time_between_readings_is_split_at_hour_and_day_boundaries():
+    night = datetime.datetime(2025, 1, 1, 23, 59, 30)
+    acc = _acc([('ON', night), ('OFF', night + datetime.timedelta(seconds=50))])
+
+    hour = acc[('P1', 'hour', datetime.datetime(2025, 1, 1, 23))]
+    next_hour = acc[('P1', 'hour', datetime.datetime(2025, 1, 2, 0))]
+    assert (hour[0], hour[1], next_hour[0], next_hour[1]) == (1, 30, 1, 20)
+    day = acc[('P1', 'day', DAY)]
+    next_day = acc[('P1', 'day', datetime.datetime(2025, 1, 2))]
+    assert (day[1], next_day[1]) == (30, 20)
+    assert next_day[7] == night + datetime.timedelta(seconds=50)  # first_off
+
+
+def test_gaps_longer_than_max_gap_are_not_credited():
+    acc = _acc([('ON', DAY), ('ON', DAY + rollups.MAX_GAP + datetime.timedelta(seconds=1))])
+    assert sum(slot[1] + slot[2] for slot in acc.values()) == 0
@@ -0,0 +1,73 @@
+# tests/test_stats.py
+"""Incremental /api/stats counters must match a full recount after mixed ingest.
+
+Runs the app against the SQLite stand-in from ``bench/standin.py``::
+
+    cd backend && python -m pytest tests
+"""
+import datetime
+import random
+
+import pytest
+
+import db
+from conftest import install
+
+POLES = 40
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    install(tmp_path_factory.mktemp('stats') / 'stats.db')
+    now = datetime.datetime.utcnow()
+    with db.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO poles (pole_id, cluster_id, latitude, longitude, status, communication_status,
+                               state, district, city_or_village, mode, firmware_version, update_time)
+            VALUES (%s, 'C1', 18.5, 73.8, %s, 'ONLINE', 'Maharashtra', 'Pune', 'Pune-01', 'AUTO', 'v1.0.3', %s)
+        """, [(f"P{i:05d}", 'ON' if i % 2 else 'OFF', now) for i in range(POLES)])
+        cursor.execute("""
+            INSERT INTO alerts (pole_id, message, severity, alert_status, alert_type, timestamp)
+            VALUES ('P00001', 'Seeded', 'warning', 'ACTIVE', 'Seeded', %s)
+        """, (now,))
+        conn.commit()
+
+    from app import app
+    return app.test_client()
+
+
+def _recount():
+    import fleet_stats
+    with db.db_connection() as conn:
+        return fleet_stats.query_stats(conn.cursor(dictionary=True))
+
+
+def test_incremental_counters_match_recount(client):
+    import fleet_stats
+    assert fleet_stats.counters is not None
+
+    # Seeds the counters from the DB
+    assert client.get('/api/stats').get_json() == _recount()
+
+    rng = random.Random(7)
+
+    def reading():
+        return {
+            "pole_id": f"P{rng.randrange(POLES + 3):05d}",  # a few unknown poles
+            "status": rng.choice(("ON", "OFF")),
+            "signal_strength": rng.choice((-60, -70, -95)),  # -95 raises weak-signal alerts
+        }
+
+    for _ in range(200):
+        if rng.random() < 0.7:
+            response = client.post('/api/iot/data', json=reading())
+            assert response.status_code in (200, 404)
+        else:
+            response = client.post('/api/iot/data/batch', json=[reading() for _ in range(rng.randint(1, 20))])
+            assert response.status_code == 200
+
+    recount = _recount()
+    assert recount['alerts'] > 1  # the mix did raise alerts
+    assert fleet_stats.counters.current() == recount
+    assert fleet_stats.counters.reconcile() == 0
@@ -1,4 +1,4 @@
-import { useEffect, useState, useRef, type ComponentProps } from 'react';
+import { useEffect, useState, type ComponentProps } from 'react';
 import { AlertTriangle, Bell, Info } from 'lucide-react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
@@ -23,22 +23,24 @@ import { toast } from 'sonner';
 export default function AlertsView() {
   const [alerts, setAlerts] = useState<Alert[]>([]);
   const [loading, setLoading] = useState(true);
-  const intervalRef = useRef<NodeJS.Timeout | null>(null);
 
   useEffect(() => {
     loadAlerts();
 
-    // Refresh every 15 seconds
-    intervalRef.current = setInterval(() => {
-      loadAlerts();
-      if (alerts.length && Math.random() > 0.7) {
-        const randomAlert = alerts[Math.floor(Math.random() * alerts.length)];
-        if (randomAlert) showAlertNotification(randomAlert);
-      }
-    }, 15000);
+    // New alerts are pushed by the backend as they are raised
+    const unsubscribe = apiService.subscribe({
+      alert: (alert: Alert) => {
+        setAlerts((prev) => [alert, ...prev].slice(0, 10));
+        showAlertNotification(alert);
+      },
+      reset: loadAlerts,
+    });
+    // Alerts raised in another process (e.g. a standalone heartbeat) are not pushed
+    const interval = setInterval(loadAlerts, 60000); // resync every 1 min
 
     return () => {
-      if (intervalRef.current) clearInterval(intervalRef.current);
+      unsubscribe();
+      clearInterval(interval);
     };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
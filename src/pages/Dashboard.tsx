@@ -30,8 +30,23 @@ export default function Dashboard() {
   useEffect(() => {
     loadStats();
     loadUser();
-    const interval = setInterval(loadStats, 15000);
-    return () => clearInterval(interval);
+    const unsubscribe = apiService.subscribe({
+      stats: ({ delta, totals }) =>
+        setStats((prev) =>
+          totals ?? {
+            ...prev,
+            active: prev.active + (delta.active ?? 0),
+            inactive: prev.inactive + (delta.inactive ?? 0),
+            alerts: prev.alerts + (delta.alerts ?? 0),
+          }
+        ),
+      reset: loadStats,
+    });
+    const interval = setInterval(loadStats, 300000); // full resync every 5 min
+    return () => {
+      unsubscribe();
+      clearInterval(interval);
+    };
   }, []);
 
   const loadUser = async () => {
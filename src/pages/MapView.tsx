@@ -1,5 +1,5 @@
-import { useEffect, useState } from 'react';
-import { MapContainer, TileLayer, Marker, Popup } from 'react-leaflet';
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { MapContainer, TileLayer, Marker, Popup, useMap, useMapEvents } from 'react-leaflet';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { apiService } from '@/services/api.service';
@@ -43,26 +43,108 @@ const redIcon = new L.Icon({
   shadowSize: [41, 41]
 });
 
+interface PoleCluster {
+  lat: number;
+  lon: number;
+  count: number;
+  status_counts: Record<string, number>;
+}
+
+// ✅ Cluster bubble colored by its most common display status
+const clusterIcon = (cluster: PoleCluster) => {
+  const counts = cluster.status_counts;
+  const color =
+    counts.OFFLINE >= counts.ONLINE && counts.OFFLINE >= counts.MAINTENANCE
+      ? 'bg-red-500'
+      : counts.MAINTENANCE > counts.ONLINE
+        ? 'bg-orange-400'
+        : 'bg-green-500';
+  const size = cluster.count < 100 ? 32 : cluster.count < 1000 ? 40 : 48;
+  return L.divIcon({
+    html: `<div class="${color} text-white font-semibold rounded-full flex items-center justify-center border-2 border-white shadow" style="width:${size}px;height:${size}px">${cluster.count}</div>`,
+    className: '',
+    iconSize: [size, size],
+    iconAnchor: [size / 2, size / 2],
+  });
+};
+
+function ClusterMarker({ cluster }: { cluster: PoleCluster }) {
+  const map = useMap();
+  return (
+    <Marker
+      position={[cluster.lat, cluster.lon]}
+      icon={clusterIcon(cluster)}
+      eventHandlers={{ click: () => map.setView([cluster.lat, cluster.lon], map.getZoom() + 2) }}
+    />
+  );
+}
+
+// Reloads the visible poles whenever the map stops moving
+function ViewportWatcher({ onChange }: { onChange: (bbox: string, zoom: number) => void }) {
+  const map = useMap();
+  useMapEvents({
+    moveend: () => onChange(map.getBounds().toBBoxString(), map.getZoom()),
+  });
+  useEffect(() => {
+    onChange(map.getBounds().toBBoxString(), map.getZoom());
+  }, [map, onChange]);
+  return null;
+}
+
 export default function MapView() {
   const [poles, setPoles] = useState<Pole[]>([]);
+  const [clusters, setClusters] = useState<PoleCluster[]>([]);
   const [loading, setLoading] = useState(true);
+  const viewport = useRef<{ bbox: string; zoom: number } | null>(null);
+  const reloadTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
 
-  useEffect(() => {
-    loadPoles();
-    const interval = setInterval(loadPoles, 15000); // refresh every 15 sec
-    return () => clearInterval(interval);
-  }, []);
-
-  const loadPoles = async () => {
+  const loadViewport = useCallback(async (bbox: string, zoom: number) => {
+    viewport.current = { bbox, zoom };
     try {
-      const data = await apiService.getPoles();
-      setPoles(data);
+      const data = await apiService.getPolesMap(bbox, zoom);
+      // Ignore answers for a viewport the user has already left
+      if (viewport.current?.bbox !== bbox || viewport.current?.zoom !== zoom) return;
+      setClusters(data.clusters);
+      setPoles(data.poles);
     } catch (error) {
       console.error('Error loading poles:', error);
     } finally {
       setLoading(false);
     }
-  };
+  }, []);
+
+  const reloadViewport = useCallback(() => {
+    if (viewport.current) loadViewport(viewport.current.bbox, viewport.current.zoom);
+  }, [loadViewport]);
+
+  useEffect(() => {
+    // Live updates patch visible poles in place; cluster counts are
+    // refreshed at most every few seconds while events keep arriving.
+    const unsubscribe = apiService.subscribe({
+      pole: (pole: Pole) => {
+        setPoles((prev) => {
+          const index = prev.findIndex((p) => p.pole_id === pole.pole_id);
+          if (index === -1) return prev;
+          const next = [...prev];
+          next[index] = pole;
+          return next;
+        });
+        if (!reloadTimer.current) {
+          reloadTimer.current = setTimeout(() => {
+            reloadTimer.current = null;
+            reloadViewport();
+          }, 5000);
+        }
+      },
+      reset: reloadViewport,
+    });
+    const interval = setInterval(reloadViewport, 300000); // full resync every 5 min
+    return () => {
+      unsubscribe();
+      clearInterval(interval);
+      if (reloadTimer.current) clearTimeout(reloadTimer.current);
+    };
+  }, [reloadViewport]);
 
   // ✅ Choose marker color based on display_status from backend
   const getMarkerIcon = (status: string) => {
@@ -117,75 +199,77 @@ export default function MapView() {
           </CardTitle>
         </CardHeader>
         <CardContent>
-          <div className="h-[600px] w-full rounded-lg overflow-hidden border border-border">
-            {!loading && poles.length > 0 && (
-              <MapContainer
-                center={[20.5937, 78.9629]}
-                zoom={5}
-                style={{ height: '100%', width: '100%' }}
-                scrollWheelZoom={true}
-              >
-                <TileLayer
-                  attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-                  url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
-                />
-                {poles.map((pole) => (
-                  <Marker
-                    key={pole.pole_id}
-                    position={[pole.latitude, pole.longitude]}
-                    icon={getMarkerIcon(pole.display_status)}
-                  >
-                    <Popup>
-                      <div className="space-y-2 min-w-[220px]">
-                        <div className="font-semibold text-lg">{pole.pole_id}</div>
-                        <div className="space-y-1.5 text-sm">
-                          <div className="flex items-center justify-between">
-                            <span className="text-muted-foreground">Status:</span>
-                            <Badge
-                              variant={getBadgeVariant(pole.display_status)}
-                              className={
-                                pole.display_status === 'MAINTENANCE'
-                                  ? 'border-orange-400 text-orange-500'
-                                  : ''
-                              }
-                            >
-                              {pole.display_status}
-                            </Badge>
-                          </div>
-                          <div className="flex items-center justify-between">
-                            <span className="text-muted-foreground">Cluster:</span>
-                            <span className="font-medium">{pole.cluster_id}</span>
-                          </div>
-                          <div className="flex items-center justify-between">
-                            <span className="text-muted-foreground">Battery:</span>
-                            <span className="font-medium">{pole.battery_percentage}%</span>
-                          </div>
-                          <div className="flex items-center justify-between">
-                            <span className="text-muted-foreground">Communication:</span>
-                            <Badge
-                              variant={
-                                pole.communication_status === 'ONLINE' ? 'default' : 'outline'
-                              }
-                              className="ml-2"
-                            >
-                              {pole.communication_status}
-                            </Badge>
-                          </div>
-                          <div className="flex items-center justify-between">
-                            <span className="text-muted-foreground">Last Update:</span>
-                            <span className="font-medium text-xs">
-                              {pole.update_time ? new Date(pole.update_time).toLocaleString() : 'N/A'}
-                            </span>
-                          </div>
+          <div className="relative h-[600px] w-full rounded-lg overflow-hidden border border-border">
+            <MapContainer
+              center={[20.5937, 78.9629]}
+              zoom={5}
+              style={{ height: '100%', width: '100%' }}
+              scrollWheelZoom={true}
+            >
+              <TileLayer
+                attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+                url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
+              />
+              <ViewportWatcher onChange={loadViewport} />
+              {clusters.map((cluster) => (
+                <ClusterMarker key={`${cluster.lat},${cluster.lon}`} cluster={cluster} />
+              ))}
+              {poles.map((pole) => (
+                <Marker
+                  key={pole.pole_id}
+                  position={[pole.latitude, pole.longitude]}
+                  icon={getMarkerIcon(pole.display_status)}
+                >
+                  <Popup>
+                    <div className="space-y-2 min-w-[220px]">
+                      <div className="font-semibold text-lg">{pole.pole_id}</div>
+                      <div className="space-y-1.5 text-sm">
+                        <div className="flex items-center justify-between">
+                          <span className="text-muted-foreground">Status:</span>
+                          <Badge
+                            variant={getBadgeVariant(pole.display_status)}
+                            className={
+                              pole.display_status === 'MAINTENANCE'
+                                ? 'border-orange-400 text-orange-500'
+                                : ''
+                            }
+                          >
+                            {pole.display_status}
+                          </Badge>
+                        </div>
+                        <div className="flex items-center justify-between">
+                          <span className="text-muted-foreground">Cluster:</span>
+                          <span className="font-medium">{pole.cluster_id}</span>
+                        </div>
+                        <div className="flex items-center justify-between">
+                          <span className="text-muted-foreground">Battery:</span>
+                          <span className="font-medium">{pole.battery_percentage}%</span>
+                        </div>
+                        <div className="flex items-center justify-between">
+                          <span className="text-muted-foreground">Communication:</span>
+                          <Badge
+                            variant={
+                              pole.communication_status === 'ONLINE' ? 'default' : 'outline'
+                            }
+                            className="ml-2"
+                          >
+                            {pole.communication_status}
+                          </Badge>
+                        </div>
+                        <div className="flex items-center justify-between">
+                          <span className="text-muted-foreground">Last Update:</span>
+                          <span className="font-medium text-xs">
+                            {pole.update_time ? new Date(pole.update_time).toLocaleString() : 'N/A'}
+                          </span>
                         </div>
                       </div>
-                    </Popup>
-                  </Marker>
-                ))}
-              </MapContainer>
-            )}
+                    </div>
+                  </Popup>
+                </Marker>
+              ))}
+            </MapContainer>
             {loading && (
-              <div className="h-full flex items-center justify-center bg-muted/10">
+              <div className="absolute inset-0 z-[1000] flex items-center justify-center bg-muted/10">
                 <div className="text-muted-foreground">Loading map...</div>
               </div>
             )}
@@ -10,6 +10,16 @@ export const apiService = {
     return await response.json();
   },
 
+  // Poles in a map viewport: clusters with per-status counts at low zoom,
+  // individual poles at high zoom. bbox is "west,south,east,north".
+  getPolesMap: async (bbox: string, zoom: number) => {
+    const response = await fetch(
+      `${API_BASE_URL}/poles/map?bbox=${bbox}&zoom=${zoom}`
+    );
+    if (!response.ok) return { zoom, clusters: [], poles: [] };
+    return await response.json();
+  },
+
   // Get specific pole details
   getPoleDetails: async (poleId: string) => {
     const response = await fetch(`${API_BASE_URL}/poles/${poleId}`);
@@ -41,6 +51,25 @@ export const apiService = {
     return await response.json();
   },
 
+  // Live dashboard deltas over Server-Sent Events. Returns an unsubscribe function.
+  // Events: pole (changed pole), alert (new alert), stats ({ delta, totals? }),
+  // reset (missed too much while disconnected; refetch in full).
+  subscribe: (handlers: {
+    pole?: (pole: any) => void;
+    alert?: (alert: any) => void;
+    stats?: (stats: any) => void;
+    reset?: () => void;
+  }) => {
+    const source = new EventSource(`${API_BASE_URL}/stream`);
+    Object.entries(handlers).forEach(([event, handler]) => {
+      if (!handler) return;
+      source.addEventListener(event, (e) =>
+        handler(JSON.parse((e as MessageEvent).data || "null"))
+      );
+    });
+    return () => source.close();
+  },
+
   // Get current user (Correct Endpoint)
   getCurrentUser: async () => {
     const token = localStorage.getItem("token");